@@ -6,10 +6,22 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
+from keyword import iskeyword
+import re
+from struct import Struct as Packer
+from types import FunctionType
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
 from ..construct import (
-    Subconstruct, ConstructError, ArrayError, Adapter, Field, RepeatUntil,
-    Rename
+    Construct, Subconstruct, ConstructError, ArrayError, Struct, FormatField,
+    StaticField, MetaArray, Value, Buffered, MappingAdapter, PaddingAdapter,
+    BitIntegerAdapter, FieldError, MappingError, SizeofError, Pass
     )
+from ..construct.core import _write_stream
+from ..construct.lib import Container, ListContainer, encode_bin
 
 
 class RepeatUntilExcluding(Subconstruct):
@@ -47,45 +59,457 @@ class RepeatUntilExcluding(Subconstruct):
         raise SizeofError("can't calculate size")
 
 
-def _LEB128_reader():
-    """ Read LEB128 variable-length data from the stream. The data is terminated
-        by a byte with 0 in its highest bit.
+def decode_uleb128(data, offset=0):
+    """ Decode the ULEB128 value at offset in data (bytes, bytearray or
+        memoryview - a bytearray on Python 2) and return it with the offset
+        just past it. Raise IndexError if data ends before the value does.
     """
-    return RepeatUntil(
-                lambda obj, ctx: ord(obj) < 0x80,
-                Field(None, 1))
+    byte = data[offset]
+    if byte < 0x80:
+        return byte, offset + 1
+    value = byte & 0x7f
+    shift = 7
+    while True:
+        offset += 1
+        byte = data[offset]
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset + 1
+        shift += 7
 
 
-class _ULEB128Adapter(Adapter):
-    """ An adapter for ULEB128, given a sequence of bytes in a sub-construct.
+def decode_sleb128(data, offset=0):
+    """ Like decode_uleb128, for SLEB128 values
     """
-    def _decode(self, obj, context):
-        value = 0
-        for b in reversed(obj):
-            value = (value << 7) + (ord(b) & 0x7F)
-        return value
+    byte = data[offset]
+    if byte < 0x80:
+        return (byte - 0x80 if byte & 0x40 else byte), offset + 1
+    value = byte & 0x7f
+    shift = 7
+    while True:
+        offset += 1
+        byte = data[offset]
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            if byte & 0x40:
+                # negative -> sign extend
+                value -= 1 << shift
+            return value, offset + 1
+
 
+class _LEB128(Construct):
+    """ A LEB128 variable-length number: little-endian groups of 7 bits,
+        terminated by a byte with 0 in its highest bit.
 
-class _SLEB128Adapter(Adapter):
-    """ An adapter for SLEB128, given a sequence of bytes in a sub-construct.
+        Parsing reads the first byte alone - most values fit in it - and
+        otherwise reads ahead in chunks, decodes them in a loop and seeks
+        back over the bytes it didn't use.
     """
-    def _decode(self, obj, context):
-        value = 0
-        for b in reversed(obj):
-            value = (value << 7) + (ord(b) & 0x7F)
-        if ord(obj[-1]) & 0x40:
-            # negative -> sign extend
-            value |= - (1 << (7 * len(obj)))
-        return value
+    __slots__ = ["signed"]
+    # read-ahead size for multi-byte values; 64-bit values take up to 10
+    CHUNK = 16
+    def __init__(self, name, signed):
+        Construct.__init__(self, name)
+        self.signed = signed
+        self._set_flag(self.FLAG_DYNAMIC)
+    def _parse(self, stream, context):
+        data = stream.read(1)
+        if not data:
+            raise FieldError("expected LEB128 value, found end of stream")
+        byte = ord(data)
+        if byte < 0x80:
+            return byte - 0x80 if self.signed and byte & 0x40 else byte
+        value = byte & 0x7f
+        shift = 7
+        while True:
+            chunk = stream.read(self.CHUNK)
+            if not chunk:
+                raise FieldError("missing LEB128 terminator")
+            for i, byte in enumerate(bytearray(chunk)):
+                value |= (byte & 0x7f) << shift
+                shift += 7
+                if byte < 0x80:
+                    unused = len(chunk) - i - 1
+                    if unused:
+                        stream.seek(-unused, 1)
+                    if self.signed and byte & 0x40:
+                        # negative -> sign extend
+                        value -= 1 << shift
+                    return value
+    def _build(self, obj, stream, context):
+        data = bytearray()
+        while True:
+            byte = obj & 0x7f
+            obj >>= 7
+            if self.signed:
+                done = obj == (-1 if byte & 0x40 else 0)
+            else:
+                done = obj == 0
+            if done:
+                data.append(byte)
+                break
+            data.append(byte | 0x80)
+        _write_stream(stream, len(data), bytes(data))
+    def _sizeof(self, context):
+        raise SizeofError("can't calculate size")
 
 
 def ULEB128(name):
     """ A construct creator for ULEB128 encoding.
     """
-    return Rename(name, _ULEB128Adapter(_LEB128_reader()))
+    return _LEB128(name, signed=False)
 
 
 def SLEB128(name):
     """ A construct creator for SLEB128 encoding.
     """
-    return Rename(name, _SLEB128Adapter(_LEB128_reader()))
+    return _LEB128(name, signed=True)
+
+
+def _make_record_base():
+    """ MutableMapping where it has __slots__. Python 2's ABCs don't, so
+        their subclasses always get a __dict__; there a slotted base with
+        the same mixin methods is used instead and Record is registered as
+        a virtual MutableMapping.
+    """
+    if '__slots__' in MutableMapping.__dict__:
+        return MutableMapping
+    namespace = {'__slots__': (), '__hash__': None}
+    for base in reversed(MutableMapping.__mro__[:-1]):
+        for name, value in base.__dict__.items():
+            if isinstance(value, FunctionType):
+                namespace[name] = value
+    return type('_RecordBase', (object,), namespace)
+
+
+class Record(_make_record_base()):
+    """ Base of the record classes made by record_class: a fixed set of
+        fields stored in __slots__ instead of a per-instance __dict__.
+
+        Fields are read and written as attributes or items, like those of a
+        Container, and iteration gives the field names in order. Fields
+        can't be added or deleted. Records compare equal to other mappings
+        with the same items.
+    """
+    __slots__ = ()
+    # set by record_class: field names in order, and name -> slot descriptor
+    _fields = ()
+    _slots = {}
+
+    def __getitem__(self, name):
+        return self._slots[name].__get__(self)
+
+    def __setitem__(self, name, value):
+        self._slots[name].__set__(self, value)
+
+    def __delitem__(self, name):
+        raise TypeError("can't delete field %r of %s" % (
+            name, self.__class__.__name__))
+
+    def __contains__(self, name):
+        return name in self._slots
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def keys(self):
+        return list(self._fields)
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return (self._fields == other._fields and
+                    all(self[name] == other[name] for name in self._fields))
+        if isinstance(other, MutableMapping):
+            return dict(self.items()) == dict(other.items())
+        return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def copy(self):
+        return self.__class__(*[self[name] for name in self._fields])
+
+    __copy__ = copy
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, ', '.join(
+            '%s=%r' % (name, self[name]) for name in self._fields))
+
+    __str__ = __repr__
+
+if not issubclass(Record, MutableMapping):
+    MutableMapping.register(Record)
+
+
+def record_class(name, fields):
+    """ Create a Record subclass called name with the given fields, set in
+        order by its constructor. Return None if a field name can't be a
+        slot (not an identifier, a keyword, private or a Record
+        attribute).
+    """
+    fields = tuple(fields)
+    if (len(set(fields)) != len(fields) or
+            not all(_IDENTIFIER.match(field) and not iskeyword(field) and
+                    not field.startswith('_') and not hasattr(Record, field)
+                    for field in fields)):
+        return None
+    namespace = {}
+    exec('def __init__(_record%s):\n    %s' % (
+            ''.join(', ' + field for field in fields),
+            '; '.join('_record.%s = %s' % (field, field) for field in fields)
+            or 'pass'),
+         namespace)
+    cls = type(str(name), (Record,), {
+        '__slots__': fields,
+        '__init__': namespace['__init__'],
+        '_fields': fields,
+    })
+    cls._slots = dict((field, cls.__dict__[field]) for field in fields)
+    return cls
+
+
+class _NotCompilable(Exception):
+    pass
+
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class _StructCompiler(object):
+    """ Turns a Struct of fixed-size fields into a struct format string and
+        the source of a function building the parsed Container from the
+        unpacked values (see compile_struct).
+    """
+    def __init__(self, records=False):
+        self.records = records
+        self.endianity = None
+        self.formats = []
+        self.nvalues = 0
+        self.lines = []
+        self.namespace = {
+            'Container': Container,
+            'ListContainer': ListContainer,
+            'MappingError': MappingError,
+        }
+        self.counter = 0
+
+    def compile(self, struct):
+        top = self._struct(struct, 'context')
+        unpacked = ''.join('v%d, ' % i for i in range(self.nvalues))
+        source = ['def assemble(values, context):']
+        if unpacked:
+            source.append('    %s= values' % unpacked)
+        source.extend('    ' + line for line in self.lines)
+        source.append('    return %s' % top)
+        exec('\n'.join(source), self.namespace)
+        return (Packer((self.endianity or '=') + ''.join(self.formats)),
+                self.namespace['assemble'])
+
+    def _var(self, prefix='x'):
+        self.counter += 1
+        return '%s%d' % (prefix, self.counter)
+
+    def _constant(self, value):
+        name = self._var('k')
+        self.namespace[name] = value
+        return name
+
+    def _unpacked(self, fmt):
+        self.formats.append(fmt)
+        self.nvalues += 1
+        return 'v%d' % (self.nvalues - 1)
+
+    def _struct(self, struct, parent_context):
+        if type(struct) is not Struct:
+            raise _NotCompilable(struct)
+        # Value fields compute from the fields before them, like Struct does;
+        # that context is only set up when the first Value is reached
+        context = None
+        fields = []
+        for sc in struct.subcons:
+            if sc.conflags & sc.FLAG_EMBED:
+                raise _NotCompilable(sc)
+            if isinstance(sc, Value):
+                if context is None:
+                    context = self._var('c')
+                    if struct.nested:
+                        self.lines.append('%s = Container(**{%s})' % (
+                            context, ', '.join(
+                                ["'_': %s" % parent_context] +
+                                ['%r: %s' % field for field in fields])))
+                    else:
+                        self.lines.append('%s = %s' % (context,
+                                                       parent_context))
+                        self.lines.extend('%s[%r] = %s' % (context, name, var)
+                                          for name, var in fields)
+                expr = '%s(%s)' % (self._constant(sc.func), context)
+            else:
+                expr = self._field(sc, context or parent_context)
+            if sc.name is None:
+                continue
+            var = self._var()
+            self.lines.append('%s = %s' % (var, expr))
+            if context is not None:
+                self.lines.append('%s[%r] = %s' % (context, sc.name, var))
+            fields.append((sc.name, var))
+        return self._object(struct.name, fields)
+
+    def _field(self, sc, context):
+        cls = type(sc)
+        if cls is FormatField:
+            fmt = sc.packer.format
+            if not isinstance(fmt, str):
+                fmt = fmt.decode('ascii')
+            if self.endianity is None:
+                self.endianity = fmt[0]
+            elif self.endianity != fmt[0]:
+                raise _NotCompilable(sc)
+            return self._unpacked(fmt[1:])
+        elif cls is MappingAdapter:
+            return self._mapping(sc, self._field(sc.subcon, context))
+        elif cls is PaddingAdapter:
+            if sc.strict or type(sc.subcon) is not StaticField:
+                raise _NotCompilable(sc)
+            self.formats.append('%dx' % sc.subcon.length)
+            return 'None'
+        elif cls is Struct:
+            return self._struct(sc, context)
+        elif cls is MetaArray:
+            if sc._is_flag(sc.FLAG_DYNAMIC):
+                raise _NotCompilable(sc)
+            count = sc.countfunc(Container())
+            return 'ListContainer([%s])' % ', '.join(
+                self._field(sc.subcon, context) for _ in range(count))
+        elif cls is Buffered and sc.decoder is encode_bin:
+            return self._bitstruct(sc.subcon)
+        raise _NotCompilable(sc)
+
+    def _mapping(self, sc, value):
+        decoding = self._constant(sc.decoding)
+        var = self._var()
+        if sc.decdefault is NotImplemented:
+            self.lines.extend([
+                'try:',
+                '    %s = %s[%s]' % (var, decoding, value),
+                'except KeyError:',
+                '    raise MappingError("no decoding mapping for %%r [%%s]" %% '
+                '(%s, %r))' % (value, sc.subcon.name),
+            ])
+        elif sc.decdefault is Pass:
+            self.lines.append('%s = %s.get(%s, %s)' % (
+                var, decoding, value, value))
+        else:
+            self.lines.append('%s = %s.get(%s, %s)' % (
+                var, decoding, value, self._constant(sc.decdefault)))
+        return var
+
+    def _bitstruct(self, struct):
+        """ A BitStruct of BitFields (possibly mapped) and Padding, read as
+            one unsigned integer whose bits are taken apart MSB first.
+        """
+        if type(struct) is not Struct:
+            raise _NotCompilable(struct)
+        layout = []
+        width = 0
+        for sc in struct.subcons:
+            mapping = None
+            if type(sc) is MappingAdapter:
+                mapping, sc = sc, sc.subcon
+            if type(sc) is PaddingAdapter and mapping is None:
+                if sc.strict or type(sc.subcon) is not StaticField:
+                    raise _NotCompilable(sc)
+                width += sc.subcon.length
+                continue
+            if (type(sc) is not BitIntegerAdapter or sc.swapped or
+                    type(sc.subcon) is not StaticField):
+                raise _NotCompilable(sc)
+            layout.append((sc, mapping, width))
+            width += sc.width
+        # Bits are numbered from the most significant bit of the first byte,
+        # so multi-byte BitStructs only fit big-endian structs
+        nbytes, rest = divmod(width, 8)
+        formats = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+        if rest or nbytes not in formats or (nbytes > 1 and
+                                             self.endianity != '>'):
+            raise _NotCompilable(struct)
+        bits = self._unpacked(formats[nbytes])
+        fields = []
+        for sc, mapping, start in layout:
+            shift = width - start - sc.width
+            value = self._var()
+            self.lines.append('%s = (%s >> %d) & %d' % (
+                value, bits, shift, (1 << sc.width) - 1))
+            if sc.signed:
+                self.lines.append('if %s >> %d: %s -= %d' % (
+                    value, sc.width - 1, value, 1 << sc.width))
+            if mapping is not None:
+                value = self._mapping(mapping, value)
+            if sc.name is not None:
+                fields.append((sc.name, value))
+        return self._object(struct.name, fields)
+
+    def _object(self, name, fields):
+        """ Emit the creation of the object parsed from Struct name, given
+            its (field name, variable) pairs, and return its variable.
+        """
+        obj = self._var('o')
+        cls = None
+        if self.records:
+            cls = record_class(name or 'Record', [field for field, _ in fields])
+        if cls is not None:
+            self.lines.append('%s = %s(%s)' % (obj, self._constant(cls),
+                ', '.join(var for _, var in fields)))
+        elif all(_IDENTIFIER.match(field) for field, _ in fields):
+            self.lines.append('%s = Container(%s)' % (obj, ', '.join(
+                '%s=%s' % field for field in fields)))
+        else:
+            self.lines.append('%s = Container(**{%s})' % (obj, ', '.join(
+                '%r: %s' % field for field in fields)))
+        return obj
+
+
+class CompiledStruct(Subconstruct):
+    """ A Struct made only of fixed-size fields - FormatFields, Enums over
+        them, Padding, constant-count Arrays, nested Structs, BitStructs of
+        BitFields and Values - parsed with a single precompiled struct.Struct.
+
+        Parsing gives the same Containers as the wrapped Struct (building and
+        everything else is delegated to it). With records=True it gives
+        Records instead (see record_class), generated for each (nested)
+        Struct and much smaller than Containers. Create with compile_struct.
+    """
+    __slots__ = ["packer", "assemble"]
+    def __init__(self, struct, records=False):
+        Subconstruct.__init__(self, struct)
+        self.packer, self.assemble = _StructCompiler(records).compile(struct)
+    def _parse(self, stream, context):
+        data = stream.read(self.packer.size)
+        if len(data) != self.packer.size:
+            raise FieldError("expected %d, found %d" % (
+                self.packer.size, len(data)))
+        return self.assemble(self.packer.unpack(data), context)
+    def parse_from(self, buffer, offset=0):
+        """ Parse from a buffer (bytes, bytearray, memoryview, mmap) at
+            offset, without copying it.
+        """
+        try:
+            values = self.packer.unpack_from(buffer, offset)
+        except Exception as ex:
+            raise FieldError(ex)
+        return self.assemble(values, Container())
+    def _sizeof(self, context):
+        return self.packer.size
+
+
+def compile_struct(struct, records=False):
+    """ Return a CompiledStruct for struct, or struct itself if it contains
+        anything CompiledStruct can't handle.
+    """
+    try:
+        return CompiledStruct(struct, records)
+    except _NotCompilable:
+        return struct
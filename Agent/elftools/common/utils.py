@@ -8,7 +8,7 @@
 #-------------------------------------------------------------------------------
 from contextlib import contextmanager
 from .exceptions import ELFParseError, ELFError, DWARFError
-from .py3compat import int2byte
+from .py3compat import PY3, int2byte
 from ..construct import ConstructError
 
 
@@ -71,6 +71,107 @@ def parse_cstring_from_stream(stream, stream_pos=None):
     return b''.join(chunks) if found else None
 
 
+def parse_cstring_from_buffer(data, offset=0):
+    """ Parse a C-string at offset in data (bytes or a buffer such as a
+        memoryview - bytes or a bytearray on Python 2). Return it as bytes,
+        without the terminating \x00 byte, along with the offset just past
+        the terminator; or (None, None) if the terminator wasn't found.
+    """
+    try:
+        end = data.find(b'\x00', offset)
+    except AttributeError:
+        # memoryview has no find(); search it in chunks
+        CHUNKSIZE = 64
+        end = -1
+        pos = offset
+        while pos < len(data):
+            index = data[pos:pos + CHUNKSIZE].tobytes().find(b'\x00')
+            if index >= 0:
+                end = pos + index
+                break
+            pos += CHUNKSIZE
+    if end < 0:
+        return None, None
+    return bytes(data[offset:end]), end + 1
+
+
+def buffer_from_stream(stream):
+    """ Return the whole contents of a binary stream as a buffer for parsing
+        at explicit offsets (struct.unpack_from, decode_uleb128...): the
+        memoryview behind a MemoryViewStream, without copying, or bytes.
+        Indexing the buffer gives ints (it's a bytearray on Python 2).
+    """
+    if isinstance(stream, MemoryViewStream):
+        data = stream.getbuffer()
+    elif hasattr(stream, 'getvalue'):
+        data = stream.getvalue()
+    else:
+        with preserve_stream_pos(stream):
+            stream.seek(0)
+            data = stream.read()
+    if not PY3:
+        data = bytearray(data)
+    return data
+
+
+class MemoryViewStream(object):
+    """ A read-only, seekable stream over a buffer (typically a memoryview
+        slice of a mmapped file). Lets construct parse in-memory section data
+        without first copying all of it into a BytesIO; only the bytes
+        actually read are copied.
+    """
+    def __init__(self, buf):
+        self._view = memoryview(buf)
+        self._size = len(self._view)
+        self._pos = 0
+
+    def read(self, size=-1):
+        start = self._pos
+        if size is None or size < 0:
+            end = self._size
+        else:
+            end = min(start + size, self._size)
+        if end <= start:
+            return b''
+        self._pos = end
+        return self._view[start:end].tobytes()
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            pos = offset
+        elif whence == 1:
+            pos = self._pos + offset
+        elif whence == 2:
+            pos = self._size + offset
+        else:
+            raise ValueError('invalid whence (%r)' % whence)
+        if pos < 0:
+            raise ValueError('negative seek position %r' % pos)
+        self._pos = pos
+        return pos
+
+    def tell(self):
+        return self._pos
+
+    def getbuffer(self):
+        return self._view
+
+    def getvalue(self):
+        return self._view.tobytes()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def close(self):
+        pass
+
+
 def elf_assert(cond, msg=''):
     """ Assert that cond is True, otherwise raise ELFError(msg)
     """
@@ -6,13 +6,20 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
-from ..common.utils import struct_parse, dwarf_assert
+from collections import OrderedDict
+from struct import Struct as Packer
+
+from ..common.exceptions import ELFParseError
+from ..common.utils import buffer_from_stream
+from ..construct import Container
+from .die import AttributeValue
+from .enums import ENUM_DW_TAG, ENUM_DW_CHILDREN, ENUM_DW_AT, ENUM_DW_FORM
 
 
 class AbbrevTable(object):
     """ Represents a DWARF abbreviation table.
     """
-    def __init__(self, structs, stream, offset):
+    def __init__(self, structs, stream, offset, data=None):
         """ Create new abbreviation table. Parses the actual table from the
             stream and stores it internally.
 
@@ -22,10 +29,15 @@ class AbbrevTable(object):
             stream, offset:
                 The stream and offset into the stream where this abbreviation
                 table lives.
+
+            data:
+                The contents of stream as a buffer (see
+                DWARFInfo.get_section_data), read from stream if not given.
         """
         self.structs = structs
         self.stream = stream
         self.offset = offset
+        self.data = buffer_from_stream(stream) if data is None else data
 
         self._abbrev_map = self._parse_abbrev_table()
 
@@ -36,20 +48,44 @@ class AbbrevTable(object):
         return self._abbrev_map[code]
 
     def _parse_abbrev_table(self):
-        """ Parse the abbrev table from the stream
+        """ Parse the abbrev table from the section data. The declarations
+            are the same as Dwarf_abbrev_declaration would parse.
         """
         map = {}
-        self.stream.seek(self.offset)
-        while True:
-            decl_code = struct_parse(
-                struct=self.structs.Dwarf_uleb128(''),
-                stream=self.stream)
-            if decl_code == 0:
-                break
-            declaration = struct_parse(
-                struct=self.structs.Dwarf_abbrev_declaration,
-                stream=self.stream)
-            map[decl_code] = AbbrevDecl(decl_code, declaration)
+        data = self.data
+        read_uleb128 = self.structs.Dwarf_readers['uleb128']
+        offset = self.offset
+        try:
+            while True:
+                decl_code, offset = read_uleb128(data, offset)
+                if decl_code == 0:
+                    break
+                tag, offset = read_uleb128(data, offset)
+                children_flag = data[offset]
+                offset += 1
+                attr_spec = []
+                while True:
+                    name, offset = read_uleb128(data, offset)
+                    form, offset = read_uleb128(data, offset)
+                    if name == 0 and form == 0:
+                        break
+                    attr_spec.append(Container(
+                        name=_DW_AT_raw2name.get(name, name),
+                        form=_DW_FORM_raw2name.get(form, form)))
+                try:
+                    children_flag = _DW_CHILDREN_raw2name[children_flag]
+                except KeyError:
+                    raise ELFParseError(
+                        'Invalid children flag %d in abbreviation %d' % (
+                            children_flag, decl_code))
+                map[decl_code] = AbbrevDecl(decl_code, Container(
+                    tag=_DW_TAG_raw2name.get(tag, tag),
+                    children_flag=children_flag,
+                    attr_spec=attr_spec))
+        except IndexError:
+            raise ELFParseError(
+                'Abbreviation table at offset %#x runs past the end of the '
+                'section' % self.offset)
         return map
 
 
@@ -62,6 +98,10 @@ class AbbrevDecl(object):
     def __init__(self, code, decl):
         self.code = code
         self.decl = decl
+        self._attr_decoder = None
+        self._attr_decoder_layout = None
+        # Fixed attribute sizes, keyed by structs layout
+        self._fixed_attr_sizes = {}
 
     def has_children(self):
         """ Does the entry have children?
@@ -75,5 +115,146 @@ class AbbrevDecl(object):
         for attr_spec in self['attr_spec']:
             yield attr_spec.name, attr_spec.form
 
+    def get_attr_decoder(self, structs):
+        """ Get a function decode(data, offset, die) parsing the attributes of
+            a DIE with this abbreviation from the buffer data at offset (right
+            after the abbreviation code). It returns the DIE's attributes - an
+            OrderedDict of AttributeValues - and the offset past them.
+
+            The decoder is generated for the attribute specifications and the
+            layout of structs (endianness, DWARF format and address size) on
+            first use: each run of consecutive fixed-size attributes is
+            unpacked with a single struct.unpack_from. Decoders are shared
+            between declarations with the same attribute specifications.
+        """
+        layout = (structs.little_endian, structs.dwarf_format,
+                  structs.address_size)
+        if self._attr_decoder_layout != layout:
+            key = (layout, tuple(self.iter_attr_specs()))
+            decoder = _attr_decoder_cache.get(key)
+            if decoder is None:
+                if len(_attr_decoder_cache) >= _MAX_CACHED_ATTR_DECODERS:
+                    _attr_decoder_cache.clear()
+                decoder = _attr_decoder_cache[key] = _compile_attr_decoder(
+                    self, structs)
+            self._attr_decoder = decoder
+            self._attr_decoder_layout = layout
+        return self._attr_decoder
+
+    def get_fixed_attr_size(self, structs):
+        """ The total size of the attributes of a DIE with this abbreviation
+            if all their forms have a fixed size in the layout of structs,
+            None otherwise.
+        """
+        layout = (structs.little_endian, structs.dwarf_format,
+                  structs.address_size)
+        try:
+            return self._fixed_attr_sizes[layout]
+        except KeyError:
+            formats = structs.Dwarf_dw_form_formats
+            size = 0
+            for _, form in self.iter_attr_specs():
+                if form not in formats:
+                    size = None
+                    break
+                size += Packer(formats[form]).size
+            self._fixed_attr_sizes[layout] = size
+            return size
+
     def __getitem__(self, entry):
         return self.decl[entry]
+
+
+# Compiled attribute decoders, keyed by structs layout and attribute
+# specifications. Cleared when full, like the re module's cache.
+_attr_decoder_cache = {}
+_MAX_CACHED_ATTR_DECODERS = 1024
+
+
+def _compile_attr_decoder(abbrev_decl, structs):
+    """ Generate the source of an attribute decoder for abbrev_decl (see
+        AbbrevDecl.get_attr_decoder) and compile it.
+    """
+    formats = structs.Dwarf_dw_form_formats
+    readers = structs.Dwarf_dw_form_readers
+    namespace = {
+        'OrderedDict': OrderedDict,
+        'AttributeValue': AttributeValue,
+        'new_tuple': tuple.__new__,
+    }
+    lines = ['attributes = OrderedDict()']
+    fixed_run = []
+
+    def add_attribute(name, form, value, raw_value, offset):
+        lines.append('attributes[%r] = new_tuple(AttributeValue, '
+                     '(%r, %r, %s, %s, %s))' % (
+                         name, name, form, value, raw_value, offset))
+
+    def translate(form, raw_value):
+        if form == 'DW_FORM_strp':
+            namespace['uses_strings'] = True
+            return 'get_string(%s)' % raw_value
+        elif form == 'DW_FORM_flag':
+            return '%s != 0' % raw_value
+        return raw_value
+
+    def flush_fixed_run():
+        if not fixed_run:
+            return
+        byte_order = formats[fixed_run[0][1]][0]
+        packer = Packer(byte_order + ''.join(
+            formats[form][1:] for _, form in fixed_run))
+        unpack = 'unpack%d' % len(lines)
+        namespace[unpack] = packer.unpack_from
+        raw_values = ['x%d_%d' % (len(lines), i)
+                      for i, (_, form) in enumerate(fixed_run)
+                      if formats[form][1:]]
+        if raw_values:
+            lines.append('%s, = %s(data, offset)' % (
+                ', '.join(raw_values), unpack))
+        raw_values.reverse()
+        position = 0
+        for name, form in fixed_run:
+            fmt = formats[form]
+            raw_value = raw_values.pop() if fmt[1:] else "b''"
+            add_attribute(name, form, translate(form, raw_value), raw_value,
+                          'offset + %d' % position)
+            position += Packer(fmt).size
+        lines.append('offset += %d' % packer.size)
+        del fixed_run[:]
+
+    for name, form in abbrev_decl.iter_attr_specs():
+        if form in formats:
+            fixed_run.append((name, form))
+            continue
+        flush_fixed_run()
+        reader = 'read%d' % len(lines)
+        namespace[reader] = readers[form]
+        lines.append('raw_value, next_offset = %s(data, offset)' % reader)
+        if form == 'DW_FORM_indirect':
+            lines.append('value, next_offset = die._read_indirect_value('
+                         'raw_value, data, next_offset)')
+            value = 'value'
+        else:
+            value = 'raw_value'
+        add_attribute(name, form, value, 'raw_value', 'offset')
+        lines.append('offset = next_offset')
+    flush_fixed_run()
+
+    if namespace.pop('uses_strings', False):
+        lines.insert(0, 'get_string = die.dwarfinfo.get_string_from_table')
+    lines.append('return attributes, offset')
+    source = 'def decode(data, offset, die):\n' + ''.join(
+        '    %s\n' % line for line in lines)
+    exec(source, namespace)
+    return namespace['decode']
+
+
+def _raw2name(enum):
+    return dict((value, name) for name, value in enum.items()
+                if name != '_default_')
+
+_DW_TAG_raw2name = _raw2name(ENUM_DW_TAG)
+_DW_CHILDREN_raw2name = _raw2name(ENUM_DW_CHILDREN)
+_DW_AT_raw2name = _raw2name(ENUM_DW_AT)
+_DW_FORM_raw2name = _raw2name(ENUM_DW_FORM)
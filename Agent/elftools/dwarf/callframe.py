@@ -8,11 +8,14 @@
 #-------------------------------------------------------------------------------
 import copy
 from collections import namedtuple
-from ..common.utils import (struct_parse, dwarf_assert, preserve_stream_pos)
+from struct import error as StructError
+from ..common.exceptions import ELFParseError
+from ..common.utils import (struct_parse, dwarf_assert, preserve_stream_pos,
+                            buffer_from_stream)
 from ..common.py3compat import iterbytes, iterkeys
 from ..construct import Struct, Switch
 from .enums import DW_EH_encoding_flags
-from .structs import DWARFStructs
+from .structs import get_dwarf_structs
 from .constants import *
 
 
@@ -43,10 +46,16 @@ class CallFrameInfo(object):
             file; more sophisticated methods are used by libdwarf and others,
             such as guessing which CU contains which FDEs (based on their
             address ranges) and taking the address_size from those CUs.
+
+        data:
+            The contents of stream as a buffer (see
+            DWARFInfo.get_section_data), which instructions are decoded from;
+            read from stream if not given.
     """
     def __init__(self, stream, size, address, base_structs,
-                 for_eh_frame=False):
+                 for_eh_frame=False, data=None):
         self.stream = stream
+        self.data = data
         self.size = size
         self.address = address
         self.base_structs = base_structs
@@ -68,6 +77,8 @@ class CallFrameInfo(object):
             section.
         """
         if self.entries is None:
+            if self.data is None:
+                self.data = buffer_from_stream(self.stream)
             self.entries = self._parse_entries()
         return self.entries
 
@@ -97,7 +108,7 @@ class CallFrameInfo(object):
 
         dwarf_format = 64 if entry_length == 0xFFFFFFFF else 32
 
-        entry_structs = DWARFStructs(
+        entry_structs = get_dwarf_structs(
             little_endian=self.base_structs.little_endian,
             dwarf_format=dwarf_format,
             address_size=self.base_structs.address_size)
@@ -128,7 +139,7 @@ class CallFrameInfo(object):
         # If this is DWARF version 4 or later, we can have a more precise
         # address size, read from the CIE header.
         if not self.for_eh_frame and entry_structs.dwarf_version >= 4:
-            entry_structs = DWARFStructs(
+            entry_structs = get_dwarf_structs(
                 little_endian=entry_structs.little_endian,
                 dwarf_format=entry_structs.dwarf_format,
                 address_size=header.address_size)
@@ -168,13 +179,31 @@ class CallFrameInfo(object):
         return self._entry_cache[offset]
 
     def _parse_instructions(self, structs, offset, end_offset):
-        """ Parse a list of CFI instructions from self.stream, starting with
-            the offset and until (not including) end_offset.
+        """ Parse a list of CFI instructions from the section data, starting
+            with the offset and until (not including) end_offset; self.stream
+            is left right after them.
             Return a list of CallFrameInstruction objects.
         """
+        try:
+            instructions, offset = self._decode_instructions(
+                structs, offset, end_offset)
+        except (IndexError, StructError):
+            raise ELFParseError(
+                'CFI instructions at offset %#x run past the end of the '
+                'section' % offset)
+        self.stream.seek(offset)
+        return instructions
+
+    def _decode_instructions(self, structs, offset, end_offset):
+        data = self.data
+        readers = structs.Dwarf_readers
+        read_uleb128 = readers['uleb128']
+        read_sleb128 = readers['sleb128']
+        read_block = structs.Dwarf_dw_form_readers['DW_FORM_block']
         instructions = []
         while offset < end_offset:
-            opcode = struct_parse(structs.Dwarf_uint8(''), self.stream, offset)
+            opcode = data[offset]
+            offset += 1
             args = []
 
             primary = opcode & _PRIMARY_MASK
@@ -182,9 +211,8 @@ class CallFrameInfo(object):
             if primary == DW_CFA_advance_loc:
                 args = [primary_arg]
             elif primary == DW_CFA_offset:
-                args = [
-                    primary_arg,
-                    struct_parse(structs.Dwarf_uleb128(''), self.stream)]
+                operand, offset = read_uleb128(data, offset)
+                args = [primary_arg, operand]
             elif primary == DW_CFA_restore:
                 args = [primary_arg]
             # primary == 0 and real opcode is extended
@@ -192,44 +220,47 @@ class CallFrameInfo(object):
                             DW_CFA_restore_state):
                 args = []
             elif opcode == DW_CFA_set_loc:
-                args = [
-                    struct_parse(structs.Dwarf_target_addr(''), self.stream)]
+                operand, offset = readers['target_addr'](data, offset)
+                args = [operand]
             elif opcode == DW_CFA_advance_loc1:
-                args = [struct_parse(structs.Dwarf_uint8(''), self.stream)]
+                operand, offset = readers['uint8'](data, offset)
+                args = [operand]
             elif opcode == DW_CFA_advance_loc2:
-                args = [struct_parse(structs.Dwarf_uint16(''), self.stream)]
+                operand, offset = readers['uint16'](data, offset)
+                args = [operand]
             elif opcode == DW_CFA_advance_loc4:
-                args = [struct_parse(structs.Dwarf_uint32(''), self.stream)]
+                operand, offset = readers['uint32'](data, offset)
+                args = [operand]
             elif opcode in (DW_CFA_offset_extended, DW_CFA_register,
                             DW_CFA_def_cfa, DW_CFA_val_offset):
-                args = [
-                    struct_parse(structs.Dwarf_uleb128(''), self.stream),
-                    struct_parse(structs.Dwarf_uleb128(''), self.stream)]
+                operand1, offset = read_uleb128(data, offset)
+                operand2, offset = read_uleb128(data, offset)
+                args = [operand1, operand2]
             elif opcode in (DW_CFA_restore_extended, DW_CFA_undefined,
                             DW_CFA_same_value, DW_CFA_def_cfa_register,
                             DW_CFA_def_cfa_offset):
-                args = [struct_parse(structs.Dwarf_uleb128(''), self.stream)]
+                operand, offset = read_uleb128(data, offset)
+                args = [operand]
             elif opcode == DW_CFA_def_cfa_offset_sf:
-                args = [struct_parse(structs.Dwarf_sleb128(''), self.stream)]
+                operand, offset = read_sleb128(data, offset)
+                args = [operand]
             elif opcode == DW_CFA_def_cfa_expression:
-                args = [struct_parse(
-                    structs.Dwarf_dw_form['DW_FORM_block'], self.stream)]
+                operand, offset = read_block(data, offset)
+                args = [operand]
             elif opcode in (DW_CFA_expression, DW_CFA_val_expression):
-                args = [
-                    struct_parse(structs.Dwarf_uleb128(''), self.stream),
-                    struct_parse(
-                        structs.Dwarf_dw_form['DW_FORM_block'], self.stream)]
+                operand1, offset = read_uleb128(data, offset)
+                operand2, offset = read_block(data, offset)
+                args = [operand1, operand2]
             elif opcode in (DW_CFA_offset_extended_sf,
                             DW_CFA_def_cfa_sf, DW_CFA_val_offset_sf):
-                args = [
-                    struct_parse(structs.Dwarf_uleb128(''), self.stream),
-                    struct_parse(structs.Dwarf_sleb128(''), self.stream)]
+                operand1, offset = read_uleb128(data, offset)
+                operand2, offset = read_sleb128(data, offset)
+                args = [operand1, operand2]
             else:
                 dwarf_assert(False, 'Unknown CFI opcode: 0x%x' % opcode)
 
             instructions.append(CallFrameInstruction(opcode=opcode, args=args))
-            offset = self.stream.tell()
-        return instructions
+        return instructions, offset
 
     def _parse_cie_for_fde(self, fde_offset, fde_header, entry_structs):
         """ Parse the CIE that corresponds to an FDE.
@@ -6,7 +6,13 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
+from bisect import bisect_left
+from struct import error as StructError
+
+from ..common.exceptions import ELFParseError
+from ..common.utils import dwarf_assert
 from .die import DIE
+from .enums import DW_FORM_raw2name
 
 
 class CompileUnit(object):
@@ -26,6 +32,11 @@ class CompileUnit(object):
 
         To get the top-level DIE describing the compilation unit, call the
         get_top_DIE method.
+
+        DIEs are parsed lazily: the top DIE is parsed on its own and the
+        children of a DIE when they're iterated (iter_DIE_children), without
+        parsing the subtrees of the children. The whole DIE tree is parsed,
+        linked and kept only when it's requested with iter_DIEs.
     """
     def __init__(self, header, dwarfinfo, structs, cu_offset, cu_die_offset):
         """ header:
@@ -55,6 +66,11 @@ class CompileUnit(object):
 
         # A list of DIEs belonging to this CU. Lazily parsed.
         self._dielist = []
+        # The offsets of the DIEs in self._dielist, for lookups
+        self._dieoffsets = None
+
+        # The top DIE, parsed on its own if requested before the whole list
+        self._top_DIE = None
 
     def dwarf_format(self):
         """ Get the DWARF format (32 or 64) for this CU
@@ -73,15 +89,76 @@ class CompileUnit(object):
         """ Get the top DIE (which is either a DW_TAG_compile_unit or
             DW_TAG_partial_unit) of this CU
         """
-        return self._get_DIE(0)
+        if self._dielist:
+            return self._dielist[0]
+        if self._top_DIE is None:
+            self._top_DIE = DIE(
+                    cu=self,
+                    stream=self.dwarfinfo.debug_info_sec.stream,
+                    offset=self.cu_die_offset)
+        return self._top_DIE
 
     def iter_DIEs(self):
         """ Iterate over all the DIEs in the CU, in order of their appearance.
             Note that null DIEs will also be returned.
+
+            This parses all the DIEs of the CU and keeps them, with their
+            parent/child links set.
         """
         self._parse_DIEs()
         return iter(self._dielist)
 
+    def iter_DIE_children(self, die):
+        """ Yield the children of die, a DIE of this CU, parsing them from the
+            section as they're requested. The subtree of each child isn't
+            parsed: it's skipped using the child's DW_AT_sibling attribute
+            if it has one, by walking its DIEs without decoding their
+            attributes otherwise (just adding up their sizes for
+            abbreviations whose attributes have fixed sizes).
+
+            The children aren't kept: iterating again parses them again.
+        """
+        if not die.has_children:
+            return
+        cu_boundary = self._get_cu_boundary()
+        offset = die.offset + die.size
+        while offset < cu_boundary:
+            child = DIE(
+                    cu=self,
+                    stream=self.dwarfinfo.debug_info_sec.stream,
+                    offset=offset)
+            if child.is_null():
+                die._end_offset = offset + child.size
+                return
+            child.set_parent(die)
+            yield child
+            offset = self._get_sibling_offset(child, cu_boundary)
+
+    def get_DIE_from_offset(self, offset):
+        """ Get the DIE at the given offset in the .debug_info section, which
+            must be within this CU. If all the DIEs of the CU were parsed
+            (iter_DIEs) it's one of them, linked to its parent and children;
+            otherwise it's parsed by itself and has no parent.
+        """
+        dwarf_assert(
+            self.cu_die_offset <= offset < self._get_cu_boundary(),
+            'Offset %#x is not in the DIEs of the CU at %#x' % (
+                offset, self.cu_offset))
+        if self._dielist:
+            if self._dieoffsets is None:
+                self._dieoffsets = [die.offset for die in self._dielist]
+            i = bisect_left(self._dieoffsets, offset)
+            dwarf_assert(
+                i < len(self._dieoffsets) and self._dieoffsets[i] == offset,
+                'No DIE at offset %#x' % offset)
+            return self._dielist[i]
+        if offset == self.cu_die_offset:
+            return self.get_top_DIE()
+        return DIE(
+                cu=self,
+                stream=self.dwarfinfo.debug_info_sec.stream,
+                offset=offset)
+
     #------ PRIVATE ------#
 
     def __getitem__(self, name):
@@ -95,6 +172,78 @@ class CompileUnit(object):
         self._parse_DIEs()
         return self._dielist[index]
 
+    def _get_cu_boundary(self):
+        """ Offset one byte past the bounds of this CU in the stream
+        """
+        return (self.cu_offset +
+                self['unit_length'] +
+                self.structs.initial_length_field_size())
+
+    def _get_sibling_offset(self, die, cu_boundary):
+        """ Offset of the DIE following die and its subtree
+        """
+        if not die.has_children:
+            return die.offset + die.size
+        if die._end_offset is not None:
+            return die._end_offset
+
+        sibling = die.attributes.get('DW_AT_sibling')
+        if sibling is not None:
+            if sibling.form == 'DW_FORM_ref_addr':
+                offset = sibling.value
+            else:
+                offset = self.cu_offset + sibling.value
+            if die.offset < offset <= cu_boundary:
+                return offset
+
+        # No (usable) sibling reference: skip over the subtree, up to the
+        # null entry ending the children list of die.
+        offset = die.offset + die.size
+        depth = 1
+        while depth > 0 and offset < cu_boundary:
+            offset, has_children = self._skip_DIE(offset)
+            if has_children is None:
+                depth -= 1
+            elif has_children:
+                depth += 1
+        return offset
+
+    def _skip_DIE(self, offset):
+        """ Skip over the DIE at offset without building it. Return the
+            offset past it and whether it has children (None for a null
+            entry).
+        """
+        dwarfinfo = self.dwarfinfo
+        data = dwarfinfo.get_section_data(dwarfinfo.debug_info_sec)
+        structs = self.structs
+        form_readers = structs.Dwarf_dw_form_readers
+        die_offset = offset
+        try:
+            abbrev_code, offset = structs.Dwarf_readers['uleb128'](
+                data, offset)
+            if abbrev_code == 0:
+                return offset, None
+
+            abbrev_decl = self.get_abbrev_table().get_abbrev(abbrev_code)
+            attr_size = abbrev_decl.get_fixed_attr_size(structs)
+            if attr_size is not None:
+                offset += attr_size
+            else:
+                for _, form in abbrev_decl.iter_attr_specs():
+                    raw_value, offset = form_readers[form](data, offset)
+                    while form == 'DW_FORM_indirect':
+                        dwarf_assert(
+                            raw_value in DW_FORM_raw2name,
+                            'Found DW_FORM_indirect with unknown raw_value=' +
+                            str(raw_value))
+                        form = DW_FORM_raw2name[raw_value]
+                        raw_value, offset = form_readers[form](data, offset)
+        except (IndexError, StructError):
+            raise ELFParseError(
+                'DIE at offset %#x runs past the end of the section' %
+                die_offset)
+        return offset, abbrev_decl.has_children()
+
     def _parse_DIEs(self):
         """ Parse all the DIEs pertaining to this CU from the stream and shove
             them sequentially into self._dielist.
@@ -106,17 +255,19 @@ class CompileUnit(object):
 
         # Compute the boundary (one byte past the bounds) of this CU in the
         # stream
-        cu_boundary = ( self.cu_offset +
-                        self['unit_length'] +
-                        self.structs.initial_length_field_size())
+        cu_boundary = self._get_cu_boundary()
 
-        # First pass: parse all DIEs and place them into self._dielist
+        # First pass: parse all DIEs and place them into self._dielist. The
+        # top DIE is reused if it was already parsed by itself.
         die_offset = self.cu_die_offset
         while die_offset < cu_boundary:
-            die = DIE(
-                    cu=self,
-                    stream=self.dwarfinfo.debug_info_sec.stream,
-                    offset=die_offset)
+            if die_offset == self.cu_die_offset and self._top_DIE is not None:
+                die = self._top_DIE
+            else:
+                die = DIE(
+                        cu=self,
+                        stream=self.dwarfinfo.debug_info_sec.stream,
+                        offset=die_offset)
             self._dielist.append(die)
             die_offset += die.size
 
@@ -132,6 +283,7 @@ class CompileUnit(object):
         """
         # the first DIE in the list is the root node
         root = self._dielist[0]
+        root._children = []
         parentstack = [root]
 
         for die in self._dielist[1:]:
@@ -141,6 +293,7 @@ class CompileUnit(object):
                 cur_parent.add_child(die)
                 die.set_parent(cur_parent)
                 if die.has_children:
+                    die._children = []
                     parentstack.append(die)
             else:
                 # parentstack should not be really empty here. However, some
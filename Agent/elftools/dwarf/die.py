@@ -8,10 +8,10 @@
 #-------------------------------------------------------------------------------
 from collections import namedtuple, OrderedDict
 import os
+from struct import error as StructError
 
-from ..common.exceptions import DWARFError
+from ..common.exceptions import DWARFError, ELFParseError
 from ..common.py3compat import bytes2str, iteritems
-from ..common.utils import struct_parse, preserve_stream_pos
 from .enums import DW_FORM_raw2name
 
 
@@ -39,6 +39,12 @@ AttributeValue = namedtuple(
     'AttributeValue', 'name form value raw_value offset')
 
 
+# Forms of references to DIEs, relative to the beginning of their CU
+_CU_RELATIVE_REF_FORMS = frozenset((
+    'DW_FORM_ref1', 'DW_FORM_ref2', 'DW_FORM_ref4', 'DW_FORM_ref8',
+    'DW_FORM_ref_udata'))
+
+
 class DIE(object):
     """ A DWARF debugging information entry. On creation, parses itself from
         the stream. Each DIE is held by a CU.
@@ -74,7 +80,9 @@ class DIE(object):
                 information (structs, abbrev table, etc.)
 
             stream, offset:
-                The stream and offset into it where this DIE's data is located
+                The stream and offset into it where this DIE's data is located.
+                The stream is the .debug_info section's; the DIE is parsed
+                from its contents as returned by DWARFInfo.get_section_data.
         """
         self.cu = cu
         self.dwarfinfo = self.cu.dwarfinfo # get DWARFInfo context
@@ -86,8 +94,12 @@ class DIE(object):
         self.has_children = None
         self.abbrev_code = None
         self.size = 0
-        self._children = []
+        # The children, if they were linked by a full parse of the CU (see
+        # iter_children)
+        self._children = None
         self._parent = None
+        # Offset past this DIE's subtree, once known
+        self._end_offset = None
 
         self._parse_DIE()
 
@@ -116,9 +128,39 @@ class DIE(object):
         fname = bytes2str(fname_attr.value) if fname_attr else ''
         return os.path.join(comp_dir, fname)
 
+    def get_DIE_from_attribute(self, name):
+        """ Return the DIE referenced by the attribute of this DIE called
+            name (e.g. DW_AT_type), which must have a reference form:
+            DW_FORM_ref1/2/4/8/udata (offsets relative to the CU) or
+            DW_FORM_ref_addr (offsets in the .debug_info section), possibly
+            through DW_FORM_indirect.
+            See DWARFInfo.get_DIE_from_offset.
+        """
+        attr = self.attributes[name]
+        form = attr.form
+        if form == 'DW_FORM_indirect':
+            # The raw value is the actual form
+            form = DW_FORM_raw2name.get(attr.raw_value, form)
+        if form in _CU_RELATIVE_REF_FORMS:
+            offset = self.cu.cu_offset + attr.value
+        elif form == 'DW_FORM_ref_addr':
+            offset = attr.value
+        else:
+            raise DWARFError('%s of DIE at offset %#x has unsupported '
+                             'reference form %s' % (name, self.offset, form))
+        cu = self.cu
+        if cu._dielist and cu.cu_die_offset <= offset < cu._get_cu_boundary():
+            # A DIE of this fully parsed CU, linked to its parent
+            return cu.get_DIE_from_offset(offset)
+        return self.dwarfinfo.get_DIE_from_offset(offset)
+
     def iter_children(self):
-        """ Yield all children of this DIE
+        """ Yield all children of this DIE. Unless all the DIEs of the CU were
+            parsed (CompileUnit.iter_DIEs), they're parsed as they're needed
+            - see CompileUnit.iter_DIE_children.
         """
+        if self._children is None:
+            return self.cu.iter_DIE_children(self)
         return iter(self._children)
 
     def iter_siblings(self):
@@ -126,7 +168,7 @@ class DIE(object):
         """
         if self._parent:
             for sibling in self._parent.iter_children():
-                if sibling is not self:
+                if sibling.offset != self.offset:
                     yield sibling
         else:
             raise StopIteration()
@@ -135,6 +177,8 @@ class DIE(object):
     # interesting to consumers
     #
     def add_child(self, die):
+        if self._children is None:
+            self._children = []
         self._children.append(die)
 
     def set_parent(self, die):
@@ -156,61 +200,63 @@ class DIE(object):
         """ Parses the DIE info from the section, based on the abbreviation
             table of the CU
         """
+        dwarfinfo = self.dwarfinfo
+        data = dwarfinfo.get_section_data(dwarfinfo.debug_info_sec)
         structs = self.cu.structs
 
-        # A DIE begins with the abbreviation code. Read it and use it to
-        # obtain the abbrev declaration for this DIE.
-        # Note: here and elsewhere, preserve_stream_pos is used on operations
-        # that manipulate the stream by reading data from it.
-        self.abbrev_code = struct_parse(
-            structs.Dwarf_uleb128(''), self.stream, self.offset)
-
-        # This may be a null entry
-        if self.abbrev_code == 0:
-            self.size = self.stream.tell() - self.offset
-            return
-
-        abbrev_decl = self.cu.get_abbrev_table().get_abbrev(self.abbrev_code)
-        self.tag = abbrev_decl['tag']
-        self.has_children = abbrev_decl.has_children()
-
-        # Guided by the attributes listed in the abbreviation declaration, parse
-        # values from the stream.
-        for name, form in abbrev_decl.iter_attr_specs():
-            attr_offset = self.stream.tell()
-            raw_value = struct_parse(structs.Dwarf_dw_form[form], self.stream)
-
-            value = self._translate_attr_value(form, raw_value)
-            self.attributes[name] = AttributeValue(
-                name=name,
-                form=form,
-                value=value,
-                raw_value=raw_value,
-                offset=attr_offset)
-
-        self.size = self.stream.tell() - self.offset
+        try:
+            # A DIE begins with the abbreviation code. Read it and use it to
+            # obtain the abbrev declaration for this DIE.
+            self.abbrev_code, offset = structs.Dwarf_readers['uleb128'](
+                data, self.offset)
+
+            # This may be a null entry
+            if self.abbrev_code == 0:
+                self.size = offset - self.offset
+                return
+
+            abbrev_decl = self.cu.get_abbrev_table().get_abbrev(
+                self.abbrev_code)
+            self.tag = abbrev_decl['tag']
+            self.has_children = abbrev_decl.has_children()
+
+            # Parse the values of the attributes listed in the abbreviation
+            # declaration with the decoder compiled for it.
+            self.attributes, offset = abbrev_decl.get_attr_decoder(structs)(
+                data, offset, self)
+        except (IndexError, StructError):
+            raise ELFParseError(
+                'DIE at offset %#x runs past the end of the section' %
+                self.offset)
+
+        self.size = offset - self.offset
 
     def _translate_attr_value(self, form, raw_value):
         """ Translate a raw attr value according to the form
         """
         value = None
         if form == 'DW_FORM_strp':
-            with preserve_stream_pos(self.stream):
-                value = self.dwarfinfo.get_string_from_table(raw_value)
+            value = self.dwarfinfo.get_string_from_table(raw_value)
         elif form == 'DW_FORM_flag':
             value = not raw_value == 0
-        elif form == 'DW_FORM_indirect':
+        else:
+            value = raw_value
+        return value
+
+    def _read_indirect_value(self, raw_value, data, offset):
+        """ For DW_FORM_indirect, whose raw value is the actual form: read
+            and translate the value of that form at offset. Return it with
+            the offset past it.
+        """
+        form = 'DW_FORM_indirect'
+        # Let's hope this doesn't get too deep :-)
+        while form == 'DW_FORM_indirect':
             try:
                 form = DW_FORM_raw2name[raw_value]
             except KeyError as err:
                 raise DWARFError(
                         'Found DW_FORM_indirect with unknown raw_value=' +
                         str(raw_value))
-
-            raw_value = struct_parse(
-                self.cu.structs.Dwarf_dw_form[form], self.stream)
-            # Let's hope this doesn't get too deep :-)
-            return self._translate_attr_value(form, raw_value)
-        else:
-            value = raw_value
-        return value
+            raw_value, offset = self.cu.structs.Dwarf_dw_form_readers[form](
+                data, offset)
+        return self._translate_attr_value(form, raw_value), offset
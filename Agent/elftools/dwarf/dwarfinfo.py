@@ -6,12 +6,13 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
-from collections import namedtuple
+from bisect import bisect_right
+from collections import namedtuple, OrderedDict
 
 from ..common.exceptions import DWARFError
 from ..common.utils import (struct_parse, dwarf_assert,
-                            parse_cstring_from_stream)
-from .structs import DWARFStructs
+                            parse_cstring_from_buffer, buffer_from_stream)
+from .structs import get_dwarf_structs
 from .compileunit import CompileUnit
 from .abbrevtable import AbbrevTable
 from .lineprogram import LineProgram
@@ -95,7 +96,7 @@ class DWARFInfo(object):
         # This is the DWARFStructs the context uses, so it doesn't depend on
         # DWARF format and address_size (these are determined per CU) - set them
         # to default values.
-        self.structs = DWARFStructs(
+        self.structs = get_dwarf_structs(
             little_endian=self.config.little_endian,
             dwarf_format=32,
             address_size=self.config.default_address_size)
@@ -103,6 +104,18 @@ class DWARFInfo(object):
         # Cache for abbrev tables: a dict keyed by offset
         self._abbrevtable_cache = {}
 
+        # Section contents for offset-based parsing, keyed by section
+        self._section_data = {}
+
+        # CUs parsed by iter_CUs and DIE lookups by offset, in section order,
+        # and their offsets (sorted) to bisect. CUs are added as far into the
+        # section as iteration or lookups went.
+        self._cu_cache = []
+        self._cu_offsets = []
+
+        # DIEs looked up by offset, least recently used first
+        self._die_cache = OrderedDict()
+
     @property
     def has_debug_info(self):
         """ Return whether this contains debug information.
@@ -113,10 +126,31 @@ class DWARFInfo(object):
         return bool(self.debug_info_sec)
 
     def iter_CUs(self):
-        """ Yield all the compile units (CompileUnit objects) in the debug info
+        """ Yield all the compile units (CompileUnit objects) in the debug info.
+            They're parsed once and kept: later iterations and DIE lookups by
+            offset give the same objects.
         """
         return self._parse_CUs_iter()
 
+    def get_DIE_from_offset(self, offset):
+        """ Get the DIE at the given offset in the .debug_info section.
+
+            Only the headers of the CUs up to the one containing the offset
+            are parsed, and only the DIE itself if its CU wasn't fully parsed
+            (see CompileUnit.get_DIE_from_offset). Recently fetched DIEs are
+            cached.
+        """
+        cache = self._die_cache
+        die = cache.pop(offset, None)
+        if die is None or (die._parent is None and die.cu._dielist):
+            # Not cached, or parsed by itself before all the DIEs of its CU
+            # were: take the one linked to its parent instead
+            die = self._get_CU_containing(offset).get_DIE_from_offset(offset)
+            if len(cache) >= self._DIE_CACHE_SIZE:
+                cache.popitem(last=False)
+        cache[offset] = die
+        return die
+
     def get_abbrev_table(self, offset):
         """ Get an AbbrevTable from the given offset in the debug_abbrev
             section.
@@ -136,14 +170,29 @@ class DWARFInfo(object):
             self._abbrevtable_cache[offset] = AbbrevTable(
                 structs=self.structs,
                 stream=self.debug_abbrev_sec.stream,
-                offset=offset)
+                offset=offset,
+                data=self.get_section_data(self.debug_abbrev_sec))
         return self._abbrevtable_cache[offset]
 
     def get_string_from_table(self, offset):
         """ Obtain a string from the string table section, given an offset
             relative to the section.
         """
-        return parse_cstring_from_stream(self.debug_str_sec.stream, offset)
+        return parse_cstring_from_buffer(
+            self.get_section_data(self.debug_str_sec), offset)[0]
+
+    def get_section_data(self, section):
+        """ Get the contents of a section (one of the debug_*_sec
+            descriptors) as a buffer that DIEs, abbreviation tables, line
+            programs and CFI are parsed from at explicit offsets, instead of
+            seeking and reading the section's stream. It's a memoryview of the
+            file for memory-mapped ELF files and bytes otherwise.
+        """
+        data = self._section_data.get(section)
+        if data is None:
+            data = self._section_data[section] = buffer_from_stream(
+                section.stream)
+        return data
 
     def line_program_for_CU(self, CU):
         """ Given a CU object, fetch the line program it points to from the
@@ -171,7 +220,8 @@ class DWARFInfo(object):
             stream=self.debug_frame_sec.stream,
             size=self.debug_frame_sec.size,
             address=self.debug_frame_sec.address,
-            base_structs=self.structs)
+            base_structs=self.structs,
+            data=self.get_section_data(self.debug_frame_sec))
         return cfi.get_entries()
 
     def has_EH_CFI(self):
@@ -187,7 +237,8 @@ class DWARFInfo(object):
             size=self.eh_frame_sec.size,
             address=self.eh_frame_sec.address,
             base_structs=self.structs,
-            for_eh_frame=True)
+            for_eh_frame=True,
+            data=self.get_section_data(self.eh_frame_sec))
         return cfi.get_entries()
 
     def get_pubtypes(self):
@@ -253,15 +304,58 @@ class DWARFInfo(object):
 
     #------ PRIVATE ------#
 
+    # Maximal number of DIEs kept by get_DIE_from_offset
+    _DIE_CACHE_SIZE = 4096
+
+    def _get_CU_containing(self, offset):
+        """ Get the CU whose DIEs contain the given offset in the .debug_info
+            section, parsing CU headers as far as needed.
+        """
+        dwarf_assert(
+            self.debug_info_sec is not None and
+            0 <= offset < self.debug_info_sec.size,
+            'Offset %#x is not in the .debug_info section' % offset)
+        i = bisect_right(self._cu_offsets, offset) - 1
+        if i >= 0 and i < len(self._cu_cache) - 1:
+            cu = self._cu_cache[i]
+        else:
+            # Past the last CU parsed so far (or in it): parse on until the
+            # CU containing offset
+            if self._cu_cache:
+                cu = self._cu_cache[-1]
+                next_offset = cu._get_cu_boundary()
+            else:
+                cu = None
+                next_offset = 0
+            while next_offset <= offset:
+                cu = self._parse_CU_at_offset(next_offset)
+                self._cu_cache.append(cu)
+                self._cu_offsets.append(next_offset)
+                next_offset = cu._get_cu_boundary()
+        dwarf_assert(
+            cu.cu_die_offset <= offset,
+            'Offset %#x is in the header of the CU at %#x' % (
+                offset, cu.cu_offset))
+        return cu
+
     def _parse_CUs_iter(self):
         """ Parse CU entries from debug_info. Yield CUs in order of appearance.
         """
         if self.debug_info_sec is None:
             return
 
+        # CUs already parsed (by an earlier iteration or a DIE lookup) are
+        # reused, so DIEs found by offset belong to the same CU objects
+        i = 0
         offset = 0
         while offset < self.debug_info_sec.size:
-            cu = self._parse_CU_at_offset(offset)
+            if i < len(self._cu_cache):
+                cu = self._cu_cache[i]
+            else:
+                cu = self._parse_CU_at_offset(offset)
+                self._cu_cache.append(cu)
+                self._cu_offsets.append(offset)
+            i += 1
             # Compute the offset of the next CU in the section. The unit_length
             # field of the CU header contains its size not including the length
             # field itself.
@@ -278,7 +372,7 @@ class DWARFInfo(object):
         # whether the CU is represented with 32-bit or 64-bit DWARF format.
         #
         # So we peek at the first word in the CU header to determine its
-        # dwarf format. Based on it, we then create a new DWARFStructs
+        # dwarf format. Based on it, we then get the (shared) DWARFStructs
         # instance suitable for this CU and use it to parse the rest.
         #
         initial_length = struct_parse(
@@ -286,12 +380,11 @@ class DWARFInfo(object):
         dwarf_format = 64 if initial_length == 0xFFFFFFFF else 32
 
         # At this point we still haven't read the whole header, so we don't
-        # know the address_size. Therefore, we're going to create structs
-        # with a default address_size=4. If, after parsing the header, we
-        # find out address_size is actually 8, we just create a new structs
-        # object for this CU.
+        # know the address_size. Therefore, we're going to use structs with a
+        # default address_size=4. If, after parsing the header, we find out
+        # address_size is actually 8, we just switch to the structs for that.
         #
-        cu_structs = DWARFStructs(
+        cu_structs = get_dwarf_structs(
             little_endian=self.config.little_endian,
             dwarf_format=dwarf_format,
             address_size=4)
@@ -299,7 +392,7 @@ class DWARFInfo(object):
         cu_header = struct_parse(
             cu_structs.Dwarf_CU_header, self.debug_info_sec.stream, offset)
         if cu_header['address_size'] == 8:
-            cu_structs = DWARFStructs(
+            cu_structs = get_dwarf_structs(
                 little_endian=self.config.little_endian,
                 dwarf_format=dwarf_format,
                 address_size=8)
@@ -339,5 +432,6 @@ class DWARFInfo(object):
             stream=self.debug_line_sec.stream,
             structs=structs,
             program_start_offset=self.debug_line_sec.stream.tell(),
-            program_end_offset=end_offset)
+            program_end_offset=end_offset,
+            data=self.get_section_data(self.debug_line_sec))
 
@@ -6,11 +6,12 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
-import os
 import copy
 from collections import namedtuple
+from struct import error as StructError
 
-from ..common.utils import struct_parse
+from ..common.exceptions import ELFParseError
+from ..common.utils import struct_parse, dwarf_assert, buffer_from_stream
 from .constants import *
 
 
@@ -75,7 +76,7 @@ class LineProgram(object):
         state information for each address.
     """
     def __init__(self, header, stream, structs,
-                 program_start_offset, program_end_offset):
+                 program_start_offset, program_end_offset, data=None):
         """ 
             header:
                 The header of this line program. Note: LineProgram may modify
@@ -93,8 +94,14 @@ class LineProgram(object):
                 starts (the actual program, after the header), and where it
                 ends.
                 The actual range includes start but not end: [start, end - 1]
+
+            data:
+                The contents of stream as a buffer (see
+                DWARFInfo.get_section_data), which the program is decoded
+                from; read from stream if not given.
         """
         self.stream = stream
+        self.data = data
         self.header = header
         self.structs = structs
         self.program_start_offset = program_start_offset
@@ -111,7 +118,12 @@ class LineProgram(object):
             with readelf and debugging.
         """
         if self._decoded_entries is None:
-            self._decoded_entries = self._decode_line_program()
+            try:
+                self._decoded_entries = self._decode_line_program()
+            except (IndexError, StructError):
+                raise ELFParseError(
+                    'Line program at offset %#x runs past the end of the '
+                    'section' % self.program_start_offset)
         return self._decoded_entries
 
     #------ PRIVATE ------#
@@ -138,12 +150,17 @@ class LineProgram(object):
             # Add an entry that doesn't visibly set a new state
             entries.append(LineProgramEntry(cmd, is_extended, args, None))
 
+        if self.data is None:
+            self.data = buffer_from_stream(self.stream)
+        data = self.data
+        readers = self.structs.Dwarf_readers
+        read_uleb128 = readers['uleb128']
+        read_sleb128 = readers['sleb128']
+
         offset = self.program_start_offset
         while offset < self.program_end_offset:
-            opcode = struct_parse(
-                self.structs.Dwarf_uint8(''), 
-                self.stream,
-                offset)
+            opcode = data[offset]
+            offset += 1
 
             # As an exercise in avoiding premature optimization, if...elif
             # chains are used here for standard and extended opcodes instead
@@ -168,10 +185,9 @@ class LineProgram(object):
             elif opcode == 0:
                 # Extended opcode: start with a zero byte, followed by
                 # instruction size and the instruction itself.
-                inst_len = struct_parse(self.structs.Dwarf_uleb128(''),
-                                        self.stream)
-                ex_opcode = struct_parse(self.structs.Dwarf_uint8(''),
-                                         self.stream)
+                inst_len, offset = read_uleb128(data, offset)
+                ex_opcode = data[offset]
+                offset += 1
 
                 if ex_opcode == DW_LNE_end_sequence:
                     state.end_sequence = True
@@ -179,44 +195,41 @@ class LineProgram(object):
                     # reset state
                     state = LineState(self.header['default_is_stmt']) 
                 elif ex_opcode == DW_LNE_set_address:
-                    operand = struct_parse(self.structs.Dwarf_target_addr(''),
-                                           self.stream)
+                    operand, offset = readers['target_addr'](data, offset)
                     state.address = operand
                     add_entry_old_state(ex_opcode, [operand], is_extended=True)
                 elif ex_opcode == DW_LNE_define_file:
                     operand = struct_parse(
-                        self.structs.Dwarf_lineprog_file_entry, self.stream)
+                        self.structs.Dwarf_lineprog_file_entry,
+                        self.stream, offset)
+                    offset = self.stream.tell()
                     self['file_entry'].append(operand)
                     add_entry_old_state(ex_opcode, [operand], is_extended=True)
                 else:
                     # Unknown, but need to roll forward the stream because the
-                    # length is specified. Seek forward inst_len - 1 because
+                    # length is specified. Skip inst_len - 1 bytes because
                     # we've already read the extended opcode, which takes part
                     # in the length.
-                    self.stream.seek(inst_len - 1, os.SEEK_CUR)
+                    offset += inst_len - 1
             else: # 0 < opcode < opcode_base
                 # Standard opcode
                 if opcode == DW_LNS_copy:
                     add_entry_new_state(opcode, [])
                 elif opcode == DW_LNS_advance_pc:
-                    operand = struct_parse(self.structs.Dwarf_uleb128(''),
-                                           self.stream)
+                    operand, offset = read_uleb128(data, offset)
                     address_addend = (
                         operand * self.header['minimum_instruction_length'])
                     state.address += address_addend
                     add_entry_old_state(opcode, [address_addend])
                 elif opcode == DW_LNS_advance_line:
-                    operand = struct_parse(self.structs.Dwarf_sleb128(''),
-                                           self.stream)
+                    operand, offset = read_sleb128(data, offset)
                     state.line += operand
                 elif opcode == DW_LNS_set_file:
-                    operand = struct_parse(self.structs.Dwarf_uleb128(''),
-                                           self.stream)
+                    operand, offset = read_uleb128(data, offset)
                     state.file = operand
                     add_entry_old_state(opcode, [operand])
                 elif opcode == DW_LNS_set_column:
-                    operand = struct_parse(self.structs.Dwarf_uleb128(''),
-                                           self.stream)
+                    operand, offset = read_uleb128(data, offset)
                     state.column = operand
                     add_entry_old_state(opcode, [operand])
                 elif opcode == DW_LNS_negate_stmt:
@@ -232,8 +245,7 @@ class LineProgram(object):
                     state.address += address_addend
                     add_entry_old_state(opcode, [address_addend])
                 elif opcode == DW_LNS_fixed_advance_pc:
-                    operand = struct_parse(self.structs.Dwarf_uint16(''),
-                                           self.stream)
+                    operand, offset = readers['uint16'](data, offset)
                     state.address += operand
                     add_entry_old_state(opcode, [operand])
                 elif opcode == DW_LNS_set_prologue_end:
@@ -243,13 +255,11 @@ class LineProgram(object):
                     state.epilogue_begin = True
                     add_entry_old_state(opcode, [])
                 elif opcode == DW_LNS_set_isa:
-                    operand = struct_parse(self.structs.Dwarf_uleb128(''),
-                                           self.stream)
+                    operand, offset = read_uleb128(data, offset)
                     state.isa = operand
                     add_entry_old_state(opcode, [operand])
                 else:
                     dwarf_assert(False, 'Invalid standard line program opcode: %s' % (
                         opcode,))
-            offset = self.stream.tell()
         return entries
 
@@ -7,13 +7,17 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
+from struct import Struct as Packer
+
 from ..construct import (
     UBInt8, UBInt16, UBInt32, UBInt64, ULInt8, ULInt16, ULInt32, ULInt64,
     SBInt8, SBInt16, SBInt32, SBInt64, SLInt8, SLInt16, SLInt32, SLInt64,
     Adapter, Struct, ConstructError, If, Enum, Array, PrefixedArray,
     CString, Embed, StaticField
     )
-from ..common.construct_utils import RepeatUntilExcluding, ULEB128, SLEB128
+from ..common.construct_utils import (RepeatUntilExcluding, ULEB128, SLEB128,
+    decode_uleb128, decode_sleb128)
+from ..common.utils import parse_cstring_from_buffer
 from .enums import *
 
 
@@ -59,6 +63,20 @@ class DWARFStructs(object):
                 that parse such forms. These Structs have already been given
                 dummy names.
 
+            Dwarf_readers, Dwarf_dw_form_readers:
+                Counterparts of the above for parsing from a buffer (see
+                DWARFInfo.get_section_data) at explicit offsets, without
+                construct and streams. The former maps names of the basic
+                types - 'uint8', 'int16', 'offset', 'target_addr', 'uleb128'
+                and so on - and the latter 'DW_FORM_*' keys into functions
+                read(data, offset) that return the value at offset in data
+                and the offset past it.
+
+            Dwarf_dw_form_formats:
+                Maps the fixed-size 'DW_FORM_*' keys into struct module
+                formats, starting with the byte order character (just the
+                byte order for DW_FORM_flag_present, which takes no space).
+
             Dwarf_lineprog_header (+):
                 Line program header
 
@@ -129,6 +147,7 @@ class DWARFStructs(object):
             self.Dwarf_int32 = SBInt32
             self.Dwarf_int64 = SBInt64
 
+        self._create_readers()
         self._create_initial_length()
         self._create_leb128()
         self._create_cu_header()
@@ -215,6 +234,86 @@ class DWARFStructs(object):
             DW_AT_GNU_all_call_sites=self.Dwarf_uleb128(''),
         )
 
+    def _create_readers(self):
+        prefix = '<' if self.little_endian else '>'
+        offset = 'I' if self.dwarf_format == 32 else 'Q'
+        target_addr = 'I' if self.address_size == 4 else 'Q'
+        self.Dwarf_readers = dict(
+            uint8=_uint8_reader,
+            uint16=_fixed_size_reader(prefix + 'H'),
+            uint32=_fixed_size_reader(prefix + 'I'),
+            uint64=_fixed_size_reader(prefix + 'Q'),
+            int8=_fixed_size_reader('b'),
+            int16=_fixed_size_reader(prefix + 'h'),
+            int32=_fixed_size_reader(prefix + 'i'),
+            int64=_fixed_size_reader(prefix + 'q'),
+            offset=_fixed_size_reader(prefix + offset),
+            length=_fixed_size_reader(prefix + offset),
+            target_addr=_fixed_size_reader(prefix + target_addr),
+            uleb128=decode_uleb128,
+            sleb128=decode_sleb128,
+        )
+        readers = self.Dwarf_readers
+
+        self.Dwarf_dw_form_readers = dict(
+            DW_FORM_addr=readers['target_addr'],
+
+            DW_FORM_block1=_block_reader(readers['uint8']),
+            DW_FORM_block2=_block_reader(readers['uint16']),
+            DW_FORM_block4=_block_reader(readers['uint32']),
+            DW_FORM_block=_block_reader(readers['uleb128']),
+
+            DW_FORM_data1=readers['uint8'],
+            DW_FORM_data2=readers['uint16'],
+            DW_FORM_data4=readers['uint32'],
+            DW_FORM_data8=readers['uint64'],
+            DW_FORM_sdata=readers['sleb128'],
+            DW_FORM_udata=readers['uleb128'],
+
+            DW_FORM_string=_cstring_reader,
+            DW_FORM_strp=readers['offset'],
+            DW_FORM_flag=readers['uint8'],
+
+            DW_FORM_ref1=readers['uint8'],
+            DW_FORM_ref2=readers['uint16'],
+            DW_FORM_ref4=readers['uint32'],
+            DW_FORM_ref8=readers['uint64'],
+            DW_FORM_ref_udata=readers['uleb128'],
+            DW_FORM_ref_addr=readers['offset'],
+
+            DW_FORM_indirect=readers['uleb128'],
+
+            DW_FORM_flag_present=_empty_reader,
+            DW_FORM_sec_offset=readers['offset'],
+            DW_FORM_exprloc=_block_reader(readers['uleb128']),
+            DW_FORM_ref_sig8=readers['uint64'],
+
+            DW_FORM_GNU_strp_alt=readers['offset'],
+            DW_FORM_GNU_ref_alt=readers['offset'],
+            DW_AT_GNU_all_call_sites=readers['uleb128'],
+        )
+
+        self.Dwarf_dw_form_formats = dict(
+            (form, prefix + fmt) for form, fmt in (
+                ('DW_FORM_addr', target_addr),
+                ('DW_FORM_data1', 'B'),
+                ('DW_FORM_data2', 'H'),
+                ('DW_FORM_data4', 'I'),
+                ('DW_FORM_data8', 'Q'),
+                ('DW_FORM_strp', offset),
+                ('DW_FORM_flag', 'B'),
+                ('DW_FORM_ref1', 'B'),
+                ('DW_FORM_ref2', 'H'),
+                ('DW_FORM_ref4', 'I'),
+                ('DW_FORM_ref8', 'Q'),
+                ('DW_FORM_ref_addr', offset),
+                ('DW_FORM_flag_present', ''),
+                ('DW_FORM_sec_offset', offset),
+                ('DW_FORM_ref_sig8', 'Q'),
+                ('DW_FORM_GNU_strp_alt', offset),
+                ('DW_FORM_GNU_ref_alt', offset),
+            ))
+
     def _create_aranges_header(self):
         self.Dwarf_aranges_header = Struct("Dwarf_aranges_header",
             self.Dwarf_initial_length('unit_length'),
@@ -303,6 +402,30 @@ class DWARFStructs(object):
                     length_field=length_field(''))
 
 
+# DWARFStructs instances shared by get_dwarf_structs
+_dwarf_structs_cache = {}
+
+
+def get_dwarf_structs(little_endian, dwarf_format, address_size,
+                      dwarf_version=2):
+    """ Get a DWARFStructs for the given parameters (see DWARFStructs). The
+        instances are memoized and shared by all users - compile units, line
+        programs, aranges and CFI entries - so they must not be modified.
+
+        Building the structs is costly, while a binary only ever needs a
+        handful of different ones however many compile units it has.
+    """
+    key = (bool(little_endian), dwarf_format, address_size, dwarf_version)
+    structs = _dwarf_structs_cache.get(key)
+    if structs is None:
+        structs = _dwarf_structs_cache[key] = DWARFStructs(
+            little_endian=little_endian,
+            dwarf_format=dwarf_format,
+            address_size=address_size,
+            dwarf_version=dwarf_version)
+    return structs
+
+
 class _InitialLengthAdapter(Adapter):
     """ A standard Construct adapter that expects a sub-construct
         as a struct with one or two values (first, second).
@@ -316,3 +439,43 @@ class _InitialLengthAdapter(Adapter):
             else:
                 raise ConstructError("Failed decoding initial length for %X" % (
                     obj.first))
+
+
+# Buffer readers (see DWARFStructs.Dwarf_readers). Reading past the end of
+# the buffer raises IndexError or struct.error.
+
+def _fixed_size_reader(fmt):
+    packer = Packer(fmt)
+    unpack_from = packer.unpack_from
+    size = packer.size
+    def read(data, offset):
+        return unpack_from(data, offset)[0], offset + size
+    return read
+
+
+def _uint8_reader(data, offset):
+    return data[offset], offset + 1
+
+
+def _block_reader(read_length):
+    """ DW_FORM_block*: a length followed by as many bytes, returned as a
+        list of ints
+    """
+    def read(data, offset):
+        length, offset = read_length(data, offset)
+        end = offset + length
+        if end > len(data):
+            raise IndexError('block of %d bytes past the end of data' % length)
+        return list(bytearray(data[offset:end])), end
+    return read
+
+
+def _cstring_reader(data, offset):
+    value, end = parse_cstring_from_buffer(data, offset)
+    if value is None:
+        raise IndexError('unterminated string at offset %d' % offset)
+    return value, end
+
+
+def _empty_reader(data, offset):
+    return b'', offset
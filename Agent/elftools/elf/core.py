@@ -0,0 +1,241 @@
+#-------------------------------------------------------------------------------
+# elftools: elf/core.py
+#
+# Memory image of a process recorded in an ELF core file
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+from bisect import bisect_right
+import struct
+
+from ..common.exceptions import ELFError
+from ..common.py3compat import bytes2str
+from ..common.utils import elf_assert
+from .segments import NoteSegment
+
+
+class CoreRegion(object):
+    """ One PT_LOAD segment of a core file: the memory range [start, end)
+        of the process, of which the first filesz bytes were dumped to the
+        file at offset.
+
+        name is the path of the file mapped there according to the NT_FILE
+        note (None for anonymous memory) and file_offset the offset of start
+        within that file.
+    """
+    def __init__(self, header, name=None, file_offset=None):
+        self.header = header
+        self.start = header['p_vaddr']
+        self.end = self.start + max(header['p_memsz'], header['p_filesz'])
+        self.offset = header['p_offset']
+        self.filesz = header['p_filesz']
+        self.flags = header['p_flags']
+        self.name = name
+        self.file_offset = file_offset
+
+    @property
+    def dumped_end(self):
+        """ End address of the part of the region present in the core file
+        """
+        return self.start + self.filesz
+
+    def __contains__(self, address):
+        return self.start <= address < self.end
+
+    def __repr__(self):
+        return '<CoreRegion %#x-%#x %s>' % (self.start, self.end,
+                                           self.name or '[anon]')
+
+
+class CoreMemory(object):
+    """ Read access to the memory of the process an ELF core file was taken
+        from.
+
+        The file is memory-mapped (elffile is re-mapped if it wasn't created
+        with use_mmap=True and its stream can be) and reads are served by
+        slicing the map; regions are found by bisecting their sorted start
+        addresses. Memory that is mapped in the process but wasn't dumped
+        (p_filesz < p_memsz, e.g. read-only file mappings) can't be read.
+
+        Reads raise ELFError for addresses that aren't available. Multi-byte
+        values are decoded with the byte order of the core file.
+    """
+    def __init__(self, elffile):
+        elf_assert(elffile['e_type'] == 'ET_CORE',
+                   'Expected a core file, got %s' % elffile['e_type'])
+        self.elffile = elffile
+        if elffile.get_view(0, 0) is None:
+            elffile._map_stream()
+        self._byte_order = '<' if elffile.little_endian else '>'
+        self._pointer_format = 'I' if elffile.elfclass == 32 else 'Q'
+        self._structs = {}
+        self.file_mappings = self._read_file_mappings()
+        self.regions = self._make_regions()
+        self._starts = [region.start for region in self.regions]
+
+    def iter_regions(self, name=None):
+        """ Yield the memory regions in address order - only those mapping
+            the file called name, if given.
+        """
+        for region in self.regions:
+            if name is None or region.name == name:
+                yield region
+
+    def find_region(self, address):
+        """ Return the CoreRegion containing address, or None
+        """
+        i = bisect_right(self._starts, address) - 1
+        if i >= 0 and address < self.regions[i].end:
+            return self.regions[i]
+        return None
+
+    def is_readable(self, address, size=1):
+        """ Whether [address, address + size) was dumped, within one region
+        """
+        region = self.find_region(address)
+        return region is not None and address + size <= region.dumped_end
+
+    def region_data(self, region):
+        """ The dumped contents of region, as a memoryview if the file is
+            mapped (bytes otherwise)
+        """
+        return self._file_data(region.offset, region.filesz)
+
+    def view(self, address, size):
+        """ Contents of [address, address + size), which must lie in a single
+            region - a zero-copy memoryview if the file is mapped.
+        """
+        region = self._dumped_region(address)
+        elf_assert(address + size <= region.dumped_end,
+                   'Range %#x-%#x crosses the end of %r' %
+                   (address, address + size, region))
+        return self._file_data(region.offset + address - region.start, size)
+
+    def read(self, address, size):
+        """ Read size bytes at address; the range may span adjacent regions
+        """
+        chunks = []
+        while size > 0:
+            region = self._dumped_region(address)
+            count = min(size, region.dumped_end - address)
+            chunks.append(self._file_data(
+                region.offset + address - region.start, count))
+            address += count
+            size -= count
+        return b''.join(bytes(chunk) for chunk in chunks)
+
+    def unpack_from(self, fmt, address):
+        """ struct.unpack_from at address. fmt uses the core file's byte
+            order unless it starts with a byte order character.
+        """
+        st = self._get_struct(fmt)
+        region = self._dumped_region(address)
+        if address + st.size <= region.dumped_end:
+            return st.unpack_from(self._file_data(
+                region.offset + address - region.start, st.size))
+        return st.unpack(self.read(address, st.size))
+
+    def read_u8(self, address):
+        return self.unpack_from('B', address)[0]
+
+    def read_u16(self, address):
+        return self.unpack_from('H', address)[0]
+
+    def read_u32(self, address):
+        return self.unpack_from('I', address)[0]
+
+    def read_u64(self, address):
+        return self.unpack_from('Q', address)[0]
+
+    def read_pointer(self, address):
+        """ Read a pointer-sized unsigned value (per the core file's class)
+        """
+        return self.unpack_from(self._pointer_format, address)[0]
+
+    def read_cstring(self, address, max_size=4096):
+        """ Read a NUL-terminated string at address and return its bytes,
+            without the terminator. Raise ELFError if no NUL is found within
+            max_size bytes or readable memory.
+        """
+        chunks = []
+        while max_size > 0:
+            region = self._dumped_region(address)
+            count = min(max_size, region.dumped_end - address)
+            data = bytes(self._file_data(
+                region.offset + address - region.start, count))
+            end = data.find(b'\x00')
+            if end >= 0:
+                chunks.append(data[:end])
+                return b''.join(chunks)
+            chunks.append(data)
+            address += count
+            max_size -= count
+        raise ELFError('No NUL terminator found at %#x' % address)
+
+    #-------------------------------- PRIVATE --------------------------------#
+
+    def _dumped_region(self, address):
+        region = self.find_region(address)
+        if region is None:
+            raise ELFError('Address %#x is not mapped in the core' % address)
+        if address >= region.dumped_end:
+            raise ELFError('Address %#x of %r is not in the core file' %
+                           (address, region))
+        return region
+
+    def _file_data(self, offset, size):
+        view = self.elffile.get_view(offset, size)
+        if view is None:
+            self.elffile.stream.seek(offset)
+            view = self.elffile.stream.read(size)
+        elf_assert(len(view) == size,
+                   'Expected %d bytes at offset %#x, core file is truncated' %
+                   (size, offset))
+        return view
+
+    def _get_struct(self, fmt):
+        st = self._structs.get(fmt)
+        if st is None:
+            if fmt[:1] in ('@', '=', '<', '>', '!'):
+                st = struct.Struct(fmt)
+            else:
+                st = struct.Struct(self._byte_order + fmt)
+            self._structs[fmt] = st
+        return st
+
+    def _read_file_mappings(self):
+        """ The NT_FILE note as a sorted list of
+            (vm_start, vm_end, file offset, filename) tuples
+        """
+        mappings = []
+        for segment in self.elffile.iter_segments():
+            if not isinstance(segment, NoteSegment):
+                continue
+            for note in segment.iter_notes():
+                if note['n_type'] != 'NT_FILE':
+                    continue
+                desc = note['n_desc']
+                page_size = desc['page_size']
+                for entry, filename in zip(desc['Elf_Nt_File_Entry'],
+                                           desc['filename']):
+                    mappings.append((entry['vm_start'], entry['vm_end'],
+                                     entry['page_offset'] * page_size,
+                                     bytes2str(filename)))
+        mappings.sort()
+        return mappings
+
+    def _make_regions(self):
+        starts = [mapping[0] for mapping in self.file_mappings]
+        regions = []
+        for segment in self.elffile.iter_segments():
+            if segment['p_type'] != 'PT_LOAD':
+                continue
+            name = file_offset = None
+            vaddr = segment['p_vaddr']
+            i = bisect_right(starts, vaddr) - 1
+            if i >= 0 and vaddr < self.file_mappings[i][1]:
+                vm_start, _, page_offset, name = self.file_mappings[i]
+                file_offset = page_offset + vaddr - vm_start
+            regions.append(CoreRegion(segment.header, name, file_offset))
+        regions.sort(key=lambda region: region.start)
+        return regions
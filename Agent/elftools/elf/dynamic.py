@@ -33,6 +33,26 @@ class _DynamicStringTable(object):
         return s.decode('utf-8') if s else ''
 
 
+class _DynamicSymbolReader(object):
+    """ Reads single symbols of a DynamicSegment's DT_SYMTAB on demand, for
+        hash table lookups.
+    """
+    def __init__(self, segment, table_offset):
+        self._segment = segment
+        self._table_offset = table_offset
+        self._symbol_size = segment.elfstructs.Elf_Sym.sizeof()
+
+    def get_symbol(self, index):
+        if self._segment._symbol_list is not None:
+            # all symbols have been read already
+            return self._segment._symbol_list[index]
+        symbol = struct_parse(self._segment.elfstructs.Elf_Sym,
+                              self._segment._stream,
+                              self._table_offset + index * self._symbol_size)
+        name = self._segment._get_stringtable().get_string(symbol['st_name'])
+        return Symbol(symbol, name)
+
+
 class DynamicTag(object):
     """ Dynamic Tag object - representing a single dynamic tag entry from a
         dynamic section.
@@ -230,6 +250,7 @@ class DynamicSegment(Segment, Dynamic):
         Dynamic.__init__(self, stream, elffile, stringtable, self['p_offset'])
         self._symbol_list = None
         self._symbol_name_map = None
+        self._hash_table = False
 
     def num_symbols(self):
         """ Number of symbols in the table recovered from DT_SYMTAB
@@ -248,7 +269,14 @@ class DynamicSegment(Segment, Dynamic):
     def get_symbol_by_name(self, name):
         """ Get a symbol(s) by name. Return None if no symbol by the given name
             exists.
+
+            If the segment has a DT_GNU_HASH or DT_HASH table, only the
+            symbols in the name's hash chain are read.
         """
+        hash_table = self._get_hash_table()
+        if hash_table is not None:
+            return hash_table.get_symbols(name)
+
         # The first time this method is called, construct a name to number
         # mapping
         #
@@ -259,6 +287,26 @@ class DynamicSegment(Segment, Dynamic):
         symnums = self._symbol_name_map.get(name)
         return [self.get_symbol(i) for i in symnums] if symnums else None
 
+    def _get_hash_table(self):
+        """ The GNUHashSection or HashSection of this segment, set up to read
+            symbols one at a time; None if there is neither.
+        """
+        if self._hash_table is False:
+            self._hash_table = None
+            _, tab_offset = self.get_table_offset('DT_SYMTAB')
+            if tab_offset is not None:
+                _, gnu_hash_offset = self.get_table_offset('DT_GNU_HASH')
+                _, hash_offset = self.get_table_offset('DT_HASH')
+                if gnu_hash_offset is not None:
+                    self._hash_table = GNUHashSection(
+                        self.stream, gnu_hash_offset, self.elffile,
+                        _DynamicSymbolReader(self, tab_offset))
+                elif hash_offset is not None:
+                    self._hash_table = HashSection(
+                        self.stream, hash_offset, self.elffile,
+                        _DynamicSymbolReader(self, tab_offset))
+        return self._hash_table
+
     def iter_symbols(self):
         """ Yield all symbols in this dynamic segment. The symbols are usually
             the same as returned by SymbolTableSection.iter_symbols. However,
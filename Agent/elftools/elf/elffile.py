@@ -6,8 +6,11 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
+from bisect import bisect_right
 import io
+import mmap
 import struct
+import weakref
 import zlib
 
 try:
@@ -15,12 +18,11 @@ try:
     PAGESIZE = resource.getpagesize()
 except ImportError:
     # Windows system
-    import mmap
     PAGESIZE = mmap.PAGESIZE
 
 from ..common.py3compat import BytesIO
 from ..common.exceptions import ELFError
-from ..common.utils import struct_parse, elf_assert
+from ..common.utils import struct_parse, elf_assert, MemoryViewStream
 from .structs import ELFStructs
 from .sections import (
         Section, StringTableSection, SymbolTableSection,
@@ -61,13 +63,33 @@ class ELFFile(object):
 
             e_ident_raw:
                 the raw e_ident field of the header
+
+        If use_mmap is True, the file behind the stream is memory-mapped
+        (in-memory streams such as BytesIO are used directly) and
+        Section.data_view() hands out zero-copy memoryview slices of it; DWARF
+        sections that need no relocation are parsed straight from the map.
+        Streams that can't be mapped silently fall back to regular reads.
+
+        If use_records is True, headers and symbol, relocation and dynamic
+        table entries are parsed into slotted Records instead of Containers.
+        They are accessed the same way (entry['st_value'] or entry.st_value)
+        but take a fraction of the memory; their fields can't be added or
+        deleted.
     """
-    def __init__(self, stream):
+    # Sorted PT_LOAD index for address translation, built on first use
+    _load_index = None
+
+    def __init__(self, stream, use_mmap=False, use_records=False):
         self.stream = stream
+        self._mmap = None
+        self._view = None
+        if use_mmap:
+            self._map_stream()
         self._identify_file()
         self.structs = ELFStructs(
             little_endian=self.little_endian,
-            elfclass=self.elfclass)
+            elfclass=self.elfclass,
+            use_records=use_records)
 
         self.structs.create_basic_structs()
         self.header = self._parse_elf_header()
@@ -78,6 +100,13 @@ class ELFFile(object):
         self.stream.seek(0)
         self.e_ident_raw = self.stream.read(16)
 
+        # Header tables are parsed in one go on first use and kept. Section
+        # and Segment objects are reused for as long as a caller holds them:
+        # they can carry a whole symbol or string table.
+        self._section_headers = None
+        self._segment_headers = None
+        self._section_cache = weakref.WeakValueDictionary()
+        self._segment_cache = weakref.WeakValueDictionary()
         self._file_stringtable_section = self._get_file_stringtable()
         self._section_name_map = None
 
@@ -90,8 +119,11 @@ class ELFFile(object):
         """ Get the section at index #n from the file (Section object or a
             subclass)
         """
-        section_header = self._get_section_header(n)
-        return self._make_section(section_header)
+        section = self._section_cache.get(n)
+        if section is None:
+            section = self._make_section(self._get_section_header(n))
+            self._section_cache[n] = section
+        return section
 
     def get_section_by_name(self, name):
         """ Get a section from the file, by name. Return None if no such
@@ -121,8 +153,11 @@ class ELFFile(object):
     def get_segment(self, n):
         """ Get the segment at index #n from the file (Segment object)
         """
-        segment_header = self._get_segment_header(n)
-        return self._make_segment(segment_header)
+        segment = self._segment_cache.get(n)
+        if segment is None:
+            segment = self._make_segment(self._get_segment_header(n))
+            self._segment_cache[n] = segment
+        return segment
 
     def iter_segments(self):
         """ Yield all the segments in the file
@@ -137,13 +172,52 @@ class ELFFile(object):
             offset of the region is yielded.
         """
         end = start + size
-        for seg in self.iter_segments():
-            # consider LOAD only to prevent same address being yielded twice
-            if seg['p_type'] != 'PT_LOAD':
-                continue
-            if (start >= seg['p_vaddr'] and
-                end <= seg['p_vaddr'] + seg['p_filesz']):
-                yield start - seg['p_vaddr'] + seg['p_offset']
+        starts, loads, overlapping = self._get_load_index()
+        if overlapping:
+            candidates = loads
+        else:
+            i = bisect_right(starts, start) - 1
+            candidates = loads[i:i + 1] if i >= 0 else ()
+        for vaddr, memsz, offset, filesz in candidates:
+            if start >= vaddr and end <= vaddr + filesz:
+                yield start - vaddr + offset
+
+    def vaddr_to_offset(self, address):
+        """ Translate a virtual address to a file offset using the PT_LOAD
+            segments. Return None if the address isn't mapped or lies in the
+            part of a segment that isn't backed by the file (p_memsz beyond
+            p_filesz, e.g. .bss).
+        """
+        load = self._find_load(address)
+        if load is None:
+            return None
+        vaddr, memsz, offset, filesz = load
+        if address >= vaddr + filesz:
+            return None
+        return address - vaddr + offset
+
+    def read_vaddr(self, address, size):
+        """ Read size bytes of the memory image at virtual address, as the
+            PT_LOAD segments lay it out; reads may span adjacent segments.
+            Memory beyond p_filesz reads as zeros. Raise ELFError if part of
+            the range isn't mapped or the file is truncated.
+        """
+        chunks = []
+        while size > 0:
+            load = self._find_load(address)
+            if load is None:
+                raise ELFError('Address %#x is not mapped' % address)
+            vaddr, memsz, offset, filesz = load
+            count = min(size, vaddr + memsz - address)
+            from_file = max(0, min(count, vaddr + filesz - address))
+            if from_file:
+                chunks.append(
+                    self._read_file(address - vaddr + offset, from_file))
+            if count > from_file:
+                chunks.append(b'\x00' * (count - from_file))
+            address += count
+            size -= count
+        return b''.join(chunks)
 
     def has_dwarf_info(self):
         """ Check whether this file appears to have debugging information.
@@ -403,6 +477,31 @@ class ELFFile(object):
 
         return architectures.get(self['e_machine'], '<unknown>')
 
+    def close(self):
+        """ Release the memory map created with use_mmap=True, if any. Reads
+            go to the stream again afterwards; the stream itself is left
+            open. Views handed out earlier keep the map alive until they
+            are collected.
+        """
+        view, self._view = self._view, None
+        if self._mmap is None:
+            return
+        if hasattr(view, 'release'):
+            view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+        self._mmap = None
+
+    def get_view(self, offset, size):
+        """ Return a memoryview of size bytes of the file at offset (shorter
+            if the file ends first), or None if the file is not mapped.
+        """
+        if self._view is None:
+            return None
+        return self._view[offset:offset + size]
+
     #-------------------------------- PRIVATE --------------------------------#
 
     def __getitem__(self, name):
@@ -436,6 +535,79 @@ class ELFFile(object):
         else:
             raise ELFError('Invalid EI_DATA %s' % repr(ei_data))
 
+    def _get_load_index(self):
+        """ Return (starts, loads, overlapping): the PT_LOAD segments as
+            (p_vaddr, p_memsz, p_offset, p_filesz) tuples sorted by address,
+            their start addresses, and whether any of them overlap (if so,
+            lookups check them all, in the original order).
+        """
+        if self._load_index is None:
+            loads = [(seg['p_vaddr'], max(seg['p_memsz'], seg['p_filesz']),
+                      seg['p_offset'], seg['p_filesz'])
+                     for seg in self.iter_segments()
+                     if seg['p_type'] == 'PT_LOAD']
+            ordered = sorted(loads, key=lambda load: load[0])
+            overlapping = any(
+                prev[0] + prev[1] > cur[0]
+                for prev, cur in zip(ordered, ordered[1:]))
+            if overlapping:
+                self._load_index = ([], loads, True)
+            else:
+                self._load_index = (
+                    [load[0] for load in ordered], ordered, False)
+        return self._load_index
+
+    def _find_load(self, address):
+        """ The PT_LOAD tuple (see _get_load_index) whose memory image
+            contains address, or None
+        """
+        starts, loads, overlapping = self._get_load_index()
+        if overlapping:
+            for load in loads:
+                if load[0] <= address < load[0] + load[1]:
+                    return load
+            return None
+        i = bisect_right(starts, address) - 1
+        if i >= 0 and address < starts[i] + loads[i][1]:
+            return loads[i]
+        return None
+
+    def _read_file(self, offset, size):
+        """ Read size bytes at offset of the file (from the map if there is
+            one)
+        """
+        if self._view is not None:
+            data = self._view[offset:offset + size].tobytes()
+        else:
+            self.stream.seek(offset)
+            data = self.stream.read(size)
+        elf_assert(len(data) == size,
+                   'Expected %d bytes at offset %#x, file is truncated' %
+                   (size, offset))
+        return data
+
+    def _map_stream(self):
+        """ Map the stream's contents for zero-copy access, if possible
+        """
+        getbuffer = getattr(self.stream, 'getbuffer', None)
+        if getbuffer is not None:
+            self._view = getbuffer()
+            return
+        try:
+            fileno = self.stream.fileno()
+            self._mmap = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        except (AttributeError, io.UnsupportedOperation, ValueError,
+                EnvironmentError):
+            # not backed by a (non-empty, regular) file
+            self._mmap = None
+            return
+        try:
+            self._view = memoryview(self._mmap)
+        except TypeError:
+            # Python 2's mmap doesn't support the new buffer protocol
+            self._mmap.close()
+            self._mmap = None
+
     def _section_offset(self, n):
         """ Compute the offset of section #n in the file
         """
@@ -462,6 +634,12 @@ class ELFFile(object):
     def _get_section_header(self, n):
         """ Find the header of section #n, parse it and return the struct
         """
+        if self._section_headers is None:
+            self._section_headers = self._parse_header_table(
+                self.structs.Elf_Shdr, self['e_shoff'], self['e_shentsize'],
+                self.num_sections())
+        if 0 <= n < len(self._section_headers):
+            return self._section_headers[n]
         return struct_parse(
             self.structs.Elf_Shdr,
             self.stream,
@@ -560,11 +738,33 @@ class ELFFile(object):
     def _get_segment_header(self, n):
         """ Find the header of segment #n, parse it and return the struct
         """
+        if self._segment_headers is None:
+            self._segment_headers = self._parse_header_table(
+                self.structs.Elf_Phdr, self['e_phoff'], self['e_phentsize'],
+                self.num_segments())
+        if 0 <= n < len(self._segment_headers):
+            return self._segment_headers[n]
         return struct_parse(
             self.structs.Elf_Phdr,
             self.stream,
             stream_pos=self._segment_offset(n))
 
+    def _parse_header_table(self, header_struct, offset, entsize, count):
+        """ Read a whole section or program header table with a single read
+            and parse all its entries. Returns an empty list if the table
+            isn't entirely in the file; the headers are then parsed one by one
+            as they are asked for.
+        """
+        if count == 0 or entsize < header_struct.sizeof():
+            return []
+        self.stream.seek(offset)
+        data = self.stream.read(entsize * count)
+        if len(data) < entsize * count:
+            return []
+        table_stream = MemoryViewStream(data)
+        return [struct_parse(header_struct, table_stream, i * entsize)
+                for i in range(count)]
+
     def _get_file_stringtable(self):
         """ Find the file's string table section
         """
@@ -584,13 +784,19 @@ class ELFFile(object):
         """ Read the contents of a DWARF section from the stream and return a
             DebugSectionDescriptor. Apply relocations if asked to.
         """
-        # The section data is read into a new stream, for processing
-        section_stream = BytesIO()
-        section_stream.write(section.data())
-
+        reloc_section = None
         if relocate_dwarf_sections:
             reloc_handler = RelocationHandler(self)
             reloc_section = reloc_handler.find_relocations_for_section(section)
+
+        if (reloc_section is None and self._view is not None and
+                not section.compressed):
+            # Nothing to patch - parse the mapped file directly
+            section_stream = MemoryViewStream(section.data_view())
+        else:
+            # The section data is read into a new stream, for processing
+            section_stream = BytesIO()
+            section_stream.write(section.data())
             if reloc_section is not None:
                 reloc_handler.apply_section_relocations(
                         section_stream, reloc_section)
@@ -10,17 +10,46 @@
 from ..common.utils import struct_parse
 
 
+def elf_hash(name):
+    """ Compute the SysV (DT_HASH) hash of a symbol name (str or bytes).
+    """
+    if not isinstance(name, bytes):
+        name = name.encode('utf-8')
+    h = 0
+    for c in bytearray(name):
+        h = (h << 4) + c
+        x = h & 0xF0000000
+        if x != 0:
+            h ^= (x >> 24)
+        h &= ~x
+    return h
+
+
+def gnu_hash(name):
+    """ Compute the GNU (DT_GNU_HASH) hash of a symbol name (str or bytes).
+    """
+    if not isinstance(name, bytes):
+        name = name.encode('utf-8')
+    h = 5381
+    for c in bytearray(name):
+        h = (h * 33 + c) & 0xFFFFFFFF
+    return h
+
+
 class HashSection(object):
-    """ Minimal part of an ELF hash section to find the number of symbols in the
+    """ Part of an ELF hash section: finds the number of symbols in the
         symbol table - useful for super-stripped binaries without section
         headers where only the start of the symbol table is known from the
-        dynamic segment. The layout and contents are nicely described at
+        dynamic segment - and looks up symbols by name when given a
+        symboltable (anything with a get_symbol(index) method). The layout and
+        contents are nicely described at
         https://flapenguin.me/2017/04/24/elf-lookup-dt-hash/.
     """
-    def __init__(self, stream, offset, elffile):
+    def __init__(self, stream, offset, elffile, symboltable=None):
         self._stream = stream
         self._offset = offset
         self._elffile = elffile
+        self._symboltable = symboltable
         self.params = struct_parse(self._elffile.structs.Elf_Hash,
                                    self._stream,
                                    self._offset)
@@ -30,18 +59,43 @@ class HashSection(object):
         """
         return self.params['nchains']
 
+    def get_symbols(self, name):
+        """ Return the list of symbols called name, walking only the hash
+            chain of its bucket, or None if there are none.
+        """
+        nbuckets = self.params['nbuckets']
+        if nbuckets == 0:
+            return None
+        chains = self.params['chains']
+        found = []
+        idx = self.params['buckets'][elf_hash(name) % nbuckets]
+        seen = set()
+        # STN_UNDEF (0) ends the chain
+        while idx != 0 and idx < len(chains) and idx not in seen:
+            seen.add(idx)
+            symbol = self._symboltable.get_symbol(idx)
+            if symbol.name == name:
+                found.append((idx, symbol))
+            idx = chains[idx]
+        found.sort(key=lambda item: item[0])
+        return [symbol for _, symbol in found] or None
+
 
 class GNUHashSection(object):
-    """ Minimal part of a GNU hash section to find the number of symbols in the
+    """ Part of a GNU hash section: finds the number of symbols in the
         symbol table - useful for super-stripped binaries without section
         headers where only the start of the symbol table is known from the
-        dynamic segment. The layout and contents are nicely described at
+        dynamic segment - and looks up symbols by name when given a
+        symboltable (anything with a get_symbol(index) method). The layout and
+        contents are nicely described at
         https://flapenguin.me/2017/05/10/elf-lookup-dt-gnu-hash/.
     """
-    def __init__(self, stream, offset, elffile):
+    def __init__(self, stream, offset, elffile, symboltable=None):
         self._stream = stream
         self._offset = offset
         self._elffile = elffile
+        self._symboltable = symboltable
+        self._unhashed = None
         self.params = struct_parse(self._elffile.structs.Gnu_Hash,
                                    self._stream,
                                    self._offset)
@@ -50,9 +104,7 @@ class GNUHashSection(object):
         """ Get the number of symbols in the hash table by finding the bucket
             with the highest symbol index and walking to the end of its chain.
         """
-        # Element sizes in the hash table
         wordsize = self._elffile.structs.Elf_word('').sizeof()
-        xwordsize = self._elffile.structs.Elf_xword('').sizeof()
 
         # Find highest index in buckets array
         max_idx = max(self.params['buckets'])
@@ -60,10 +112,7 @@ class GNUHashSection(object):
             return self.params['symoffset']
 
         # Position the stream at the start of the corresponding chain
-        chain_pos = self._offset + 4 * wordsize + \
-            self.params['bloom_size'] * xwordsize + \
-            self.params['nbuckets'] * wordsize + \
-            (max_idx - self.params['symoffset']) * wordsize
+        chain_pos = self._chain_pos(max_idx)
 
         # Walk the chain to its end (lowest bit is set)
         while True:
@@ -75,3 +124,71 @@ class GNUHashSection(object):
 
             max_idx += 1
             chain_pos += wordsize
+
+    def get_symbols(self, name):
+        """ Return the list of symbols called name, or None if there are
+            none. The Bloom filter rejects most missing names without touching
+            the chains; otherwise only the chain of the name's bucket is
+            walked, and only symbols whose hash matches are read.
+
+            Symbols below symoffset (typically the undefined ones) are not
+            hashed, so when nothing is found those are looked up in a table
+            of them by name, built on first use.
+        """
+        h = gnu_hash(name)
+        found = []
+        if self._may_contain(h):
+            found = self._walk_chain(h, name)
+        if not found:
+            found = list(self._get_unhashed_symbols().get(name, ()))
+        return found or None
+
+    def _get_unhashed_symbols(self):
+        # Symbols below symoffset by name, in symbol table order
+        if self._unhashed is None:
+            self._unhashed = {}
+            for idx in range(1, self.params['symoffset']):
+                symbol = self._symboltable.get_symbol(idx)
+                self._unhashed.setdefault(symbol.name, []).append(symbol)
+        return self._unhashed
+
+    def _may_contain(self, h):
+        # Both bits picked by the hash must be set in the Bloom filter word
+        bloom_size = self.params['bloom_size']
+        if bloom_size == 0 or self.params['nbuckets'] == 0:
+            return False
+        bits = self._elffile.elfclass
+        word = self.params['bloom'][(h // bits) % bloom_size]
+        mask = (1 << (h % bits)) | \
+            (1 << ((h >> self.params['bloom_shift']) % bits))
+        return word & mask == mask
+
+    def _walk_chain(self, h, name):
+        symoffset = self.params['symoffset']
+        idx = self.params['buckets'][h % self.params['nbuckets']]
+        if idx < symoffset:
+            return []
+        found = []
+        elf_word = self._elffile.structs.Elf_word('elem')
+        wordsize = elf_word.sizeof()
+        chain_pos = self._chain_pos(idx)
+        while True:
+            # The chain holds hashes with the lowest bit marking the end
+            cur_hash = struct_parse(elf_word, self._stream, chain_pos)
+            if cur_hash | 1 == h | 1:
+                symbol = self._symboltable.get_symbol(idx)
+                if symbol.name == name:
+                    found.append(symbol)
+            if cur_hash & 1:
+                return found
+            idx += 1
+            chain_pos += wordsize
+
+    def _chain_pos(self, idx):
+        # Element sizes in the hash table
+        wordsize = self._elffile.structs.Elf_word('').sizeof()
+        xwordsize = self._elffile.structs.Elf_xword('').sizeof()
+        return self._offset + 4 * wordsize + \
+            self.params['bloom_size'] * xwordsize + \
+            self.params['nbuckets'] * wordsize + \
+            (idx - self.params['symoffset']) * wordsize
@@ -14,6 +14,11 @@ from .notes import iter_notes
 
 import zlib
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class Section(object):
     """ Base class for ELF sections. Also used for all sections types that have
@@ -102,6 +107,20 @@ class Section(object):
 
         return result
 
+    def data_view(self):
+        """ The section data as a memoryview.
+
+        For uncompressed sections of an ELFFile created with use_mmap=True
+        this is a slice of the mapped file and nothing is copied; otherwise
+        it wraps the result of data().
+        """
+        if not self.compressed:
+            view = self.elffile.get_view(self['sh_offset'],
+                                         self._decompressed_size)
+            if view is not None:
+                return view
+        return memoryview(self.data())
+
     def is_null(self):
         """ Is this a null section?
         """
@@ -131,13 +150,38 @@ class NullSection(Section):
 
 class StringTableSection(Section):
     """ ELF string table section.
+
+        Strings are read from the stream on each lookup until load() is
+        called; from then on they are extracted from the in-memory table.
+        Either way, decoded strings are remembered by offset.
     """
+    def __init__(self, header, name, elffile):
+        super(StringTableSection, self).__init__(header, name, elffile)
+        self._table = None
+        self._strings = {}
+
+    def load(self):
+        """ Read the whole string table into memory (once) and return it.
+        """
+        if self._table is None:
+            self._table = self.data()
+        return self._table
+
     def get_string(self, offset):
         """ Get the string stored at the given offset in this string table.
         """
-        table_offset = self['sh_offset']
-        s = parse_cstring_from_stream(self.stream, table_offset + offset)
-        return s.decode('utf-8') if s else ''
+        s = self._strings.get(offset)
+        if s is not None:
+            return s
+        if self._table is None:
+            table_offset = self['sh_offset']
+            raw = parse_cstring_from_stream(self.stream, table_offset + offset)
+        else:
+            end = self._table.find(b'\x00', offset)
+            raw = self._table[offset:end] if end > offset else None
+        s = raw.decode('utf-8') if raw else ''
+        self._strings[offset] = s
+        return s
 
 
 class SymbolTableSection(Section):
@@ -152,6 +196,8 @@ class SymbolTableSection(Section):
         elf_assert(self['sh_size'] % self['sh_entsize'] == 0,
                 'Expected section size to be a multiple of entry size in section %r' % name)
         self._symbol_name_map = None
+        self._symbol_array = None
+        self._symbol_names = None
 
     def num_symbols(self):
         """ Number of symbols in the table
@@ -180,8 +226,13 @@ class SymbolTableSection(Section):
         #
         if self._symbol_name_map is None:
             self._symbol_name_map = defaultdict(list)
-            for i, sym in enumerate(self.iter_symbols()):
-                self._symbol_name_map[sym.name].append(i)
+            self._load_stringtable()
+            if numpy is not None:
+                names = self.get_symbol_names()
+            else:
+                names = (sym.name for sym in self.iter_symbols())
+            for i, symname in enumerate(names):
+                self._symbol_name_map[symname].append(i)
         symnums = self._symbol_name_map.get(name)
         return [self.get_symbol(i) for i in symnums] if symnums else None
 
@@ -191,6 +242,63 @@ class SymbolTableSection(Section):
         for i in range(self.num_symbols()):
             yield self.get_symbol(i)
 
+    def get_symbol_array(self):
+        """ Decode the whole table at once into a NumPy structured array
+            with st_name, st_info, st_other, st_shndx, st_value and st_size
+            fields holding the raw integer values. Requires numpy.
+        """
+        if self._symbol_array is None:
+            if numpy is None:
+                raise ImportError('numpy is required for get_symbol_array')
+            self._symbol_array = numpy.frombuffer(
+                self.data_view(), dtype=self._symbol_dtype(),
+                count=self.num_symbols())
+        return self._symbol_array
+
+    def get_symbol_names(self):
+        """ Names of all the symbols in the table, in order, resolved from a
+            single read of the string table. Requires numpy.
+        """
+        if self._symbol_names is None:
+            self._load_stringtable()
+            get_string = self.stringtable.get_string
+            self._symbol_names = [
+                get_string(offset)
+                for offset in self.get_symbol_array()['st_name'].tolist()]
+        return self._symbol_names
+
+    def iter_symbol_views(self):
+        """ Yield a SymbolView for every symbol in the table. The table is
+            decoded in bulk (see get_symbol_array) and each entry is only
+            parsed into a construct Container if it is accessed by a field
+            that isn't a plain integer. Requires numpy.
+        """
+        array = self.get_symbol_array()
+        names = self.get_symbol_names()
+        for i in range(len(array)):
+            yield SymbolView(self, array, i, names[i])
+
+    def _load_stringtable(self):
+        # Full-table scans look up every name; read the strings in one go
+        if isinstance(self.stringtable, StringTableSection):
+            self.stringtable.load()
+
+    def _symbol_dtype(self):
+        endian = '<' if self.elffile.little_endian else '>'
+        if self.elffile.elfclass == 32:
+            layout = [('st_name', 'u4', 0), ('st_value', 'u4', 4),
+                      ('st_size', 'u4', 8), ('st_info', 'u1', 12),
+                      ('st_other', 'u1', 13), ('st_shndx', 'u2', 14)]
+        else:
+            layout = [('st_name', 'u4', 0), ('st_info', 'u1', 4),
+                      ('st_other', 'u1', 5), ('st_shndx', 'u2', 6),
+                      ('st_value', 'u8', 8), ('st_size', 'u8', 16)]
+        return numpy.dtype({
+            'names': [name for name, _, _ in layout],
+            'formats': [endian + fmt for _, fmt, _ in layout],
+            'offsets': [offset for _, _, offset in layout],
+            'itemsize': self['sh_entsize']})
+
 
 class Symbol(object):
     """ Symbol object - representing a single symbol entry from a symbol table
@@ -209,6 +317,35 @@ class Symbol(object):
         return self.entry[name]
 
 
+class SymbolView(Symbol):
+    """ A Symbol backed by a row of SymbolTableSection.get_symbol_array().
+
+        st_name, st_value and st_size are read straight from the array; the
+        construct entry (with st_info, st_other and st_shndx decoded the same
+        way get_symbol does it) is parsed on first use.
+    """
+    _RAW_FIELDS = frozenset(('st_name', 'st_value', 'st_size'))
+
+    def __init__(self, symtab, array, index, name):
+        self._symtab = symtab
+        self._array = array
+        self._index = index
+        self._entry = None
+        self.name = name
+
+    @property
+    def entry(self):
+        if self._entry is None:
+            self._entry = self._symtab.structs.Elf_Sym.parse(
+                self._array[self._index].tobytes())
+        return self._entry
+
+    def __getitem__(self, name):
+        if self._entry is None and name in self._RAW_FIELDS:
+            return int(self._array[name][self._index])
+        return self.entry[name]
+
+
 class SUNWSyminfoTableSection(Section):
     """ ELF .SUNW Syminfo table section.
         Has an associated SymbolTableSection that's passed in the constructor.
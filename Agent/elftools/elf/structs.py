@@ -13,7 +13,7 @@ from ..construct import (
     SBInt32, SLInt32, SBInt64, SLInt64,
     Struct, Array, Enum, Padding, BitStruct, BitField, Value, String, CString
     )
-from ..common.construct_utils import ULEB128
+from ..common.construct_utils import ULEB128, compile_struct
 from .enums import *
 
 
@@ -38,11 +38,16 @@ class ELFStructs(object):
 
             Elf_Rel, Elf_Rela:
                 Entries in relocation sections
+
+        If use_records is True, the fixed-layout structs (the headers, symbol,
+        relocation and dynamic entries...) parse into compact slotted Records
+        rather than Containers - see construct_utils.record_class.
     """
-    def __init__(self, little_endian=True, elfclass=32):
+    def __init__(self, little_endian=True, elfclass=32, use_records=False):
         assert elfclass == 32 or elfclass == 64
         self.little_endian = little_endian
         self.elfclass = elfclass
+        self.use_records = use_records
 
     def create_basic_structs(self):
         """ Create word-size related structs and ehdr struct needed for
@@ -71,6 +76,7 @@ class ELFStructs(object):
         self._create_ehdr()
         self._create_leb128()
         self._create_ntbs()
+        self.Elf_Ehdr = compile_struct(self.Elf_Ehdr, self.use_records)
 
     def create_advanced_structs(self, e_type=None, e_machine=None, e_ident_osabi=None):
         """ Create all ELF structs except the ehdr. They may possibly depend
@@ -92,9 +98,20 @@ class ELFStructs(object):
         self._create_arm_attributes()
         self._create_elf_hash()
         self._create_gnu_hash()
+        self._compile_fixed_structs()
 
     #-------------------------------- PRIVATE --------------------------------#
 
+    def _compile_fixed_structs(self):
+        # The records parsed most often have fixed layouts; parse each with
+        # a single precompiled struct.Struct. Note headers get the note's
+        # name and description added by iter_notes, so they stay Containers.
+        for name in ('Elf_Phdr', 'Elf_Shdr', 'Elf_Chdr', 'Elf_Sym', 'Elf_Rel',
+                     'Elf_Rela', 'Elf_Dyn', 'Elf_Sunw_Syminfo', 'Elf_Nhdr',
+                     'Elf_Versym'):
+            records = self.use_records and name != 'Elf_Nhdr'
+            setattr(self, name, compile_struct(getattr(self, name), records))
+
     def _create_ehdr(self):
         self.Elf_Ehdr = Struct('Elf_Ehdr',
             Struct('e_ident',
@@ -0,0 +1,188 @@
+#-------------------------------------------------------------------------------
+# elftools: elf/symbolizer.py
+#
+# Address to symbol lookups over ELF symbol tables
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+from bisect import bisect_right
+
+from ..common.exceptions import ELFError
+from .dynamic import DynamicSegment
+from .enums import ENUM_ST_INFO_TYPE
+from .sections import SymbolTableSection, SymbolView, numpy
+
+# Symbols of these types don't describe addressable code or data
+_SKIPPED_TYPES = frozenset(('STT_SECTION', 'STT_FILE', 'STT_TLS'))
+_SKIPPED_TYPE_VALUES = tuple(ENUM_ST_INFO_TYPE[name]
+                             for name in _SKIPPED_TYPES)
+# Zero-sized symbols of these types may be extended to the next symbol
+_EXTENDED_TYPES = frozenset(('STT_FUNC', 'STT_NOTYPE'))
+
+
+class SymbolIndex(object):
+    """ An interval index answering "which symbol covers this address?".
+
+        symbols is an iterable of Symbol objects whose st_value is a virtual
+        address (executables, shared objects, core files - not relocatable
+        objects). Undefined symbols and section, file and TLS symbols are
+        left out.
+
+        A symbol covers [st_value, st_value + st_size). Symbols may overlap
+        or nest; a lookup returns the covering symbol with the highest start
+        address, so the innermost one for nested symbols. Among symbols at
+        the same address, sized ones win over zero-sized ones and smaller
+        ones over larger ones. If extend_zero_sized is True (the default) a
+        zero-sized function or untyped symbol - typically a hand-written
+        assembly routine - covers everything up to the next symbol's start
+        address; other zero-sized symbols only cover their own address.
+
+        Single lookups use bisect; lookup_indices and lookup_many do batches
+        with numpy.searchsorted when numpy is installed.
+    """
+    def __init__(self, symbols, extend_zero_sized=True):
+        self._init_entries([sym for sym in symbols if _is_indexed(sym)],
+                           extend_zero_sized)
+
+    @classmethod
+    def from_elffile(cls, elffile, extend_zero_sized=True):
+        """ Build the index from all the symbol table sections of elffile, or
+            from the dynamic segment's symbols if it has no symbol tables
+            (e.g. stripped binaries).
+        """
+        symbols = []
+        seen = set()
+        for section in elffile.iter_sections():
+            if isinstance(section, SymbolTableSection):
+                for sym in _iter_defined_symbols(section):
+                    key = (sym.name, sym['st_value'], sym['st_size'])
+                    if key not in seen:
+                        seen.add(key)
+                        symbols.append(sym)
+        if not symbols:
+            for segment in elffile.iter_segments():
+                if isinstance(segment, DynamicSegment):
+                    try:
+                        symbols.extend(sym for sym in segment.iter_symbols()
+                                       if _is_indexed(sym))
+                    except ELFError:
+                        # no usable DT_SYMTAB
+                        pass
+        index = cls.__new__(cls)
+        index._init_entries(symbols, extend_zero_sized)
+        return index
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def lookup(self, address):
+        """ Return (symbol, offset into the symbol) for address, or None if
+            no symbol covers it.
+        """
+        i = bisect_right(self.starts, address) - 1
+        ends = self.ends
+        parents = self._parents
+        while i >= 0 and address >= ends[i]:
+            i = parents[i]
+        if i < 0:
+            return None
+        return self.symbols[i], address - self.starts[i]
+
+    def lookup_indices(self, addresses):
+        """ Vectorized lookup: return a numpy array with, for each address,
+            the index into self.symbols of its covering symbol, or -1.
+            Requires numpy.
+        """
+        if numpy is None:
+            raise ImportError('numpy is required for lookup_indices')
+        starts, ends, parents = self._get_arrays()
+        addresses = numpy.asarray(addresses, dtype=numpy.uint64)
+        idx = numpy.searchsorted(starts, addresses, side='right') - 1
+        # Walk outwards from the last symbol starting at or before each
+        # address until one covers it; nesting is rarely more than a few
+        # levels deep, so few iterations are needed.
+        pending = numpy.nonzero(idx >= 0)[0]
+        while len(pending):
+            current = idx[pending]
+            outside = addresses[pending] >= ends[current]
+            pending = pending[outside]
+            idx[pending] = parents[current[outside]]
+            pending = pending[idx[pending] >= 0]
+        return idx
+
+    def lookup_many(self, addresses):
+        """ Lookup a batch of addresses; returns a list of (symbol, offset)
+            tuples or None, as lookup() does.
+        """
+        if numpy is None:
+            return [self.lookup(address) for address in addresses]
+        addresses = list(addresses)
+        symbols = self.symbols
+        starts = self.starts
+        return [None if i < 0 else (symbols[i], address - starts[i])
+                for i, address in zip(
+                    self.lookup_indices(addresses).tolist(), addresses)]
+
+    def _init_entries(self, entries, extend_zero_sized):
+        # Sort by start; at equal starts zero-sized symbols go first and
+        # sized ones by decreasing size, so that the last one - which
+        # bisect_right lands on - is the innermost.
+        entries.sort(key=lambda sym: (sym['st_value'], sym['st_size'] > 0,
+                                      -sym['st_size']))
+        self.symbols = entries
+        self.starts = starts = [sym['st_value'] for sym in entries]
+        ends = []
+        for start, sym in zip(starts, entries):
+            size = sym['st_size']
+            if size:
+                ends.append(start + size)
+                continue
+            following = bisect_right(starts, start)
+            if (extend_zero_sized and following < len(starts) and
+                    sym['st_info']['type'] in _EXTENDED_TYPES):
+                ends.append(starts[following])
+            else:
+                ends.append(start + 1)
+        self.ends = ends
+        # Link each symbol to the closest earlier one still open at its
+        # start; lookups follow these links outwards. Every symbol covering
+        # an address is on the chain from the last symbol starting before it.
+        parents = []
+        open_symbols = []
+        for i, start in enumerate(starts):
+            while open_symbols and ends[open_symbols[-1]] <= start:
+                open_symbols.pop()
+            parents.append(open_symbols[-1] if open_symbols else -1)
+            open_symbols.append(i)
+        self._parents = parents
+        self._arrays = None
+
+    def _get_arrays(self):
+        if self._arrays is None:
+            self._arrays = (
+                numpy.array(self.starts, dtype=numpy.uint64),
+                numpy.array(self.ends, dtype=numpy.uint64),
+                numpy.array(self._parents, dtype=numpy.intp))
+        return self._arrays
+
+
+def _is_indexed(sym):
+    return (sym['st_shndx'] != 'SHN_UNDEF' and
+            sym['st_info']['type'] not in _SKIPPED_TYPES)
+
+
+def _iter_defined_symbols(symtab):
+    """ Yield the symbols of symtab an index would keep. With numpy the
+        table is filtered in bulk and only the survivors become SymbolViews.
+    """
+    if numpy is None:
+        for sym in symtab.iter_symbols():
+            if _is_indexed(sym):
+                yield sym
+        return
+    array = symtab.get_symbol_array()
+    names = symtab.get_symbol_names()
+    keep = array['st_shndx'] != 0
+    keep &= ~numpy.isin(array['st_info'] & 0xf, _SKIPPED_TYPE_VALUES)
+    for i in numpy.nonzero(keep)[0].tolist():
+        yield SymbolView(symtab, array, i, names[i])
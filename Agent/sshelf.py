@@ -1,3 +1,5 @@
+from elftools.common.exceptions import ELFError
+from elftools.elf.core import CoreMemory
 from elftools.elf.elffile import ELFFile
 from elftools.elf.sections import SymbolTableSection
 import sys
@@ -28,13 +30,12 @@ class Segment(object):
     offset=None
     sz=None
     data=None
-    def __init__(self,segm,fl):
-        self.virtMem=segm['p_vaddr']
-        self.offset=segm['p_offset']
-        self.sz=segm['p_memsz']
-        fl.seek(self.offset)
-        self.data=fl.read(self.sz)
-        #print(data)
+    def __init__(self,region,core):
+        # only the part of the mapping that was dumped
+        self.virtMem=region.start
+        self.offset=region.offset
+        self.sz=region.filesz
+        self.data=bytes(core.region_data(region))
 
 """struct name {								\
 	struct type *tqh_first;	/* first element */			\
@@ -121,24 +122,24 @@ class sshkey(object):
 class Virtmem(object):
     segms=[]
     def __init__(self,efile,fl):
-        self.segms=[]
+        self.core=CoreMemory(efile)
+        self.segms=[Segment(region,self.core) for region in self.core.iter_regions() if region.filesz]
+        self.bystart=dict((s.virtMem,s) for s in self.segms)
         self.instances={}
-        for segment in elffile.iter_segments():
-           s=Segment(segment,fl)
-           self.segms.append(s)
     def addrInSegm(self,addr):
-        for s in self.segms:
-            if(addr>=s.virtMem and addr <s.virtMem+s.sz):
-                return s
-        return None
+        region=self.core.find_region(addr)
+        if region is None or not self.core.is_readable(addr): return None
+        return self.bystart[region.start]
     def getPtr(self,addr):
-        sg=self.addrInSegm(addr)
-        if sg is None: return None
-        return struct.unpack("@P",sg.data[addr-sg.virtMem:addr-sg.virtMem+8])[0]
+        try:
+            return self.core.unpack_from("@P",addr)[0]
+        except ELFError:
+            return None
     def getInt32(self,addr):
-        sg=self.addrInSegm(addr)
-        if sg is None: return None
-        return struct.unpack("@i",sg.data[addr-sg.virtMem:addr-sg.virtMem+4])[0]
+        try:
+            return self.core.unpack_from("@i",addr)[0]
+        except ELFError:
+            return None
     def getIdtable(self,addr):
         sg=self.addrInSegm(addr)
         if sg is None: return None
@@ -150,15 +151,10 @@ class Virtmem(object):
         return identity(sg.data[addr-sg.virtMem:])   
     def readCstr(self,addr):
         if addr==0 :return '';
-        sg=self.addrInSegm(addr)
-        if sg is None: return None
-        lst=[]
-        cnt=addr-sg.virtMem
-        while sg.data[cnt]!=0:
-            lst.append(sg.data[cnt])
-            cnt=cnt+1 
-        #print(bytes(lst))    
-        return    bytes(lst).decode('utf-8')   
+        try:
+            return self.core.read_cstring(addr,1<<20).decode('utf-8')
+        except ELFError:
+            return None
     def regInstance(self,addr,sti):
         if not addr in self.instances:
             self.instances[addr]={}
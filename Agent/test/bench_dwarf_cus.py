@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------------
+# test/bench_dwarf_cus.py
+#
+# Time DWARF parsing passes over an object with many compile units
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+""" Usage: python test/bench_dwarf_cus.py [--cus N] [--runs N] [--cc CC]
+
+    By default a synthetic little-endian ELF64 file is generated, with
+    --cus DWARF 2 compile units of a few DIEs each (a base type, functions
+    with local variables and references between them) sharing one
+    abbreviation table, and a line program per CU. With --cc, --cus
+    one-function C files are compiled with CC -g -gdwarf-4 into a shared
+    object instead, which also has .eh_frame and .debug_aranges.
+
+    Each pass opens the file anew, since DWARFInfo keeps the CUs it parsed.
+"""
+import argparse
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+# Make it possible to run this file from the root dir of pyelftools without
+# installing pyelftools
+sys.path[0:0] = ['.']
+
+from elftools.elf.elffile import ELFFile
+
+try:
+    timer = time.perf_counter
+except AttributeError:
+    timer = time.time
+
+
+def uleb128(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def cstring(text):
+    return text.encode('ascii') + b'\x00'
+
+
+# (code, tag, has children, [(attribute, form)])
+_ABBREVS = [
+    (1, 0x11, True, [(0x03, 0x08), (0x10, 0x06), (0x11, 0x01), (0x12, 0x01)]),
+    (2, 0x24, False, [(0x03, 0x08), (0x0b, 0x0b), (0x3e, 0x0b)]),
+    (3, 0x2e, True, [(0x03, 0x08), (0x49, 0x13), (0x11, 0x01), (0x12, 0x01),
+                     (0x3f, 0x0c)]),
+    (4, 0x34, False, [(0x03, 0x08), (0x49, 0x13), (0x02, 0x0a)]),
+]
+
+
+def debug_abbrev():
+    out = b''
+    for code, tag, children, specs in _ABBREVS:
+        out += uleb128(code) + uleb128(tag) + (b'\x01' if children else b'\x00')
+        for name, form in specs:
+            out += uleb128(name) + uleb128(form)
+        out += b'\x00\x00'
+    return out + b'\x00'
+
+
+def compile_unit(n, funcs, stmt_list, low_pc):
+    """ The DWARF 2 CU #n (header and DIEs) with funcs functions of two
+        local variables each
+    """
+    dies = b''
+    # CU-relative offset of the first DIE, past the 11-byte header
+    offset = 11
+    cu_die = (uleb128(1) + cstring('cu%d.c' % n) +
+              struct.pack('<IQQ', stmt_list, low_pc, low_pc + 16 * funcs))
+    base_type = uleb128(2) + cstring('int') + b'\x04\x05'
+    int_offset = offset + len(cu_die)
+    dies = cu_die + base_type
+    for i in range(funcs):
+        pc = low_pc + 16 * i
+        dies += (uleb128(3) + cstring('f%d_%d' % (n, i)) +
+                 struct.pack('<IQQ', int_offset, pc, pc + 16) + b'\x01')
+        for var in ('a', 'b'):
+            dies += (uleb128(4) + cstring(var) + struct.pack('<I', int_offset) +
+                     b'\x02\x91' + (b'\x6c' if var == 'a' else b'\x68'))
+        dies += b'\x00'
+    dies += b'\x00'
+    body = struct.pack('<HIB', 2, 0, 8) + dies
+    return struct.pack('<I', len(body)) + body
+
+
+def line_program(n, funcs, low_pc):
+    """ A DWARF 2 line program for CU #n: a row per function
+    """
+    opcode_base = 10
+    header = (struct.pack('<BBbBB', 1, 1, -5, 14, opcode_base) +
+              b'\x00\x01\x01\x01\x01\x00\x00\x00\x01' +
+              b'\x00' + cstring('cu%d.c' % n) + b'\x00\x00\x00' + b'\x00')
+    program = b'\x00\x09\x02' + struct.pack('<Q', low_pc) + b'\x01'
+    for i in range(1, funcs):
+        # advance_pc 16, advance_line 2, copy
+        program += b'\x02\x10\x03\x02\x01'
+    program += b'\x02\x10\x00\x01\x01'
+    body = struct.pack('<HI', 2, len(header)) + header + program
+    return struct.pack('<I', len(body)) + body
+
+
+def synthetic_elf(path, cus, funcs):
+    """ Write a little-endian ELF64 file with just the DWARF sections
+    """
+    info = []
+    line = []
+    line_size = 0
+    for n in range(cus):
+        low_pc = 0x400000 + n * 16 * funcs
+        program = line_program(n, funcs, low_pc)
+        info.append(compile_unit(n, funcs, line_size, low_pc))
+        line.append(program)
+        line_size += len(program)
+    sections = [('.debug_abbrev', debug_abbrev()),
+                ('.debug_info', b''.join(info)),
+                ('.debug_line', b''.join(line))]
+    shstrtab = b'\x00' + b''.join(cstring(name) for name, _ in sections)
+    shstrtab += cstring('.shstrtab')
+    sections.append(('.shstrtab', shstrtab))
+
+    data = b''
+    headers = [b'\x00' * 64]
+    name_offset = 1
+    offset = 64
+    for name, contents in sections:
+        sh_type = 3 if name == '.shstrtab' else 1
+        headers.append(struct.pack('<IIQQQQIIQQ', name_offset, sh_type, 0, 0,
+                                   offset, len(contents), 0, 0, 1, 0))
+        name_offset += len(name) + 1
+        data += contents
+        offset += len(contents)
+    padding = -offset % 8
+    ehdr = (b'\x7fELF\x02\x01\x01' + b'\x00' * 9 +
+            struct.pack('<HHIQQQIHHHHHH', 2, 62, 1, 0, 0, offset + padding,
+                        0, 64, 0, 0, 64, len(headers), len(headers) - 1))
+    with open(path, 'wb') as f:
+        f.write(ehdr + data + b'\x00' * padding + b''.join(headers))
+
+
+def compiled_object(path, cus, cc):
+    """ Compile cus one-function C files with cc into the shared object path
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        sources = []
+        for n in range(cus):
+            source = 'f%d.c' % n
+            with open(os.path.join(tmpdir, source), 'w') as f:
+                f.write('int f%d(int x) { int y = x * %d; return y + 1; }\n'
+                        % (n, n))
+            sources.append(source)
+        subprocess.check_call([cc, '-g', '-gdwarf-4', '-O0', '-fPIC',
+                               '-shared', '-o', os.path.abspath(path)] +
+                              sources, cwd=tmpdir)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def iter_CUs(dwarfinfo):
+    for cu in dwarfinfo.iter_CUs():
+        pass
+
+
+def top_DIEs(dwarfinfo):
+    for cu in dwarfinfo.iter_CUs():
+        cu.get_top_DIE()
+
+
+def all_DIEs(dwarfinfo):
+    for cu in dwarfinfo.iter_CUs():
+        for die in cu.iter_DIEs():
+            pass
+
+
+def line_programs(dwarfinfo):
+    for cu in dwarfinfo.iter_CUs():
+        lineprog = dwarfinfo.line_program_for_CU(cu)
+        if lineprog is not None:
+            lineprog.get_entries()
+
+
+def call_frames(dwarfinfo):
+    if dwarfinfo.has_CFI():
+        dwarfinfo.CFI_entries()
+    if dwarfinfo.has_EH_CFI():
+        dwarfinfo.EH_CFI_entries()
+
+
+def aranges(dwarfinfo):
+    ar = dwarfinfo.get_aranges()
+    if ar is not None:
+        ar.cu_offset_at_addr(0)
+
+
+PASSES = [('iter_CUs', iter_CUs), ('top DIEs', top_DIEs),
+          ('all DIEs', all_DIEs), ('line programs', line_programs),
+          ('call frames', call_frames), ('aranges', aranges)]
+
+
+def run(path, func, runs):
+    """ Best time of runs passes of func over a fresh DWARFInfo of path
+    """
+    best = None
+    for _ in range(runs):
+        with open(path, 'rb') as f:
+            start = timer()
+            func(ELFFile(f).get_dwarf_info())
+            took = timer() - start
+        if best is None or took < best:
+            best = took
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time DWARF parsing of an object with many CUs')
+    parser.add_argument('--cus', type=int, default=5000)
+    parser.add_argument('--funcs', type=int, default=4,
+                        help='functions per CU of the synthetic file')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--cc', help='compile C sources with this compiler '
+                        'instead of generating the file')
+    parser.add_argument('--keep', help='keep the object at this path')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    path = args.keep or os.path.join(tmpdir, 'many_cus.elf')
+    try:
+        if args.cc:
+            compiled_object(path, args.cus, args.cc)
+        else:
+            synthetic_elf(path, args.cus, args.funcs)
+        with open(path, 'rb') as f:
+            dwarfinfo = ELFFile(f).get_dwarf_info()
+            count = sum(1 for _ in dwarfinfo.iter_CUs())
+            has_CFI = dwarfinfo.has_CFI() or dwarfinfo.has_EH_CFI()
+            has_aranges = dwarfinfo.get_aranges() is not None
+        print('%s: %d CUs, %d bytes' % (
+            'compiled' if args.cc else 'synthetic', count,
+            os.path.getsize(path)))
+        for name, func in PASSES:
+            if ((func is call_frames and not has_CFI) or
+                    (func is aranges and not has_aranges)):
+                continue
+            best = run(path, func, args.runs)
+            print('%-16s%10.3f s%10.1f us/CU' % (name, best,
+                                                 best * 1e6 / max(count, 1)))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
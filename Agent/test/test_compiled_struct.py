@@ -0,0 +1,76 @@
+#-------------------------------------------------------------------------------
+# elftools tests
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+import os
+import random
+import unittest
+
+from elftools.common.construct_utils import CompiledStruct, compile_struct
+from elftools.common.exceptions import ELFParseError
+from elftools.common.py3compat import BytesIO
+from elftools.common.utils import struct_parse
+from elftools.construct import ConstructError, Struct, UBInt8, CString
+from elftools.elf.structs import ELFStructs
+
+
+class TestCompiledStruct(unittest.TestCase):
+    NAMES = ('Elf_Ehdr', 'Elf_Phdr', 'Elf_Shdr', 'Elf_Sym', 'Elf_Rel',
+             'Elf_Rela', 'Elf_Dyn', 'Elf_Nhdr', 'Elf_Versym')
+
+    def _structs(self):
+        for little_endian in (True, False):
+            for elfclass in (32, 64):
+                structs = ELFStructs(little_endian, elfclass)
+                structs.create_basic_structs()
+                structs.create_advanced_structs()
+                yield structs
+
+    def test_same_as_struct(self):
+        rand = random.Random(42)
+        for structs in self._structs():
+            for name in self.NAMES:
+                compiled = getattr(structs, name)
+                self.assertIsInstance(compiled, CompiledStruct)
+                original = compiled.subcon
+                size = compiled.sizeof()
+                self.assertEqual(size, original.sizeof())
+                for _ in range(50):
+                    data = bytes(bytearray(rand.randrange(256)
+                                           for _ in range(size)))
+                    try:
+                        expected = original.parse(data)
+                    except ConstructError as ex:
+                        self.assertRaises(type(ex), compiled.parse, data)
+                        continue
+                    self.assertEqual(compiled.parse(data), expected)
+                    self.assertEqual(
+                        compiled.parse_from(b'xx' + data, 2), expected)
+                    self.assertEqual(compiled.build(expected),
+                                     original.build(expected))
+
+    def test_short_read(self):
+        structs = next(self._structs())
+        self.assertRaises(ELFParseError, struct_parse, structs.Elf_Sym,
+                          BytesIO(b'\x00' * 4))
+
+    def test_not_compilable(self):
+        struct = Struct('s', UBInt8('a'), CString('b'))
+        self.assertIs(compile_struct(struct), struct)
+
+    def test_parse_file(self):
+        path = os.path.join('test', 'testfiles_for_unittests',
+                            'simple_gcc.elf.arm')
+        with open(path, 'rb') as f:
+            structs = ELFStructs(True, 32)
+            structs.create_basic_structs()
+            header = struct_parse(structs.Elf_Ehdr, f, 0)
+            self.assertEqual(header, struct_parse(structs.Elf_Ehdr.subcon,
+                                                  f, 0))
+            self.assertEqual(header['e_ident']['EI_MAG'],
+                             [0x7f, 0x45, 0x4c, 0x46])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#-------------------------------------------------------------------------------
+# elftools tests
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+import os
+import struct
+import unittest
+
+from elftools.common.exceptions import ELFError
+from elftools.common.py3compat import BytesIO
+from elftools.elf.core import CoreMemory
+from elftools.elf.elffile import ELFFile
+
+
+class TestCoreMemory(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._core_file = open(os.path.join('test',
+                              'testfiles_for_unittests', 'core_linux64.elf'),
+                              'rb')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._core_file.close()
+
+    def setUp(self):
+        self.memory = CoreMemory(ELFFile(self._core_file))
+
+    def test_regions(self):
+        regions = list(self.memory.iter_regions())
+        self.assertEqual(len(regions), 18)
+        self.assertEqual(sorted(regions, key=lambda r: r.start), regions)
+        exe = '/home/max42/pyelftools/test/coredump_self'
+        self.assertEqual(
+            [(r.start, r.file_offset) for r in self.memory.iter_regions(exe)],
+            [(0x400000, 0), (0x600000, 0), (0x601000, 0x1000)])
+        libc_text = self.memory.find_region(0x7fa45956d123)
+        self.assertEqual(libc_text.name, '/lib/x86_64-linux-gnu/libc-2.23.so')
+        self.assertEqual(libc_text.filesz, 0)
+        self.assertIsNone(self.memory.find_region(0x1000))
+        self.assertIsNone(self.memory.find_region(0x7fa459773000).name)
+
+    def test_reads(self):
+        memory = self.memory
+        # the executable's ELF header
+        self.assertEqual(memory.read(0x400000, 4), b'\x7fELF')
+        self.assertEqual(memory.read_u8(0x400004), 2)
+        self.assertEqual(memory.read_u16(0x400010), 2)  # ET_EXEC
+        self.assertEqual(memory.read_u32(0x400000), 0x464c457f)
+        self.assertEqual(memory.read_u64(0x400000),
+                         struct.unpack('<Q', memory.read(0x400000, 8))[0])
+        self.assertEqual(memory.read_pointer(0x400018),
+                         memory.read_u64(0x400018))
+        self.assertEqual(memory.unpack_from('>I', 0x400000), (0x7f454c46,))
+        self.assertEqual(memory.read_cstring(0x400001), b'ELF\x02\x01\x01')
+        self.assertEqual(bytes(memory.view(0x400000, 4)), b'\x7fELF')
+        region = memory.find_region(0x400000)
+        self.assertEqual(bytes(memory.region_data(region)[:4]), b'\x7fELF')
+
+    def test_read_across_regions(self):
+        memory = self.memory
+        data = memory.read(0x600ff8, 16)
+        self.assertEqual(data, memory.read(0x600ff8, 8) +
+                         memory.read(0x601000, 8))
+        self.assertEqual(memory.unpack_from('QQ', 0x600ff8),
+                         struct.unpack('<QQ', data))
+        self.assertRaises(ELFError, memory.view, 0x600ff8, 16)
+
+    def test_unavailable(self):
+        memory = self.memory
+        self.assertRaises(ELFError, memory.read, 0x1000, 1)
+        # mapped in the process, but not dumped
+        self.assertFalse(memory.is_readable(0x7fa45956d000))
+        self.assertRaises(ELFError, memory.read_u64, 0x7fa45956d000)
+        self.assertRaises(ELFError, memory.read, 0x400ff8, 16)
+
+    def test_unmapped_stream(self):
+        self._core_file.seek(0)
+        contents = self._core_file.read()
+        memory = CoreMemory(ELFFile(BytesIO(contents)))
+        self.assertEqual(memory.read_u64(0x600ff8),
+                         self.memory.read_u64(0x600ff8))
+
+    def test_not_core(self):
+        with open(os.path.join('test', 'testfiles_for_unittests',
+                               'sample_exe64.elf'), 'rb') as f:
+            self.assertRaises(ELFError, CoreMemory, ELFFile(f))
+
+
+if __name__ == '__main__':
+    unittest.main()
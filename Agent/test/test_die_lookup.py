@@ -0,0 +1,140 @@
+#-------------------------------------------------------------------------------
+# elftools tests
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+import os
+import unittest
+
+from elftools.common.exceptions import DWARFError
+from elftools.dwarf.die import AttributeValue
+from elftools.dwarf.enums import DW_FORM_raw2name
+from elftools.elf.elffile import ELFFile
+
+
+_REF_FORMS = ('DW_FORM_ref1', 'DW_FORM_ref2', 'DW_FORM_ref4', 'DW_FORM_ref8',
+              'DW_FORM_ref_udata')
+
+
+class TestDIELookup(unittest.TestCase):
+    def _path(self, name):
+        return os.path.join('test', 'testfiles_for_unittests', name)
+
+    def _all_DIEs(self, name):
+        """ The (tag, attributes) of all the DIEs of a file by offset, and the
+            references between them as (DIE offset, attribute name, referenced
+            offset) tuples
+        """
+        dies = {}
+        refs = []
+        with open(self._path(name), 'rb') as f:
+            for cu in ELFFile(f).get_dwarf_info().iter_CUs():
+                for die in cu.iter_DIEs():
+                    dies[die.offset] = (die.tag, die.attributes)
+                    for attr in die.attributes.values():
+                        form = attr.form
+                        if form == 'DW_FORM_indirect':
+                            form = DW_FORM_raw2name[attr.raw_value]
+                        if form in _REF_FORMS:
+                            refs.append((die.offset, attr.name,
+                                         cu.cu_offset + attr.value))
+                        elif form == 'DW_FORM_ref_addr':
+                            refs.append((die.offset, attr.name, attr.value))
+        return dies, refs
+
+    def _check_file(self, name):
+        dies, refs = self._all_DIEs(name)
+        self.assertTrue(refs)
+        with open(self._path(name), 'rb') as f:
+            dwarfinfo = ELFFile(f).get_dwarf_info()
+            # Look up the DIEs backwards, so that all the CUs get indexed at
+            # once and then found by bisection
+            for offset in sorted(dies, reverse=True):
+                die = dwarfinfo.get_DIE_from_offset(offset)
+                self.assertEqual(die.offset, offset)
+                self.assertEqual((die.tag, die.attributes), dies[offset])
+                self.assertIs(dwarfinfo.get_DIE_from_offset(offset), die)
+            for offset, name, target in refs:
+                die = dwarfinfo.get_DIE_from_offset(offset)
+                referenced = die.get_DIE_from_attribute(name)
+                self.assertEqual(referenced.offset, target)
+                self.assertEqual((referenced.tag, referenced.attributes),
+                                 dies[target])
+
+    def test_ref4(self):
+        self._check_file('sample_exe64.elf')
+
+    def test_form_indirect(self):
+        self._check_file('arm_with_form_indirect.elf')
+
+    def test_ref_addr(self):
+        with open(self._path('sample_exe64.elf'), 'rb') as f:
+            dwarfinfo = ELFFile(f).get_dwarf_info()
+            cus = list(dwarfinfo.iter_CUs())
+            die = cus[0].get_top_DIE()
+            target = next(cus[-1].get_top_DIE().iter_children())
+            die.attributes['DW_AT_specification'] = AttributeValue(
+                name='DW_AT_specification', form='DW_FORM_ref_addr',
+                value=target.offset, raw_value=target.offset, offset=0)
+            found = die.get_DIE_from_attribute('DW_AT_specification')
+            self.assertEqual((found.offset, found.tag, found.attributes),
+                             (target.offset, target.tag, target.attributes))
+            self.assertRaises(DWARFError, die.get_DIE_from_attribute,
+                              'DW_AT_name')
+
+    def test_fully_parsed_CU(self):
+        with open(self._path('sample_exe64.elf'), 'rb') as f:
+            dwarfinfo = ELFFile(f).get_dwarf_info()
+            cu = dwarfinfo._get_CU_containing(
+                next(dwarfinfo.iter_CUs()).cu_die_offset)
+            dies = [die for die in cu.iter_DIEs() if not die.is_null()]
+            for die in dies:
+                self.assertIs(dwarfinfo.get_DIE_from_offset(die.offset), die)
+
+    def test_same_CU_objects(self):
+        dies, refs = self._all_DIEs('sample_exe64.elf')
+        with open(self._path('sample_exe64.elf'), 'rb') as f:
+            dwarfinfo = ELFFile(f).get_dwarf_info()
+            # Looked up before its CU is fully parsed, so without a parent
+            lone = dwarfinfo.get_DIE_from_offset(refs[0][2])
+            cus = list(dwarfinfo.iter_CUs())
+            self.assertEqual([cu.cu_offset for cu in dwarfinfo.iter_CUs()],
+                             [cu.cu_offset for cu in cus])
+            for cu, again in zip(cus, dwarfinfo.iter_CUs()):
+                self.assertIs(again, cu)
+            for cu in cus:
+                list(cu.iter_DIEs())
+            for offset, name, target in refs:
+                die = dwarfinfo.get_DIE_from_offset(offset)
+                self.assertIsNotNone(die.get_parent())
+                referenced = die.get_DIE_from_attribute(name)
+                self.assertEqual(referenced.offset, target)
+                self.assertIsNotNone(referenced.get_parent())
+                self.assertIs(referenced.cu,
+                              dwarfinfo._get_CU_containing(target))
+                self.assertIn(referenced.cu, cus)
+            found = dwarfinfo.get_DIE_from_offset(lone.offset)
+            self.assertIsNot(found, lone)
+            self.assertIsNotNone(found.get_parent())
+
+    def test_bad_offsets(self):
+        with open(self._path('sample_exe64.elf'), 'rb') as f:
+            dwarfinfo = ELFFile(f).get_dwarf_info()
+            cu = next(dwarfinfo.iter_CUs())
+            for offset in (-1, cu.cu_offset, dwarfinfo.debug_info_sec.size):
+                self.assertRaises(DWARFError, dwarfinfo.get_DIE_from_offset,
+                                  offset)
+
+    def test_cache_bounded(self):
+        dies, _ = self._all_DIEs('arm_with_form_indirect.elf')
+        with open(self._path('arm_with_form_indirect.elf'), 'rb') as f:
+            dwarfinfo = ELFFile(f).get_dwarf_info()
+            dwarfinfo._DIE_CACHE_SIZE = 10
+            offsets = sorted(dies)
+            for offset in offsets:
+                dwarfinfo.get_DIE_from_offset(offset)
+            self.assertEqual(list(dwarfinfo._die_cache), offsets[-10:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#-------------------------------------------------------------------------------
+# elftools tests
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+import os
+import unittest
+
+from elftools.common.construct_utils import decode_uleb128
+from elftools.dwarf.abbrevtable import AbbrevTable
+from elftools.elf.elffile import ELFFile
+
+
+class TestAttrDecoder(unittest.TestCase):
+    def _decode_generic(self, die, abbrev_decl, offset):
+        """ Decode the attributes of die one form reader at a time
+        """
+        data = die.dwarfinfo.get_section_data(die.dwarfinfo.debug_info_sec)
+        readers = die.cu.structs.Dwarf_dw_form_readers
+        attributes = []
+        for name, form in abbrev_decl.iter_attr_specs():
+            attr_offset = offset
+            raw_value, offset = readers[form](data, offset)
+            if form == 'DW_FORM_indirect':
+                value, offset = die._read_indirect_value(
+                    raw_value, data, offset)
+            else:
+                value = die._translate_attr_value(form, raw_value)
+            attributes.append((name, form, value, raw_value, attr_offset))
+        return attributes, offset
+
+    def _check_file(self, name):
+        with open(os.path.join('test', 'testfiles_for_unittests', name),
+                  'rb') as f:
+            dwarfinfo = ELFFile(f).get_dwarf_info()
+            data = dwarfinfo.get_section_data(dwarfinfo.debug_info_sec)
+            count = 0
+            for cu in dwarfinfo.iter_CUs():
+                for die in cu.iter_DIEs():
+                    if die.is_null():
+                        continue
+                    abbrev_decl = cu.get_abbrev_table().get_abbrev(
+                        die.abbrev_code)
+                    _, offset = decode_uleb128(data, die.offset)
+                    attributes, end = self._decode_generic(
+                        die, abbrev_decl, offset)
+                    self.assertEqual(end, die.offset + die.size)
+                    self.assertEqual(
+                        [tuple(attr) for attr in die.attributes.values()],
+                        attributes)
+                    count += 1
+            self.assertTrue(count)
+
+    def test_elf32_little_endian(self):
+        self._check_file('exe_solaris32_cc.elf')
+
+    def test_elf32_big_endian(self):
+        self._check_file('simple_gcc.elf.mips')
+
+    def test_elf64(self):
+        self._check_file('sample_exe64.elf')
+
+    def test_elf64_big_endian(self):
+        self._check_file('exe_solaris64_cc.sparc.elf')
+
+    def test_form_indirect(self):
+        self._check_file('arm_with_form_indirect.elf')
+
+    def test_decoders_shared(self):
+        with open(os.path.join('test', 'testfiles_for_unittests',
+                               'sample_exe64.elf'), 'rb') as f:
+            dwarfinfo = ELFFile(f).get_dwarf_info()
+            cu = next(dwarfinfo.iter_CUs())
+            table = cu.get_abbrev_table()
+            other = AbbrevTable(cu.structs, dwarfinfo.debug_abbrev_sec.stream,
+                                cu['debug_abbrev_offset'])
+            for code in set(die.abbrev_code for die in cu.iter_DIEs()
+                            if not die.is_null()):
+                decoder = table.get_abbrev(code).get_attr_decoder(cu.structs)
+                self.assertIs(decoder, table.get_abbrev(code).get_attr_decoder(
+                    cu.structs))
+                self.assertIs(decoder, other.get_abbrev(code).get_attr_decoder(
+                    cu.structs))
+
+
+if __name__ == '__main__':
+    unittest.main()
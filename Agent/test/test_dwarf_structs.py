@@ -4,9 +4,14 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
+from struct import error as StructError
+import os
 import unittest
 
-from elftools.dwarf.structs import DWARFStructs
+from elftools.common.py3compat import BytesIO, PY3
+from elftools.construct import ConstructError
+from elftools.dwarf.structs import DWARFStructs, get_dwarf_structs
+from elftools.elf.elffile import ELFFile
 
 
 class TestDWARFStructs(unittest.TestCase):
@@ -37,6 +42,63 @@ class TestDWARFStructs(unittest.TestCase):
         self.assertEqual(c.file_entry[1].name, b'EPQ')
         self.assertEqual(c.file_entry[1].dir_index, 0x12 * 128 + 6)
 
+    def test_dw_form_readers(self):
+        data = (b'\x81\x82\x83\x84\x85\x86\x87\x88\x89\x8a' +
+                b'\x03abc\x00' + b'\x7f' * 8)
+        # the readers take bytearrays on Python 2, where bytes and
+        # memoryviews index as str
+        buffers = [bytearray(data)]
+        if PY3:
+            buffers += [data, memoryview(data)]
+        for little_endian in (True, False):
+            for dwarf_format in (32, 64):
+                for address_size in (4, 8):
+                    ds = DWARFStructs(little_endian, dwarf_format,
+                                      address_size)
+                    for form, reader in ds.Dwarf_dw_form_readers.items():
+                        for offset in range(len(data)):
+                            stream = BytesIO(data)
+                            stream.seek(offset)
+                            try:
+                                expected = ds.Dwarf_dw_form[form].parse_stream(
+                                    stream)
+                            except ConstructError:
+                                for buf in buffers:
+                                    self.assertRaises(
+                                        (IndexError, StructError),
+                                        reader, buf, offset)
+                                continue
+                            for buf in buffers:
+                                self.assertEqual(reader(buf, offset),
+                                                 (expected, stream.tell()))
+
+
+class TestGetDWARFStructs(unittest.TestCase):
+    def test_memoized(self):
+        structs = get_dwarf_structs(True, 32, 4)
+        self.assertIs(get_dwarf_structs(little_endian=True, dwarf_format=32,
+                                        address_size=4), structs)
+        self.assertEqual((structs.little_endian, structs.dwarf_format,
+                          structs.address_size, structs.dwarf_version),
+                         (True, 32, 4, 2))
+        for other in (get_dwarf_structs(False, 32, 4),
+                      get_dwarf_structs(True, 64, 4),
+                      get_dwarf_structs(True, 32, 8),
+                      get_dwarf_structs(True, 32, 4, dwarf_version=4)):
+            self.assertIsNot(other, structs)
+
+    def test_shared_by_dwarfinfo(self):
+        with open(os.path.join('test', 'testfiles_for_unittests',
+                               'sample_exe64.elf'), 'rb') as f:
+            dwarfinfo = ELFFile(f).get_dwarf_info()
+            structs = get_dwarf_structs(True, 32, 8)
+            cus = list(dwarfinfo.iter_CUs())
+            self.assertTrue(len(cus) > 1)
+            for cu in cus:
+                self.assertIs(cu.structs, structs)
+                self.assertIs(
+                    dwarfinfo.line_program_for_CU(cu).structs, structs)
+
 
 if __name__ == '__main__':
     unittest.main()
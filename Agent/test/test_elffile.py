@@ -4,8 +4,13 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
+import gc
+import os
 import unittest
+import weakref
 
+from elftools.common.exceptions import ELFError
+from elftools.common.utils import struct_parse
 from elftools.elf.elffile import ELFFile
 
 
@@ -15,9 +20,9 @@ class TestMap(unittest.TestCase):
             __init__ = object.__init__
             def iter_segments(self):
                 return iter((
-                    dict(p_type='PT_PHDR', p_vaddr=0x10100, p_filesz=0x100, p_offset=0x400),
-                    dict(p_type='PT_LOAD', p_vaddr=0x10200, p_filesz=0x200, p_offset=0x100),
-                    dict(p_type='PT_LOAD', p_vaddr=0x10100, p_filesz=0x100, p_offset=0x400),
+                    dict(p_type='PT_PHDR', p_vaddr=0x10100, p_filesz=0x100, p_memsz=0x100, p_offset=0x400),
+                    dict(p_type='PT_LOAD', p_vaddr=0x10200, p_filesz=0x200, p_memsz=0x200, p_offset=0x100),
+                    dict(p_type='PT_LOAD', p_vaddr=0x10100, p_filesz=0x100, p_memsz=0x100, p_offset=0x400),
                 ))
 
         elf = MockELF()
@@ -43,6 +48,69 @@ class TestMap(unittest.TestCase):
         self.assertEqual(tuple(elf.address_offsets(0x103FE, 4)), ())
         self.assertEqual(tuple(elf.address_offsets(0x10400, 4)), ())
 
+    def test_vaddr_translation(self):
+        with open(os.path.join('test', 'testfiles_for_unittests',
+                               'sample_exe64.elf'), 'rb') as f:
+            elf = ELFFile(f)
+            text = elf.get_section_by_name('.text')
+            self.assertEqual(elf.vaddr_to_offset(text['sh_addr']),
+                             text['sh_offset'])
+            self.assertEqual(elf.read_vaddr(text['sh_addr'], text['sh_size']),
+                             text.data())
+            self.assertIsNone(elf.vaddr_to_offset(0))
+            self.assertRaises(ELFError, elf.read_vaddr, 0, 4)
+
+            # .bss is in memory only: no file offset, reads as zeros
+            bss = elf.get_section_by_name('.bss')
+            self.assertIsNone(elf.vaddr_to_offset(bss['sh_addr']))
+            self.assertEqual(elf.read_vaddr(bss['sh_addr'], bss['sh_size']),
+                             b'\x00' * bss['sh_size'])
+            # a read spanning .data and .bss
+            data = elf.get_section_by_name('.data')
+            size = bss['sh_addr'] + bss['sh_size'] - data['sh_addr']
+            image = elf.read_vaddr(data['sh_addr'], size)
+            self.assertEqual(image[:data['sh_size']], data.data())
+            self.assertEqual(len(image), size)
+
+            mapped = ELFFile(f, use_mmap=True)
+            self.assertEqual(
+                mapped.read_vaddr(text['sh_addr'], text['sh_size']),
+                text.data())
+
+
+class TestSectionCache(unittest.TestCase):
+    def test_sections_and_segments_reused(self):
+        with open(os.path.join('test', 'testfiles_for_unittests',
+                               'sample_exe64.elf'), 'rb') as f:
+            elf = ELFFile(f)
+            sections = list(elf.iter_sections())
+            self.assertEqual(len(elf._section_headers), elf.num_sections())
+            for i, section in enumerate(sections):
+                self.assertIs(elf.get_section(i), section)
+                self.assertIs(elf.get_section_by_name(section.name), section)
+                self.assertEqual(section.header, struct_parse(
+                    elf.structs.Elf_Shdr, elf.stream,
+                    elf._section_offset(i)))
+            segments = list(elf.iter_segments())
+            self.assertEqual(len(segments), elf.num_segments())
+            for i, segment in enumerate(segments):
+                self.assertIs(elf.get_segment(i), segment)
+            symtab = elf.get_section_by_name('.symtab')
+            self.assertIs(symtab.stringtable,
+                          elf.get_section(symtab['sh_link']))
+
+    def test_sections_not_kept(self):
+        with open(os.path.join('test', 'testfiles_for_unittests',
+                               'sample_exe64.elf'), 'rb') as f:
+            elf = ELFFile(f)
+            symtab = elf.get_section_by_name('.symtab')
+            symtab.get_symbol_by_name('main')
+            ref = weakref.ref(symtab)
+            del symtab
+            gc.collect()
+            self.assertIsNone(ref())
+            self.assertEqual(len(elf._section_headers), elf.num_sections())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,82 @@
+#-------------------------------------------------------------------------------
+# elftools tests
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+import os
+import unittest
+
+from elftools.common.py3compat import BytesIO
+from elftools.common.utils import MemoryViewStream
+from elftools.elf.elffile import ELFFile
+
+
+class TestMemoryViewStream(unittest.TestCase):
+    def test_read_seek(self):
+        stream = MemoryViewStream(memoryview(b'0123456789')[2:])
+        self.assertEqual(stream.read(3), b'234')
+        self.assertEqual(stream.tell(), 3)
+        stream.seek(-2, 2)
+        self.assertEqual(stream.read(), b'89')
+        self.assertEqual(stream.read(1), b'')
+        stream.seek(1)
+        stream.seek(2, 1)
+        self.assertEqual(stream.read(100), b'56789')
+        self.assertRaises(ValueError, stream.seek, -1)
+
+
+class TestELFFileMmap(unittest.TestCase):
+    def _path(self, name):
+        return os.path.join('test', 'testfiles_for_unittests', name)
+
+    def _cu_offsets(self, elffile):
+        dwarfinfo = elffile.get_dwarf_info()
+        return [(cu.cu_offset, len(list(cu.iter_DIEs())))
+                for cu in dwarfinfo.iter_CUs()]
+
+    def test_data_view_matches_data(self):
+        for name in ('simple_gcc.elf.arm', 'compressed_64.o'):
+            with open(self._path(name), 'rb') as f:
+                elffile = ELFFile(f, use_mmap=True)
+                for section in elffile.iter_sections():
+                    if section['sh_type'] == 'SHT_NOBITS':
+                        continue
+                    view = section.data_view()
+                    self.assertIsInstance(view, memoryview)
+                    self.assertEqual(view.tobytes(), section.data())
+
+    def test_dwarf_same_as_unmapped(self):
+        for name in ('simple_gcc.elf.arm', 'arm_reloc_unrelocated.o'):
+            with open(self._path(name), 'rb') as f:
+                expected = self._cu_offsets(ELFFile(f))
+            with open(self._path(name), 'rb') as f:
+                self.assertEqual(
+                    self._cu_offsets(ELFFile(f, use_mmap=True)), expected)
+
+    def test_close(self):
+        with open(self._path('simple_gcc.elf.arm'), 'rb') as f:
+            elffile = ELFFile(f, use_mmap=True)
+            text = elffile.get_section_by_name('.text')
+            data = text.data()
+            mapped = elffile._mmap
+            elffile.close()
+            self.assertIsNone(elffile.get_view(0, 16))
+            if mapped is not None:
+                self.assertTrue(mapped.closed)
+            self.assertEqual(text.data_view().tobytes(), data)
+            elffile.close()
+
+    def test_bytesio_stream(self):
+        with open(self._path('simple_gcc.elf.arm'), 'rb') as f:
+            contents = f.read()
+        elffile = ELFFile(BytesIO(contents), use_mmap=True)
+        text = elffile.get_section_by_name('.text')
+        offset = text['sh_offset']
+        self.assertEqual(text.data_view().tobytes(),
+                         contents[offset:offset + text['sh_size']])
+        self.assertEqual(self._cu_offsets(elffile),
+                         self._cu_offsets(ELFFile(BytesIO(contents))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,7 +9,34 @@ import os
 
 from elftools.elf.elffile import ELFFile
 from elftools.common.exceptions import ELFError
-from elftools.elf.hash import HashSection, GNUHashSection
+from elftools.elf.dynamic import DynamicSegment
+from elftools.elf.hash import HashSection, GNUHashSection, elf_hash, gnu_hash
+
+
+def check_symbol_lookups(test, filename, tag):
+    """ Every dynamic symbol is found through the hash table exactly as
+        through a full scan, and missing names are not found.
+    """
+    with open(os.path.join('test', 'testfiles_for_unittests', filename),
+              'rb') as f:
+        elf = ELFFile(f)
+        for segment in elf.iter_segments():
+            if isinstance(segment, DynamicSegment):
+                break
+        test.assertIsNotNone(segment.get_table_offset(tag)[1])
+        hash_table = segment._get_hash_table()
+        symbols = list(segment.iter_symbols())
+        test.assertTrue(symbols)
+        for symbol in symbols:
+            if not symbol.name:
+                continue
+            expected = [sym.entry for sym in symbols if sym.name == symbol.name]
+            found = segment.get_symbol_by_name(symbol.name)
+            test.assertEqual([sym.entry for sym in found], expected)
+        test.assertIsNone(hash_table.get_symbols('no_such_symbol'))
+        test.assertIsNone(segment.get_symbol_by_name('no_such_symbol'))
+        # the full name map was never needed
+        test.assertIsNone(segment._symbol_name_map)
 
 class TestELFHash(unittest.TestCase):
     def test_get_number_of_syms(self):
@@ -28,6 +55,14 @@ class TestELFHash(unittest.TestCase):
             hash_section = HashSection(elf.stream, hash_offset, elf)
             self.assertEqual(hash_section.get_number_of_symbols(), 4)
 
+    def test_hash_function(self):
+        self.assertEqual(elf_hash(''), 0)
+        self.assertEqual(elf_hash('printf'), 0x077905a6)
+        self.assertEqual(elf_hash(b'exit'), 0x0006cf04)
+
+    def test_get_symbols(self):
+        check_symbol_lookups(self, 'aarch64_super_stripped.elf', 'DT_HASH')
+
 
 class TestGNUHash(unittest.TestCase):
     def test_get_number_of_syms(self):
@@ -45,3 +80,35 @@ class TestGNUHash(unittest.TestCase):
                 _, hash_offset = segment.get_table_offset('DT_GNU_HASH')
             hash_section = GNUHashSection(elf.stream, hash_offset, elf)
             self.assertEqual(hash_section.get_number_of_symbols(), 24)
+
+    def test_hash_function(self):
+        self.assertEqual(gnu_hash(''), 0x00001505)
+        self.assertEqual(gnu_hash('printf'), 0x156b2bb8)
+        self.assertEqual(gnu_hash(b'exit'), 0x7c967e3f)
+
+    def test_get_symbols(self):
+        check_symbol_lookups(self, 'lib_versioned64.so.1.elf', 'DT_GNU_HASH')
+
+    def test_unhashed_symbols_read_once(self):
+        with open(os.path.join('test', 'testfiles_for_unittests',
+                               'lib_versioned64.so.1.elf'), 'rb') as f:
+            elf = ELFFile(f)
+            segment = next(seg for seg in elf.iter_segments()
+                           if isinstance(seg, DynamicSegment))
+            hash_table = segment._get_hash_table()
+            symtab = hash_table._symboltable
+            reads = []
+            get_symbol = symtab.get_symbol
+            def counting_get_symbol(idx):
+                reads.append(idx)
+                return get_symbol(idx)
+            symtab.get_symbol = counting_get_symbol
+            symoffset = hash_table.params['symoffset']
+            self.assertTrue(symoffset > 1)
+            undefined = get_symbol(1).name
+            for _ in range(3):
+                self.assertIsNone(hash_table.get_symbols('no_such_symbol'))
+                self.assertEqual(
+                    [sym.name for sym in hash_table.get_symbols(undefined)],
+                    [undefined])
+            self.assertEqual(sorted(reads), list(range(1, symoffset)))
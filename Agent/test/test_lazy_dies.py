@@ -0,0 +1,99 @@
+#-------------------------------------------------------------------------------
+# elftools tests
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+import os
+import unittest
+
+from elftools.elf.elffile import ELFFile
+
+
+class TestLazyDIEs(unittest.TestCase):
+    def _dwarfinfo(self, f):
+        return ELFFile(f).get_dwarf_info()
+
+    def _walk(self, die):
+        """ The subtree of die as nested tuples, through iter_children
+        """
+        parent = die.get_parent()
+        return (die.offset, die.size, die.tag, list(die.attributes.items()),
+                parent.offset if parent else None,
+                [self._walk(child) for child in die.iter_children()])
+
+    def _check_file(self, name):
+        path = os.path.join('test', 'testfiles_for_unittests', name)
+        with open(path, 'rb') as f:
+            expected = [self._walk(next(cu.iter_DIEs()))
+                        for cu in self._dwarfinfo(f).iter_CUs()]
+        with open(path, 'rb') as f:
+            dwarfinfo = self._dwarfinfo(f)
+            trees = []
+            for cu in dwarfinfo.iter_CUs():
+                top_DIE = cu.get_top_DIE()
+                self.assertEqual(cu._dielist, [])
+                trees.append(self._walk(top_DIE))
+                self.assertEqual(cu._dielist, [])
+                # A full parse afterwards keeps the top DIE
+                self.assertIs(next(cu.iter_DIEs()), top_DIE)
+                self.assertIs(cu.get_top_DIE(), top_DIE)
+            self.assertEqual(trees, expected)
+
+    def _check_skipping(self, name):
+        """ Skip each subtree without DW_AT_sibling and compare the offset
+            reached with that of the next DIE after the subtree.
+        """
+        path = os.path.join('test', 'testfiles_for_unittests', name)
+        with open(path, 'rb') as f:
+            dwarfinfo = self._dwarfinfo(f)
+            count = 0
+            for cu in dwarfinfo.iter_CUs():
+                dies = list(cu.iter_DIEs())
+                boundary = cu._get_cu_boundary()
+                for i, die in enumerate(dies):
+                    if not die.has_children:
+                        continue
+                    depth = 0
+                    for end in dies[i:]:
+                        if end.is_null():
+                            depth -= 1
+                        elif end.has_children:
+                            depth += 1
+                        if depth == 0:
+                            break
+                    die.attributes.pop('DW_AT_sibling', None)
+                    die._end_offset = None
+                    self.assertEqual(cu._get_sibling_offset(die, boundary),
+                                     end.offset + end.size)
+                    count += 1
+            self.assertTrue(count)
+
+    def test_elf32(self):
+        self._check_file('arm_with_form_indirect.elf')
+        self._check_skipping('arm_with_form_indirect.elf')
+
+    def test_elf64(self):
+        self._check_file('sample_exe64.elf')
+        self._check_skipping('sample_exe64.elf')
+
+    def test_big_endian(self):
+        self._check_file('simple_gcc.elf.mips')
+        self._check_skipping('simple_gcc.elf.mips')
+
+    def test_trailing_null_dies(self):
+        self._check_file('trailing_null_dies.elf')
+
+    def test_siblings(self):
+        path = os.path.join('test', 'testfiles_for_unittests',
+                            'arm_with_form_indirect.elf')
+        with open(path, 'rb') as f:
+            children = max((list(cu.get_top_DIE().iter_children())
+                            for cu in self._dwarfinfo(f).iter_CUs()), key=len)
+            self.assertTrue(len(children) > 1)
+            self.assertEqual(
+                [die.offset for die in children[0].iter_siblings()],
+                [die.offset for die in children[1:]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#-------------------------------------------------------------------------------
+# elftools tests
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+import unittest
+
+from elftools.common.construct_utils import (ULEB128, SLEB128,
+        decode_uleb128, decode_sleb128)
+from elftools.common.py3compat import BytesIO, PY3
+from elftools.construct import ConstructError
+
+
+class TestLEB128(unittest.TestCase):
+    # (value, encoding) pairs from the DWARF spec and around the 7-bit edges
+    UNSIGNED = [
+        (2, b'\x02'), (127, b'\x7f'), (128, b'\x80\x01'),
+        (129, b'\x81\x01'), (130, b'\x82\x01'), (12857, b'\xb9\x64'),
+        (624485, b'\xe5\x8e\x26'), (2**64 - 1, b'\xff' * 9 + b'\x01'),
+    ]
+    SIGNED = [
+        (2, b'\x02'), (-2, b'\x7e'), (127, b'\xff\x00'), (-127, b'\x81\x7f'),
+        (128, b'\x80\x01'), (-128, b'\x80\x7f'), (129, b'\x81\x01'),
+        (-129, b'\xff\x7e'), (63, b'\x3f'), (-64, b'\x40'),
+        (-123456, b'\xc0\xbb\x78'), (-2**63, b'\x80' * 9 + b'\x7f'),
+    ]
+
+    def _check(self, construct, decode, cases):
+        for value, encoding in cases:
+            for tail in (b'', b'\x81', b'\x00' * 20):
+                stream = BytesIO(encoding + tail)
+                self.assertEqual(construct.parse_stream(stream), value)
+                self.assertEqual(stream.tell(), len(encoding))
+            self.assertEqual(construct.build(value), encoding)
+            data = b'\x90' + encoding + b'\x90'
+            # bytes and memoryviews index as str on Python 2
+            buffers = [bytearray(data)]
+            if PY3:
+                buffers += [data, memoryview(data)]
+            for buf in buffers:
+                self.assertEqual(decode(buf, 1), (value, len(encoding) + 1))
+
+    def test_unsigned(self):
+        self._check(ULEB128('x'), decode_uleb128, self.UNSIGNED)
+        # padded encoding
+        self.assertEqual(ULEB128('x').parse(b'\x80\x80\x00'), 0)
+
+    def test_signed(self):
+        self._check(SLEB128('x'), decode_sleb128, self.SIGNED)
+
+    def test_truncated(self):
+        for data in (b'', b'\x80', b'\xff' * 30):
+            self.assertRaises(ConstructError, ULEB128('x').parse, data)
+            self.assertRaises(ConstructError, SLEB128('x').parse, data)
+        self.assertRaises(IndexError, decode_uleb128, bytearray(b'\x80\x80'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#-------------------------------------------------------------------------------
+# elftools tests
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+import copy
+import os
+import unittest
+
+from elftools.common.construct_utils import MutableMapping
+from elftools.common.construct_utils import Record, record_class
+from elftools.construct import Container
+from elftools.elf.elffile import ELFFile
+from elftools.elf.relocation import RelocationSection
+from elftools.elf.sections import SymbolTableSection
+
+
+class TestRecordClass(unittest.TestCase):
+    def test_access(self):
+        Point = record_class('Point', ['x', 'y'])
+        point = Point(1, 2)
+        self.assertIsInstance(point, Record)
+        self.assertIsInstance(point, MutableMapping)
+        self.assertFalse(hasattr(point, '__dict__'))
+        self.assertEqual(point.x, 1)
+        self.assertEqual(point['y'], 2)
+        point['x'] = 3
+        point.y = 4
+        self.assertEqual((point['x'], point.y), (3, 4))
+        self.assertEqual(list(point), ['x', 'y'])
+        self.assertEqual(list(point.items()), [('x', 3), ('y', 4)])
+        self.assertEqual(len(point), 2)
+        self.assertIn('x', point)
+        self.assertNotIn('z', point)
+        self.assertEqual(point.get('z', 5), 5)
+        self.assertRaises(KeyError, lambda: point['z'])
+        self.assertRaises(KeyError, point.__setitem__, 'z', 1)
+        self.assertRaises(AttributeError, setattr, point, 'z', 1)
+        self.assertRaises(TypeError, point.__delitem__, 'x')
+        self.assertEqual(repr(point), 'Point(x=3, y=4)')
+
+    def test_equality_and_copy(self):
+        Point = record_class('Point', ['x', 'y'])
+        point = Point(1, 2)
+        self.assertEqual(point, Point(1, 2))
+        self.assertNotEqual(point, Point(1, 3))
+        self.assertEqual(point, Container(x=1, y=2))
+        self.assertNotEqual(point, Container(x=1))
+        duplicate = copy.copy(point)
+        self.assertIsNot(duplicate, point)
+        self.assertEqual(duplicate, point)
+
+    def test_invalid_fields(self):
+        for fields in (['a', 'a'], ['a-b'], ['class'], ['keys'], ['_a']):
+            self.assertIsNone(record_class('Bad', fields))
+
+
+class TestELFFileRecords(unittest.TestCase):
+    def _open(self, name, **kwargs):
+        return ELFFile(open(os.path.join('test', 'testfiles_for_unittests',
+                                         name), 'rb'), **kwargs)
+
+    def test_same_as_containers(self):
+        for name in ('simple_gcc.elf.arm', 'simple_gcc.elf.mips',
+                     'x64_bad_sections.elf', 'arm_reloc_unrelocated.o'):
+            elffile = self._open(name)
+            records = self._open(name, use_records=True)
+            self.assertIsInstance(records.header, Record)
+            self.assertEqual(records.header, elffile.header)
+            for section, other in zip(elffile.iter_sections(),
+                                      records.iter_sections()):
+                self.assertIsInstance(other.header, Record)
+                self.assertEqual(other.header, section.header)
+                if isinstance(section, SymbolTableSection):
+                    for sym, sym2 in zip(section.iter_symbols(),
+                                         other.iter_symbols()):
+                        self.assertEqual(sym2.entry, sym.entry)
+                        self.assertEqual(sym2['st_info'].type,
+                                         sym['st_info']['type'])
+                elif isinstance(section, RelocationSection):
+                    for rel, rel2 in zip(section.iter_relocations(),
+                                         other.iter_relocations()):
+                        self.assertEqual(rel2.entry, rel.entry)
+            for segment, other in zip(elffile.iter_segments(),
+                                      records.iter_segments()):
+                self.assertEqual(other.header, segment.header)
+            elffile.stream.close()
+            records.stream.close()
+
+    def test_notes_stay_containers(self):
+        elffile = self._open('core_linux64.elf', use_records=True)
+        notes = [note for segment in elffile.iter_segments()
+                 if segment['p_type'] == 'PT_NOTE'
+                 for note in segment.iter_notes()]
+        self.assertTrue(notes)
+        for note in notes:
+            self.assertIsInstance(note, Container)
+            self.assertIn('n_desc', note)
+        elffile.stream.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+#-------------------------------------------------------------------------------
+# elftools tests
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+import os
+import unittest
+
+from elftools.elf.elffile import ELFFile
+
+
+class TestStringTableSection(unittest.TestCase):
+    def _get_strings(self, name, load):
+        with open(os.path.join('test', 'testfiles_for_unittests', name),
+                  'rb') as f:
+            elffile = ELFFile(f)
+            strtab = elffile.get_section_by_name('.strtab')
+            if load:
+                self.assertEqual(strtab.load(), strtab.data())
+            # every offset, including suffixes of names (but not offsets in
+            # the middle of a UTF-8 sequence) and the end of the table
+            data = bytearray(strtab.data())
+            offsets = [i for i in range(len(data)) if data[i] < 0x80]
+            offsets.append(len(data))
+            # second lookups are served from the memo
+            return ([strtab.get_string(offset) for offset in offsets],
+                    [strtab.get_string(offset) for offset in offsets])
+
+    def test_loaded_matches_stream(self):
+        for name in ('simple_gcc.elf.arm', 'unicode_symbols.elf'):
+            first, second = self._get_strings(name, load=False)
+            self.assertEqual(first, second)
+            self.assertEqual(self._get_strings(name, load=True),
+                             (first, second))
+
+    def test_symbol_names(self):
+        with open(os.path.join('test', 'testfiles_for_unittests',
+                               'simple_gcc.elf.arm'), 'rb') as f:
+            symtab = ELFFile(f).get_section_by_name('.symtab')
+            self.assertEqual(symtab.get_symbol_by_name('main')[0].name,
+                             'main')
+            self.assertIsNotNone(symtab.stringtable._table)
+
+
+if __name__ == '__main__':
+    unittest.main()
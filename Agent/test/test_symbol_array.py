@@ -0,0 +1,55 @@
+#-------------------------------------------------------------------------------
+# elftools tests
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+import os
+import unittest
+
+from elftools.elf.elffile import ELFFile
+from elftools.elf.sections import SymbolTableSection, numpy
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestSymbolArray(unittest.TestCase):
+    def _symtabs(self, elffile):
+        return [section for section in elffile.iter_sections()
+                if isinstance(section, SymbolTableSection)]
+
+    def _check_file(self, name, **kwargs):
+        with open(os.path.join('test', 'testfiles_for_unittests', name),
+                  'rb') as f:
+            elffile = ELFFile(f, **kwargs)
+            symtabs = self._symtabs(elffile)
+            self.assertTrue(symtabs)
+            for symtab in symtabs:
+                symbols = list(symtab.iter_symbols())
+                array = symtab.get_symbol_array()
+                self.assertEqual(len(array), len(symbols))
+                self.assertEqual(symtab.get_symbol_names(),
+                                 [sym.name for sym in symbols])
+                for sym, view in zip(symbols, symtab.iter_symbol_views()):
+                    self.assertEqual(view['st_value'], sym['st_value'])
+                    self.assertEqual(view['st_size'], sym['st_size'])
+                    self.assertEqual(view['st_name'], sym['st_name'])
+                    self.assertEqual(view.entry, sym.entry)
+                    self.assertEqual(view['st_shndx'], sym['st_shndx'])
+
+    def test_elf32_little_endian(self):
+        self._check_file('simple_gcc.elf.arm')
+
+    def test_elf32_big_endian(self):
+        self._check_file('simple_gcc.elf.mips')
+
+    def test_elf64(self):
+        self._check_file('lib_versioned64.so.1.elf')
+
+    def test_elf64_mmap(self):
+        self._check_file('sample_exe64.elf', use_mmap=True)
+
+    def test_unicode_names(self):
+        self._check_file('unicode_symbols.elf')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#-------------------------------------------------------------------------------
+# elftools tests
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+import os
+import unittest
+
+from elftools.construct import Container
+from elftools.elf.elffile import ELFFile
+from elftools.elf.sections import Symbol
+from elftools.elf.symbolizer import SymbolIndex, numpy
+
+
+def make_symbol(name, value, size, type='STT_FUNC', shndx=1):
+    return Symbol(Container(st_value=value, st_size=size,
+                            st_info=Container(bind='STB_GLOBAL', type=type),
+                            st_shndx=shndx), name)
+
+
+class TestSymbolIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SymbolIndex([
+            make_symbol('outer', 0x1000, 0x100),
+            make_symbol('inner', 0x1010, 0x10),
+            make_symbol('alias', 0x1010, 0x20),
+            make_symbol('asm', 0x2000, 0),
+            make_symbol('next', 0x2040, 0x8),
+            make_symbol('label', 0x3000, 0, type='STT_OBJECT'),
+            make_symbol('undef', 0x4000, 0x10, shndx='SHN_UNDEF'),
+            make_symbol('sec', 0x4000, 0x10, type='STT_SECTION'),
+        ])
+        self.cases = [
+            (0xfff, None),
+            (0x1000, ('outer', 0)),
+            (0x1012, ('inner', 2)),
+            (0x1025, ('alias', 0x15)),
+            (0x1040, ('outer', 0x40)),
+            (0x1100, None),
+            (0x2000, ('asm', 0)),
+            (0x203f, ('asm', 0x3f)),
+            (0x2047, ('next', 7)),
+            (0x2048, None),
+            (0x3000, ('label', 0)),
+            (0x3001, None),
+            (0x4008, None),
+        ]
+
+    def _names(self, results):
+        return [None if res is None else (res[0].name, res[1])
+                for res in results]
+
+    def test_lookup(self):
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(
+            self._names(self.index.lookup(addr) for addr, _ in self.cases),
+            [expected for _, expected in self.cases])
+
+    def test_lookup_many(self):
+        self.assertEqual(
+            self._names(self.index.lookup_many(
+                [addr for addr, _ in self.cases])),
+            [expected for _, expected in self.cases])
+
+    def test_not_extended(self):
+        index = SymbolIndex([make_symbol('asm', 0x2000, 0),
+                             make_symbol('next', 0x2040, 0x8)],
+                            extend_zero_sized=False)
+        self.assertEqual(index.lookup(0x2000)[0].name, 'asm')
+        self.assertIsNone(index.lookup(0x2001))
+
+    def test_empty(self):
+        index = SymbolIndex([])
+        self.assertIsNone(index.lookup(0))
+        self.assertEqual(index.lookup_many([0, 1]), [None, None])
+
+    def test_from_elffile(self):
+        path = os.path.join('test', 'testfiles_for_unittests',
+                            'sample_exe64.elf')
+        with open(path, 'rb') as f:
+            elffile = ELFFile(f)
+            index = SymbolIndex.from_elffile(elffile)
+            main = elffile.get_section_by_name('.symtab').get_symbol_by_name(
+                'main')[0]
+            addr = main['st_value'] + main['st_size'] - 1
+            sym, offset = index.lookup(addr)
+            self.assertEqual(sym.name, 'main')
+            self.assertEqual(offset, main['st_size'] - 1)
+            self.assertEqual(self._names(index.lookup_many([addr, 0])),
+                             [('main', offset), None])
+
+    def test_from_elffile_dynamic(self):
+        # no section headers - only the dynamic symbols are available
+        path = os.path.join('test', 'testfiles_for_unittests',
+                            'aarch64_super_stripped.elf')
+        with open(path, 'rb') as f:
+            index = SymbolIndex.from_elffile(ELFFile(f))
+            for sym, start in zip(index.symbols, index.starts):
+                self.assertEqual(index.lookup(start)[1], 0)
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_lookup_indices(self):
+        indices = self.index.lookup_indices([0x1012, 0x0, 0x1040])
+        self.assertEqual([self.index.symbols[i].name if i >= 0 else None
+                          for i in indices.tolist()],
+                         ['inner', None, 'outer'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,9 +7,10 @@
 import unittest
 from random import randint
 
-from elftools.common.py3compat import int2byte, BytesIO
+from elftools.common.py3compat import int2byte, BytesIO, PY3
 from elftools.common.utils import (parse_cstring_from_stream, merge_dicts,
-        preserve_stream_pos)
+        preserve_stream_pos, parse_cstring_from_buffer, buffer_from_stream,
+        MemoryViewStream)
 
 
 class Test_parse_cstring_from_stream(unittest.TestCase):
@@ -41,6 +42,35 @@ class Test_parse_cstring_from_stream(unittest.TestCase):
         self.assertEqual(parse_cstring_from_stream(sio, 2348), text[2348:5000])
 
 
+class Test_parse_cstring_from_buffer(unittest.TestCase):
+    def test_buffers(self):
+        text = b'i' * 400 + b'\x00' + b'ab\x00' + b'cd'
+        buffers = [text, bytearray(text)]
+        if PY3:
+            # bytes() of a memoryview is its repr on Python 2
+            buffers.append(memoryview(text))
+        for data in buffers:
+            self.assertEqual(parse_cstring_from_buffer(data),
+                             (b'i' * 400, 401))
+            self.assertEqual(parse_cstring_from_buffer(data, 150),
+                             (b'i' * 250, 401))
+            self.assertEqual(parse_cstring_from_buffer(data, 401),
+                             (b'ab', 404))
+            self.assertEqual(parse_cstring_from_buffer(data, 400), (b'', 401))
+            self.assertEqual(parse_cstring_from_buffer(data, 404),
+                             (None, None))
+            self.assertEqual(parse_cstring_from_buffer(data, 500),
+                             (None, None))
+
+
+class Test_buffer_from_stream(unittest.TestCase):
+    def test_streams(self):
+        view = memoryview(b'0123456789')
+        stream = MemoryViewStream(view[2:])
+        self.assertEqual(bytes(buffer_from_stream(stream)), b'23456789')
+        self.assertEqual(bytes(buffer_from_stream(BytesIO(b'abc'))), b'abc')
+
+
 class Test_preserve_stream_pos(unittest.TestCase):
     def test_basic(self):
         sio = BytesIO(b'abcdef')
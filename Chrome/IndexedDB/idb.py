@@ -14,6 +14,15 @@ else:
   
 db = plyvel.DB(lcmp,comparator=cmpr, comparator_name=b'idb_cmp1')
 
+if len(sys.argv)>2 and sys.argv[2]=="--stats":
+    # counts and sizes only, no V8 deserialization
+    stats=comparator.IndexedStats()
+    for key, value in db:
+        stats.ProcessKeyValue(key,value)
+    stats.Print()
+    db.close()
+    sys.exit(0)
+
 ipool=comparator.IndexedPool()
 
 def tst():                
@@ -28,4 +37,11 @@ for dbn in ipool.databases:
         print("OS:{}  {}".format(os,ipool.databases[dbn].objectStores[os].name))
         ostor=ipool.databases[dbn].objectStores[os]
 
+blobs=comparator.IndexedBlobStore(lcmp)
+for (dbid,osid,key,bd,path) in blobs.IterBlobs(ipool):
+    if path is None:
+        print("Blob: {} {} {} missing".format(dbid,osid,bd.key))
+    else:
+        print("Blob: {} {} {} {} sha256:{}".format(dbid,osid,bd.key,path,blobs.Hash(dbid,bd.key)))
+
 db.close()
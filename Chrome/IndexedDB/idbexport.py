@@ -0,0 +1,264 @@
+# Columnar export of IndexedDB object stores loaded by comparator.IndexedPool.
+#
+#   python idbexport.py <path to .indexeddb.leveldb> <output dir> [csv]
+#
+# Records are flattened into columns: the key path (or the primary key) first,
+# then object properties in order of first appearance, nested objects as
+# "a.b" columns. Output goes in chunks to Parquet when pyarrow is installed,
+# gzipped CSV otherwise. Binary values are written as hex strings, and BigInts
+# that don't fit in 64 bits as decimal strings.
+import array
+import binascii
+import csv
+import gzip
+import json
+import os
+import sys
+
+import comparator
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow=None
+
+try:
+    unicode
+except NameError:
+    unicode=str
+
+try:
+    long
+except NameError:
+    long=int
+
+def ToPlain(value):
+    # deserializer output -> plain python values (dict/list/str/int/float/bool/None/bytes)
+    if isinstance(value,comparator.IndexedDBKey):
+        if value.ctype==comparator.WebIDBKeyTypeArray:
+            return [ToPlain(itm) for itm in value.array]
+        if value.ctype==comparator.WebIDBKeyTypeDate:
+            return comparator.dateFromFloat(value.date)
+        if value.ctype==comparator.WebIDBKeyTypeBinary:
+            return bytes(bytearray(value.binary))
+        return value.getVal()
+    if isinstance(value,comparator.Oddball):
+        if value.tag==comparator.SerializationTag.kTrue: return True
+        if value.tag==comparator.SerializationTag.kFalse: return False
+        return None
+    if isinstance(value,comparator.ShapedProperties):
+        return dict((ToPlainKey(key),ToPlain(val)) for key,val in value.items())
+    if isinstance(value,dict):
+        return dict((ToPlainKey(key),ToPlain(val)) for key,val in value.items())
+    if isinstance(value,(list,tuple)):
+        return [ToPlain(val) for val in value]
+    if isinstance(value,bytes):
+        return value.decode('latin-1')
+    if isinstance(value,(bytearray,array.array)):
+        return bytes(bytearray(value))
+    if comparator.numpy is not None and isinstance(value,comparator.numpy.ndarray):
+        return value.tolist()
+    if not isinstance(value,comparator.GenericObject):
+        return value
+    it=value.instance_type
+    if it=="JS_ARRAY_TYPE":
+        elems=value.value
+        if isinstance(elems,dict):
+            if len(elems)==0: return []
+            indices=[key for key in elems if isinstance(key,(int,float))]
+            if len(indices)==len(elems):
+                out=[None]*(int(max(indices))+1)
+                for key in indices:
+                    out[int(key)]=ToPlain(elems[key])
+                return out
+        return ToPlain(elems)
+    if it=="JS_Date_TYPE":
+        return comparator.dateFromFloat(value.value)
+    if it=="JS_REGEXP_TYPE":
+        return "/{}/{}".format(ToPlain(value.value),value.regexp_flags)
+    if it=="JS_SET_TYPE":
+        return [ToPlain(val) for val in value.value]
+    if it=="JS_ARRAY_BUFFER_TYPE" or it=="JS_TYPED_ARRAY_TYPE" or it=="JS_DATA_VIEW_TYPE":
+        raw=bytearray(value.value)
+        if value.blen>0: raw=raw[value.offset:value.offset+value.blen]
+        return bytes(raw)
+    if it=="BIGINT_TYPE":
+        return int.from_bytes(bytearray(value.value),'little')
+    if it=="JS_VALUE_TYPE" and value.isBigInt:
+        return ToPlain(value.value)
+    return ToPlain(value.value)
+
+def ToPlainKey(key):
+    if isinstance(key,bytes): return key.decode('latin-1')
+    if isinstance(key,float) and key==int(key): return unicode(int(key))
+    return unicode(key)
+
+def KeyPathColumns(store):
+    kp=store.keyPath
+    if isinstance(kp,comparator.IndexedDBKeyPath):
+        if kp.ctype==comparator.WebIDBKeyPathTypeString and kp.string:
+            return [kp.string]
+        if kp.ctype==comparator.WebIDBKeyPathTypeArray and kp.array:
+            return list(kp.array)
+    return []
+
+def Flatten(record,max_depth=3,prefix="",out=None):
+    # nested objects become dotted columns, everything else is a leaf
+    if out is None: out={}
+    for key,val in record.items():
+        name=prefix+key
+        if isinstance(val,dict) and max_depth>1 and len(val)>0:
+            Flatten(val,max_depth-1,name+".",out)
+        else:
+            out[name]=val
+    return out
+
+INT64_MIN=-(1<<63)
+INT64_MAX=(1<<63)-1
+
+def Leaf(value):
+    # value of a single cell; lists/objects/bytes/dates are kept as strings
+    if isinstance(value,bool) or value is None or isinstance(value,(float,unicode)):
+        return value
+    if isinstance(value,(int,long)):
+        if INT64_MIN<=value<=INT64_MAX: return value
+        return unicode(value)
+    if isinstance(value,bytes):
+        return HexBytes(value)
+    if hasattr(value,'isoformat'):
+        return value.isoformat()
+    return json.dumps(value,default=JsonDefault,sort_keys=True)
+
+def HexBytes(value):
+    return binascii.hexlify(value).decode('ascii')
+
+def JsonDefault(value):
+    # leaves json can't encode itself, inside lists/objects
+    if isinstance(value,(bytes,bytearray,array.array)):
+        return HexBytes(bytes(bytearray(value)))
+    if hasattr(value,'isoformat'):
+        return value.isoformat()
+    return unicode(value)
+
+def ColumnType(old,value):
+    # widen bool < int < float < string as values are seen
+    if value is None: return old
+    if isinstance(value,bool): new="bool"
+    elif isinstance(value,int): new="int"
+    elif isinstance(value,float): new="float"
+    else: new="string"
+    if old is None or old==new: return new
+    if set([old,new])==set(["int","float"]): return "float"
+    return "string"
+
+class ObjectStoreExporter(object):
+    def __init__(self,store,max_depth=3,chunk_size=65536):
+        self.store=store
+        self.max_depth=max_depth
+        self.chunk_size=chunk_size
+        self.key_columns=KeyPathColumns(store)
+        self.columns=None
+        self.types=None
+    def Rows(self):
+        for key in self.store.objects:
+            value=ToPlain(self.store.objects[key])
+            if isinstance(value,dict):
+                row=Flatten(value,self.max_depth)
+            else:
+                row={"value":value}
+            if not self.key_columns:
+                row["key"]=ToPlain(key)
+            yield dict((name,Leaf(val)) for name,val in row.items())
+    def InferColumns(self):
+        # one pass over the loaded records, no V8 work is repeated
+        order=["key"] if not self.key_columns else list(self.key_columns)
+        types={}
+        for row in self.Rows():
+            for name,val in row.items():
+                if name not in types:
+                    types[name]=None
+                    if name not in order: order.append(name)
+                types[name]=ColumnType(types[name],val)
+        self.columns=order
+        self.types=types
+        return order
+    def Chunks(self):
+        if self.columns is None: self.InferColumns()
+        chunk=[]
+        for row in self.Rows():
+            chunk.append(row)
+            if len(chunk)>=self.chunk_size:
+                yield chunk
+                chunk=[]
+        if chunk: yield chunk
+    def ArrowSchema(self):
+        atypes={"bool":pyarrow.bool_(),"int":pyarrow.int64(),"float":pyarrow.float64(),
+                "string":pyarrow.string(),None:pyarrow.string()}
+        return pyarrow.schema([(name,atypes[self.types.get(name)]) for name in self.columns])
+    def Cell(self,name,value):
+        if value is None: return None
+        tp=self.types.get(name)
+        if tp=="string" and not isinstance(value,unicode): return json.dumps(value)
+        if tp=="float": return float(value)
+        return value
+    def WriteParquet(self,path):
+        if self.columns is None: self.InferColumns()
+        schema=self.ArrowSchema()
+        writer=pyarrow.parquet.ParquetWriter(path,schema)
+        rows=0
+        try:
+            for chunk in self.Chunks():
+                cols=dict((name,[self.Cell(name,row.get(name)) for row in chunk]) for name in self.columns)
+                writer.write_table(pyarrow.Table.from_pydict(cols,schema=schema))
+                rows+=len(chunk)
+        finally:
+            writer.close()
+        return rows
+    def WriteCSV(self,path):
+        if self.columns is None: self.InferColumns()
+        rows=0
+        with gzip.open(path,'wt') as fl:
+            out=csv.writer(fl)
+            out.writerow(self.columns)
+            for chunk in self.Chunks():
+                out.writerows([[self.Cell(name,row.get(name)) for name in self.columns] for row in chunk])
+                rows+=len(chunk)
+        return rows
+    def Write(self,path,fmt=None):
+        # fmt: "parquet", "csv" or None to pick parquet if pyarrow is there
+        if fmt is None: fmt="parquet" if pyarrow is not None else "csv"
+        if fmt=="parquet":
+            if pyarrow is None: raise ImportError("pyarrow is needed for parquet export")
+            return self.WriteParquet(path)
+        return self.WriteCSV(path)
+
+def ExportPool(pool,outdir,fmt=None,**kwargs):
+    # one file per object store, returns {path: rows}
+    if fmt is None: fmt="parquet" if pyarrow is not None else "csv"
+    ext=".parquet" if fmt=="parquet" else ".csv.gz"
+    done={}
+    for dbid in pool.databases:
+        ostores=pool.databases[dbid].objectStores
+        for osid in ostores:
+            store=ostores[osid]
+            if len(store.objects)==0: continue
+            name="{}_{}_{}".format(dbid,osid,store.name or "store")
+            name="".join([ch if ch.isalnum() or ch in "._-" else "_" for ch in name])
+            path=os.path.join(outdir,name+ext)
+            done[path]=ObjectStoreExporter(store,**kwargs).Write(path,fmt)
+    return done
+
+if __name__=="__main__":
+    if len(sys.argv)<3:
+        print("Needs path to IDB folder and output folder")
+        sys.exit(1)
+    import plyvel
+    db=plyvel.DB(sys.argv[1],comparator=lambda a,b: comparator.Compare(a,b,False), comparator_name=b'idb_cmp1')
+    ipool=comparator.IndexedPool()
+    for key,value in db:
+        ipool.ProcessKeyValue(key,value)
+    db.close()
+    fmt=sys.argv[3] if len(sys.argv)>3 else None
+    for path,rows in ExportPool(ipool,sys.argv[2],fmt).items():
+        print("{}: {} rows".format(path,rows))